@@ -0,0 +1,233 @@
+# analyse _pdf/analysis.py
+import json
+import os
+import re
+
+from shared.cache import prompt_version, response_cache
+from shared.chunking import SENTENCE_BREAK, cut_by_tokens, split_clauses
+from shared.generation import context_limit, generate_batch, stream_batch, template_prefix
+from shared.grammar import json_schema
+from shared.models import get_model_config, get_tokenizer
+from shared.tracing import span
+
+# --- Prompt budget ---
+# Windows are kept well below Mistral's 32k positions: attention cost grows
+# quadratically with prompt length, so several short passes beat one long one.
+ANALYSIS_CONTEXT_TOKENS = int(os.environ.get("ANALYSIS_CONTEXT_TOKENS", 4096))
+ANALYSIS_BATCH_SIZE = int(os.environ.get("ANALYSIS_BATCH_SIZE", 4))
+
+ANALYSIS_PROMPT = """
+You are a legal compliance expert. Analyze the following contract content.
+1. Give a clear summary of the contract in bullet points.
+2. Identify potential risks or compliance issues.
+
+Contract Content:
+{contract_text}
+
+Provide the answer in JSON format with keys 'summary' and 'risks'.
+"""
+
+# The part number sits after the instructions, so every section shares one cached prefix
+SECTION_PROMPT = """
+You are a legal compliance expert. Analyze the following section of a longer contract.
+1. Give a clear summary of this section in bullet points.
+2. Identify potential risks or compliance issues in this section.
+
+Contract Section (part {part} of {total}):
+{contract_text}
+
+Provide the answer in JSON format with keys 'summary' and 'risks'.
+"""
+
+# Responses are decoded under this schema, so they parse by construction
+# and generation ends at the closing brace instead of running on.
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "array", "items": {"type": "string"}},
+        "risks": {"type": "array", "items": {"type": "string"}},
+    },
+}
+ANALYSIS_GRAMMAR = json_schema(ANALYSIS_SCHEMA)
+
+
+def count_tokens(tokenizer, texts):
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+
+def _fit(text, tokenizer, max_tokens):
+    """
+    (piece, tokens) pairs of at most `max_tokens` tokens covering `text`.
+    Token-offset cuts are exact for fast tokenizers; slow ones cut between
+    words, so a run without spaces (a table, an unspaced script) is halved
+    by characters until it fits.
+    """
+    size = count_tokens(tokenizer, [text])[0]
+    if size <= max_tokens or len(text) < 2:
+        return [(text, size)]
+    middle = len(text) // 2
+    return _fit(text[:middle], tokenizer, max_tokens) + _fit(text[middle:], tokenizer, max_tokens)
+
+
+def clause_windows(text, tokenizer, max_tokens):
+    """
+    Pack consecutive clauses into windows of at most `max_tokens` tokens.
+    Clauses that are too long on their own are split on sentence
+    boundaries, and as a last resort at token boundaries (see _fit).
+    """
+    pieces = []
+    clauses = split_clauses(text)
+    for clause, size in zip(clauses, count_tokens(tokenizer, clauses) if clauses else []):
+        if size <= max_tokens:
+            pieces.append((clause, size))
+            continue
+        sentences = SENTENCE_BREAK.split(clause)
+        for sentence, sentence_size in zip(sentences, count_tokens(tokenizer, sentences)):
+            if sentence_size <= max_tokens:
+                pieces.append((sentence, sentence_size))
+                continue
+            for start, end in cut_by_tokens(sentence, 0, len(sentence), tokenizer, max_tokens):
+                pieces += _fit(sentence[start:end].strip(), tokenizer, max_tokens)
+
+    windows, current, current_size = [], [], 0
+    for piece, size in pieces:
+        if current and current_size + size > max_tokens:
+            windows.append("\n\n".join(current))
+            current, current_size = [], 0
+        current.append(piece)
+        current_size += size + 2  # the "\n\n" separator
+    if current:
+        windows.append("\n\n".join(current))
+    return windows
+
+
+def parse_analysis(response):
+    """Extract the {'summary', 'risks'} JSON object from a model response, or None."""
+    json_match = re.search(r"\{.*\}", response, re.DOTALL)
+    if not json_match:
+        return None
+    try:
+        analysis = json.loads(json_match.group())
+    except json.JSONDecodeError:
+        return None
+    return analysis if isinstance(analysis, dict) else None
+
+
+def partial_analysis(response):
+    """
+    'summary' and 'risks' items that are already complete in a response
+    that is still being streamed, so they can be rendered early.
+    """
+    decoder = json.JSONDecoder()
+    found = {"summary": [], "risks": []}
+    for key in found:
+        match = re.search(rf"[\"']{key}[\"']\s*:\s*\[", response)
+        if not match:
+            continue
+        pos = match.end()
+        while True:
+            while pos < len(response) and response[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(response) or response[pos] == "]":
+                break
+            try:
+                item, pos = decoder.raw_decode(response, pos)
+            except json.JSONDecodeError:
+                break  # item still incomplete
+            found[key].append(item)
+    return found
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _words(item):
+    text = item if isinstance(item, str) else json.dumps(item, sort_keys=True)
+    return frozenset(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def merge_analyses(analyses, similarity=0.8):
+    """
+    Concatenate per-section summaries and risks, dropping items that repeat
+    an earlier one (same words, or word-set Jaccard overlap >= `similarity`).
+    """
+    merged = {"summary": [], "risks": []}
+    for key in merged:
+        seen = []
+        for analysis in analyses:
+            for item in _as_list(analysis.get(key)):
+                words = _words(item)
+                if not words:
+                    continue
+                if any(len(words & other) / len(words | other) >= similarity for other in seen):
+                    continue
+                seen.append(words)
+                merged[key].append(item)
+    return merged
+
+
+def analyze_contract(contract_text, max_new_tokens=512, batch_size=ANALYSIS_BATCH_SIZE, on_update=None, use_cache=True):
+    """
+    Compliance analysis that stays inside the model's context window.
+
+    Short contracts are analysed in one pass with the original prompt.
+    Longer ones are split into clause-aligned windows, the windows are sent
+    through the generator in batches, and the per-section results are merged.
+    With `on_update`, output is streamed and the callback receives the
+    merged partial analysis every time another item completes.
+    With `use_cache`, a contract analysed before is answered from the
+    response cache (exact text only) without loading the model.
+    Returns (analysis or None, list of raw responses).
+    """
+    cache = response_cache()
+    params = {"max_new_tokens": max_new_tokens, "context_tokens": ANALYSIS_CONTEXT_TOKENS,
+              "prompt": prompt_version(ANALYSIS_PROMPT, SECTION_PROMPT, ANALYSIS_SCHEMA)}
+    if use_cache:
+        cached = cache.get("analysis", contract_text, params)
+        if cached is not None:
+            return cached["analysis"], cached["responses"]
+
+    tokenizer = get_tokenizer()
+    limit = context_limit(tokenizer, get_model_config(), ANALYSIS_CONTEXT_TOKENS)
+    with span("prompt", chars=len(contract_text)) as traced:
+        overhead = count_tokens(tokenizer, [SECTION_PROMPT.format(part=99, total=99, contract_text="")])[0]
+        budget = limit - max_new_tokens - overhead - 8
+
+        windows = clause_windows(contract_text, tokenizer, budget)
+        if len(windows) <= 1:
+            template = ANALYSIS_PROMPT
+            prompts = [ANALYSIS_PROMPT.format(contract_text=contract_text)]
+        else:
+            template = SECTION_PROMPT
+            prompts = [SECTION_PROMPT.format(part=i, total=len(windows), contract_text=window)
+                       for i, window in enumerate(windows, 1)]
+        prefix = template_prefix(template)  # instructions are prefilled once per model
+        traced.set(windows=len(prompts))
+
+    if on_update is None:
+        responses = generate_batch(prompts, max_new_tokens=max_new_tokens, batch_size=batch_size, prefix=prefix,
+                                   constraint=ANALYSIS_GRAMMAR)
+    else:
+        responses = [""] * len(prompts)
+        shown = 0
+        for batch_start in range(0, len(prompts), batch_size):
+            for row, delta in stream_batch(prompts[batch_start:batch_start + batch_size], max_new_tokens, prefix=prefix,
+                                           constraint=ANALYSIS_GRAMMAR):
+                responses[batch_start + row] += delta
+                partial = merge_analyses([partial_analysis(response) for response in responses])
+                if len(partial["summary"]) + len(partial["risks"]) != shown:
+                    shown = len(partial["summary"]) + len(partial["risks"])
+                    on_update(partial)
+        responses = [response.strip() for response in responses]
+
+    with span("parse", responses=len(responses)) as traced:
+        analyses = [analysis for analysis in map(parse_analysis, responses) if analysis]
+        traced.set(parsed=len(analyses))
+        if not analyses:
+            return None, responses
+        analysis = analyses[0] if len(prompts) == 1 else merge_analyses(analyses)
+    cache.put("analysis", contract_text, {"analysis": analysis, "responses": responses}, params)
+    return analysis, responses
@@ -1,12 +1,17 @@
 # analyse _pdf/main.py
 # analyse_pdf/main.py
+import sys
 import streamlit as st
-from PyPDF2 import PdfReader
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import json
-import re
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared/ lives at the repo root
+from shared.extract import extract_text
+from shared.cache import response_cache
+from shared.models import registry
+from shared.server import server_report
+from shared import tracing
+from analysis import analyze_contract
+
 # --- Streamlit UI ---
 st.set_page_config(page_title="Contract Compliance Analyzer", layout="centered")
 
@@ -20,68 +25,58 @@ st.write("Upload a PDF contract and get a compliance summary with identified ris
 
 uploaded_file = st.file_uploader("Upload Contract PDF", type=["pdf"])
 
+
+def show_analysis(analysis):
+    st.subheader("✅ Contract Summary")
+    for idx, point in enumerate(analysis.get("summary", []), 1):
+        st.write(f"{idx}. {point}")
+
+    st.subheader("⚠️ Potential Risks")
+    for idx, risk in enumerate(analysis.get("risks", []), 1):
+        st.write(f"{idx}. {risk}")
+
+
 if uploaded_file:
-    # --- Extract PDF text ---
-    pdf_reader = PdfReader(uploaded_file)
-    contract_text = ""
-    for page in pdf_reader.pages:
-        text = page.extract_text()
-        if text:
-            contract_text += text + "\n"
-
-    if contract_text.strip() == "":
-        st.error("Could not extract text from the PDF. Make sure it contains selectable text.")
-    else:
-        st.info("Contract text extracted successfully. Running compliance analysis...")
-
-        # --- Load local Mistral 7B Instruct model ---
-        model_path = r"C:\Users\shibi\.cache\huggingface\hub\models--mistralai--Mistral-7B-Instruct-v0.2\snapshots\63a8b081895390a26e140280378bc85ec8bce07a"
-        tokenizer = AutoTokenizer.from_pretrained(model_path)
-        model = AutoModelForCausalLM.from_pretrained(model_path, device_map="auto", torch_dtype="auto")
-
-        # --- Setup a text-generation pipeline ---
-        nlp = pipeline(
-            "text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_new_tokens=512
-        )
-
-        # --- Prepare prompt for compliance analysis ---
-        prompt = f"""
-You are a legal compliance expert. Analyze the following contract content.
-1. Give a clear summary of the contract in bullet points.
-2. Identify potential risks or compliance issues.
-
-Contract Content:
-{contract_text}
-
-Provide the answer in JSON format with keys 'summary' and 'risks'.
-"""
-
-        # --- Generate response ---
-        response = nlp(prompt)[0]['generated_text']
-
-        # --- Extract JSON from response ---
-        try:
-            # Extract JSON block using regex
-            json_match = re.search(r"\{.*\}", response, re.DOTALL)
-            if json_match:
-                analysis = json.loads(json_match.group())
-            else:
-                st.error("Could not parse analysis result. Here's the raw output:")
-                st.code(response)
-                analysis = None
+    # One trace per run: extraction, prompt build, prefill/decode and parsing nest under it
+    with tracing.span("analyse", file=uploaded_file.name):
+        # --- Extract PDF text ---
+        # Pages are extracted in parallel and cached on disk, so reruns are free
+        contract_text = extract_text(uploaded_file.getvalue())
+
+        if contract_text.strip() == "":
+            st.error("Could not extract text from the PDF. Make sure it contains selectable text.")
+        else:
+            st.info("Contract text extracted successfully. Running compliance analysis...")
+
+            # --- Run analysis (map-reduce over clause windows for long contracts) ---
+            # Items are rendered as soon as the streamed JSON completes them
+            live = st.empty()
 
-            if analysis:
-                st.subheader("✅ Contract Summary")
-                for idx, point in enumerate(analysis.get("summary", []), 1):
-                    st.write(f"{idx}. {point}")
+            def show_partial(partial):
+                with live.container():
+                    show_analysis(partial)
 
-                st.subheader("⚠️ Potential Risks")
-                for idx, risk in enumerate(analysis.get("risks", []), 1):
-                    st.write(f"{idx}. {risk}")
+            analysis, responses = analyze_contract(contract_text, max_new_tokens=512, on_update=show_partial)
+            live.empty()
 
-        except json.JSONDecodeError:
-            st.error("Failed to parse JSON. Here is the raw output:")
-            st.code(response)
+            if analysis is None:
+                st.error("Could not parse analysis result. Here's the raw output:")
+                st.code("\n\n".join(responses))
+            else:
+                if len(responses) > 1:
+                    st.caption(f"Long contract: analysed in {len(responses)} sections and merged.")
+                show_analysis(analysis)
+
+# --- Model status (and the shared inference server's queue, when INFERENCE_SERVER is set) ---
+model_status = registry.report() + server_report()
+if model_status:
+    with st.sidebar.expander("Loaded models"):
+        for line in model_status:
+            st.caption(line)
+st.sidebar.caption(response_cache().describe())
+
+# --- Debug panel (TRACING=1) ---
+if tracing.enabled():
+    with st.sidebar.expander("Debug: step timings"):
+        for trace in tracing.recent_traces(3):
+            st.code("\n".join(tracing.describe_trace(trace)), language=None)
@@ -0,0 +1,413 @@
+# benchmarks/run.py
+"""
+Offline benchmarks for the hot paths of the three apps.
+
+    python benchmarks/run.py                                  # stand-in models, CI scale
+    python benchmarks/run.py --real-models                    # the configured embedder and generator
+    python benchmarks/run.py --only retrieval,pdf --out results.json
+    python benchmarks/run.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json   # exits 1 on a regression
+
+Metrics ending in _per_s or containing "recall" are better when higher,
+metrics ending in _ms or _s are better when lower; everything else is
+informational and never compared.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_PDF = ROOT / "analyse _pdf" / "sample.pdf"
+# The apps import their own modules flat (`from index import ...`), so put their folders on the path
+sys.path[:0] = [str(ROOT), str(ROOT / "vector_embed"), str(ROOT / "generate_pdf")]
+
+EMBED_DIM = 384
+WORDS = ("contractor client agreement payment schedule clause liability indemnity termination "
+         "notice warranty material labour site completion milestone invoice retention dispute "
+         "arbitration force majeure insurance compliance safety drawing variation").split()
+
+
+class Skip(Exception):
+    """Raised by a benchmark whose dependencies are not installed."""
+
+
+# ---------- Timing ----------
+def timed(fn, repeats=3):
+    """Median wall time of `fn()` over `repeats` runs, and the last result."""
+    times, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# ---------- Stand-ins (deterministic, no downloads) ----------
+class WordTokenizer:
+    """Whitespace tokenizer with the slice of the Hugging Face API the chunker uses."""
+
+    is_fast = False
+
+    def __call__(self, texts, add_special_tokens=False, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"input_ids": [text.split() for text in texts]}
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+class HashingEmbedder:
+    """Feature-hashing encoder shaped like SentenceTransformer: same calls, no model."""
+
+    max_seq_length = 256
+    tokenizer = WordTokenizer()
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True):
+        vectors = np.zeros((len(texts), EMBED_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split()[:self.max_seq_length]:
+                vectors[row, zlib.crc32(word.encode()) % EMBED_DIM] += 1.0
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def tiny_generator():
+    """Randomly initialised 4-layer Mistral with a byte-level tokenizer: real code path, toy size."""
+    try:
+        import torch
+        from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+        from transformers import MistralConfig, MistralForCausalLM, PreTrainedTokenizerFast
+    except ImportError as e:
+        raise Skip(f"needs torch, tokenizers and transformers ({e.name} missing)")
+
+    alphabet = sorted(pre_tokenizers.ByteLevel.alphabet())
+    vocab = {"<s>": 0, "</s>": 1, **{char: i + 2 for i, char in enumerate(alphabet)}}
+    core = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    core.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    core.decoder = decoders.ByteLevel()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=core, bos_token="<s>", eos_token="</s>", pad_token="</s>")
+    tokenizer.padding_side = "left"
+
+    torch.manual_seed(0)
+    config = MistralConfig(vocab_size=len(vocab), hidden_size=256, intermediate_size=512, num_hidden_layers=4,
+                           num_attention_heads=8, num_key_value_heads=2, max_position_embeddings=4096,
+                           bos_token_id=0, eos_token_id=1, pad_token_id=1)
+    return MistralForCausalLM(config).eval(), tokenizer
+
+
+def synthetic_text(words, seed=0):
+    """Contract-like text: numbered clauses of pseudo-random sentences."""
+    rng = np.random.default_rng(seed)
+    clauses, written, number = [], 0, 1
+    while written < words:
+        sentences = []
+        for _ in range(rng.integers(2, 6)):
+            length = int(rng.integers(8, 24))
+            sentences.append(" ".join(rng.choice(WORDS, length)).capitalize() + ".")
+            written += length
+        clauses.append(f"{number}. " + " ".join(sentences))
+        number += 1
+    return "\n\n".join(clauses)
+
+
+def synthetic_pdf(pages, seed=0):
+    """A text PDF of roughly `pages` pages."""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=10)
+    pdf.add_page()
+    pdf.multi_cell(0, 5, synthetic_text(pages * 550, seed))
+    return bytes(pdf.output())
+
+
+# ---------- Benchmarks ----------
+def bench_extraction(args):
+    from PyPDF2 import PdfReader
+    from shared.extract import PageCache, extract_pages
+
+    results = {}
+    corpora = {"synthetic": synthetic_pdf(args.pages)}
+    if SAMPLE_PDF.exists():
+        corpora["sample"] = SAMPLE_PDF.read_bytes()
+    for name, data in corpora.items():
+        pages = len(PdfReader(io.BytesIO(data)).pages)
+        results[f"{name}_pages"] = pages
+        for label, workers in (("serial", 1), ("parallel", os.cpu_count() or 1)):
+            def cold():
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    return sum(1 for _ in extract_pages(data, workers=workers, cache=PageCache(cache_dir)))
+            seconds, _ = timed(cold, args.repeats)
+            results[f"{name}_{label}_pages_per_s"] = pages / seconds
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = PageCache(cache_dir)
+            list(extract_pages(data, workers=1, cache=cache))
+            seconds, _ = timed(lambda: list(extract_pages(data, workers=1, cache=cache)), args.repeats)
+        results[f"{name}_cached_pages_per_s"] = pages / seconds
+    return results
+
+
+def _embedder(args):
+    if not args.real_models:
+        return HashingEmbedder()
+    try:
+        from shared.models import get_embedder
+        return get_embedder()
+    except ImportError as e:
+        raise Skip(f"--real-models needs sentence_transformers ({e.name} missing)")
+
+
+def bench_chunking(args):
+    from shared.chunking import chunk_text, embedder_max_tokens
+
+    embedder = _embedder(args)
+    text = synthetic_text(args.pages * 550)
+    seconds, chunks = timed(lambda: chunk_text(text, embedder.tokenizer, embedder_max_tokens(embedder)), args.repeats)
+    return {
+        "chunks": len(chunks),
+        "mean_chunk_tokens": statistics.fmean(chunk.tokens for chunk in chunks),
+        "chunks_per_s": len(chunks) / seconds,
+        "mb_per_s": len(text.encode()) / 2**20 / seconds,
+    }
+
+
+def bench_embedding(args):
+    from shared.chunking import chunk_text, embedder_max_tokens, encode_chunks
+
+    embedder = _embedder(args)
+    chunks = chunk_text(synthetic_text(args.pages * 550), embedder.tokenizer, embedder_max_tokens(embedder))
+    seconds, vectors = timed(lambda: encode_chunks(embedder, chunks), args.repeats)
+    return {"chunks": len(chunks), "dim": int(vectors.shape[1]), "chunks_per_s": len(chunks) / seconds}
+
+
+def bench_retrieval(args):
+    from search import BACKENDS, ExactSearch, hnswlib
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in args.corpus_sizes:
+        # Clustered like real chunk embeddings (topics), not uniform on the sphere
+        topics = rng.standard_normal((max(8, size // 200), EMBED_DIM), dtype=np.float32)
+        vectors = topics[rng.integers(len(topics), size=size)] + 0.6 * rng.standard_normal((size, EMBED_DIM), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        # Queries near real rows, like a question paraphrasing a clause
+        queries = vectors[rng.choice(size, args.queries)] + 0.05 * rng.standard_normal((args.queries, EMBED_DIM), dtype=np.float32)
+
+        exact = ExactSearch()
+        exact.update(vectors)
+        truth = [set(exact.search(query, 9)[0].tolist()) for query in queries]
+        for name, backend_class in BACKENDS.items():
+            if name == "hnsw" and hnswlib is None:
+                continue
+            backend = backend_class()
+            start = time.perf_counter()
+            backend.update(vectors)
+            results[f"{name}_{size}_build_s"] = time.perf_counter() - start
+
+            latencies, recall = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                rows, _ = backend.search(query, 9)
+                latencies.append((time.perf_counter() - start) * 1000)
+                recall.append(len(expected & set(rows.tolist())) / len(expected))
+            results[f"{name}_{size}_p50_ms"] = statistics.median(latencies)
+            results[f"{name}_{size}_p95_ms"] = percentile(latencies, 0.95)
+            results[f"{name}_{size}_recall"] = statistics.fmean(recall)
+    return results
+
+
+def bench_generation(args):
+    draft = False
+    if args.real_models:
+        try:
+            from shared.models import get_draft_model, get_model, get_tokenizer
+            model, tokenizer = get_model(), get_tokenizer()
+            draft = get_draft_model() or False  # DRAFT_MODEL_PATH, if set
+        except ImportError as e:
+            raise Skip(f"--real-models needs torch and transformers ({e.name} missing)")
+    else:
+        model, tokenizer = tiny_generator()
+    from shared.generation import generate_batch
+    from shared.models import registry
+
+    prompt = "You are a legal expert. Summarise the payment clause: " + synthetic_text(120, seed=1)
+    results = {}
+    for batch in (1, 8):
+        prompts = [prompt] * batch
+        run = lambda: generate_batch(prompts, args.new_tokens, batch_size=batch, model=model, tokenizer=tokenizer,
+                                     do_sample=False, min_new_tokens=args.new_tokens, draft=False)
+        run()  # warm-up
+        seconds, _ = timed(run, args.repeats)
+        results[f"batch{batch}_tokens_per_s"] = batch * args.new_tokens / seconds
+
+    if draft:
+        # Greedy speculative decoding gives the same text as batch1, only faster (or not)
+        run = lambda: generate_batch([prompt], args.new_tokens, batch_size=1, model=model, tokenizer=tokenizer,
+                                     do_sample=False, min_new_tokens=args.new_tokens, draft=draft)
+        run()
+        seconds, _ = timed(run, args.repeats)
+        results["speculative_batch1_tokens_per_s"] = args.new_tokens / seconds
+        results["speculative_speedup"] = results["speculative_batch1_tokens_per_s"] / results["batch1_tokens_per_s"]
+        results["speculative_acceptance"] = registry.speculative.acceptance_rate
+    return results
+
+
+def bench_pdf(args):
+    from datetime import date
+    from batch import render_batch
+    from pdf import create_agreement_pdf
+
+    logo = (ROOT / "generate_pdf" / "logo.png").read_bytes()
+    row = {
+        "contractor_name": "Acme Builders", "contractor_address": "12 MG Road, Bengaluru",
+        "client_name": "R. Sharma", "client_address": "4 Park Street, Kolkata",
+        "scope_of_work": synthetic_text(300, seed=2), "project_timeline": synthetic_text(80, seed=3),
+        "payment_details": synthetic_text(80, seed=4),
+    }
+    args_single = (row["contractor_name"], row["contractor_address"], row["client_name"], row["client_address"],
+                   date(2025, 1, 1), row["scope_of_work"], row["project_timeline"], row["payment_details"],
+                   "A. Signatory", "Manager", "B. Signatory", "Owner")
+    create_agreement_pdf(*args_single, logo_bytes=logo)  # warm the font/logo caches
+    seconds, _ = timed(lambda: [create_agreement_pdf(*args_single, logo_bytes=logo) for _ in range(args.docs)], args.repeats)
+    results = {"single_docs_per_s": args.docs / seconds}
+
+    rows = [row] * (args.docs * 4)
+    with tempfile.TemporaryDirectory() as out_dir:
+        stats = render_batch(rows, out_dir=out_dir, logo_bytes=logo)
+    results["batch_docs_per_s"] = stats.docs_per_second
+    return results
+
+
+BENCHMARKS = {
+    "extraction": bench_extraction,
+    "chunking": bench_chunking,
+    "embedding": bench_embedding,
+    "retrieval": bench_retrieval,
+    "generation": bench_generation,
+    "pdf": bench_pdf,
+}
+
+
+# ---------- Baseline comparison ----------
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if not compared."""
+    if metric.endswith("_per_s") or "recall" in metric:
+        return 1
+    if re.search(r"_(ms|s)$", metric):
+        return -1
+    return 0
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every compared metric, and whether any regressed beyond `tolerance`."""
+    lines, regressed = [], False
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(bench, {}).get(metric)
+            sign = direction(metric)
+            if not sign or not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or not old:
+                continue
+            change = (value - old) / abs(old)
+            worse = sign * change < -tolerance
+            regressed |= worse
+            lines.append(f"{'❌' if worse else '✅'} {bench}.{metric}: {value:.4g} (baseline {old:.4g}, {change:+.1%})")
+    return lines, regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark extraction, chunking, embedding, retrieval, generation and PDF rendering.")
+    parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--real-models", action="store_true", help="use the configured embedder and generator")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="compare with this results JSON; exit 1 on a regression")
+    parser.add_argument("--save-baseline", help="also write the results to this path")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=32, help="pages of the synthetic corpus")
+    parser.add_argument("--docs", type=int, default=10, help="agreements per PDF timing run")
+    parser.add_argument("--corpus-sizes", default="1000,10000,100000", help="retrieval corpus sizes")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--new-tokens", type=int, default=32, help="tokens generated per prompt")
+    args = parser.parse_args(argv)
+    args.corpus_sizes = [int(size) for size in args.corpus_sizes.split(",")]
+
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "models": "real" if args.real_models else "stand-in",
+            "params": {key: getattr(args, key) for key in ("repeats", "pages", "docs", "corpus_sizes", "queries", "new_tokens")},
+        },
+        "results": {},
+        "skipped": {},
+    }
+    for name in selected:
+        print(f"… {name}", file=sys.stderr)
+        try:
+            report["results"][name] = BENCHMARKS[name](args)
+        except Skip as e:
+            report["skipped"][name] = str(e)
+            print(f"   skipped: {e}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n")
+        print(f"✅ Baseline saved to {args.save_baseline}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        for key in ("models", "params", "cpus"):
+            if baseline["meta"].get(key) != report["meta"][key]:
+                print(f"⚠️ Baseline {key} differ: {baseline['meta'].get(key)} vs {report['meta'][key]}", file=sys.stderr)
+        lines, regressed = compare(report["results"], baseline["results"], args.tolerance)
+        print("\n".join(lines), file=sys.stderr)
+        if regressed:
+            print(f"❌ Regression beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
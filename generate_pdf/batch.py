@@ -0,0 +1,191 @@
+# generate_pdf/batch.py
+"""
+Batch agreement generation: CSV/JSONL rows in, many PDFs out.
+
+    python batch.py agreements.csv --out agreements/
+    python batch.py agreements.jsonl --zip agreements.zip --logo logo.png --workers 8
+    python batch.py agreements.csv --zip - > agreements.zip
+
+Each row uses the create_agreement_pdf field names; the signer fields
+and agreement_date (YYYY-MM-DD) are optional.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+
+from pdf import agreement_pdf_buffer, preload_resources, write_agreement_pdf
+
+REQUIRED_FIELDS = [
+    "contractor_name", "contractor_address", "client_name", "client_address",
+    "scope_of_work", "project_timeline", "payment_details",
+]
+
+# Same signatory defaults as the Streamlit app
+OPTIONAL_DEFAULTS = {
+    "contractor_signer_name": "Authorized Signatory",
+    "contractor_signer_title": "Manager",
+    "client_signer_name": "Authorized Signatory",
+    "client_signer_title": "Client Representative",
+}
+
+
+@dataclass
+class BatchStats:
+    documents: int
+    seconds: float
+    total_bytes: int
+
+    @property
+    def docs_per_second(self):
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    def describe(self):
+        return (f"{self.documents} agreements in {self.seconds:.1f}s "
+                f"({self.docs_per_second:.1f} docs/s, {self.total_bytes / 2**20:.1f} MB)")
+
+
+# ---------- Input ----------
+def read_rows(path):
+    """Read agreement rows from a .csv or .jsonl file."""
+    path = Path(path)
+    # utf-8-sig: spreadsheet exports start with a BOM, which would otherwise stick to the first column name
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    for number, row in enumerate(rows, 1):
+        missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+        if missing:
+            raise ValueError(f"Row {number} of {path.name} is missing: {', '.join(missing)}")
+    return rows
+
+
+def _agreement_date(value):
+    if not value:
+        return date.today()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip(), "%Y-%m-%d").date()
+
+
+def agreement_filename(number, row):
+    safe_name = re.sub(r"[^A-Za-z0-9_-]+", "_", row["contractor_name"]).strip("_") or "agreement"
+    return f"{number:04d}_{safe_name}_agreement.pdf"
+
+
+# ---------- Worker side ----------
+_worker_logo = None
+_worker_out_dir = None
+_worker_returns_pdf = True
+
+
+def _init_worker(logo_bytes, out_dir=None, returns_pdf=True):
+    # Runs once per worker process: ship the logo once, parse the font and decode the logo once
+    global _worker_logo, _worker_out_dir, _worker_returns_pdf
+    _worker_logo = logo_bytes
+    _worker_out_dir = out_dir
+    _worker_returns_pdf = returns_pdf
+    preload_resources(logo_bytes)
+
+
+def _render(item):
+    """
+    Render one row. Files for `out_dir` are written by the worker itself;
+    the PDF only travels back to the parent when it goes into the zip.
+    Returns (filename, size, PDF buffer or None).
+    """
+    number, row = item
+    fields = {**OPTIONAL_DEFAULTS, **{k: v for k, v in row.items() if v not in (None, "")}}
+    filename = agreement_filename(number, row)
+    args = (
+        fields["contractor_name"], fields["contractor_address"],
+        fields["client_name"], fields["client_address"],
+        _agreement_date(fields.get("agreement_date")),
+        fields["scope_of_work"], fields["project_timeline"], fields["payment_details"],
+        fields["contractor_signer_name"], fields["contractor_signer_title"],
+        fields["client_signer_name"], fields["client_signer_title"],
+    )
+    if not _worker_returns_pdf:
+        return filename, write_agreement_pdf(Path(_worker_out_dir) / filename, *args, logo_bytes=_worker_logo), None
+    pdf_data = agreement_pdf_buffer(*args, logo_bytes=_worker_logo)
+    if _worker_out_dir is not None:
+        (Path(_worker_out_dir) / filename).write_bytes(pdf_data)
+    return filename, len(pdf_data), pdf_data
+
+
+# ---------- Main API ----------
+def render_batch(rows, out_dir=None, zip_file=None, logo_bytes=None, workers=None, on_progress=None):
+    """
+    Render one agreement per row in a process pool.
+
+    PDFs are written to `out_dir`, to `zip_file` (a path or a writable
+    binary stream, e.g. an HTTP response), or both, as they complete.
+    Workers write `out_dir` files themselves, so without a zip no PDF is
+    sent back to (or held by) this process.
+    `on_progress(done, total)` is called after every document.
+    Returns BatchStats with the throughput.
+    """
+    if out_dir is None and zip_file is None:
+        raise ValueError("Give out_dir, zip_file or both")
+    if out_dir is not None:
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    archive = zipfile.ZipFile(zip_file, "w", compression=zipfile.ZIP_STORED) if zip_file is not None else None
+    start = time.perf_counter()
+    done, total_bytes = 0, 0
+    try:
+        initargs = (logo_bytes, str(out_dir) if out_dir is not None else None, archive is not None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            chunksize = max(1, len(rows) // (workers * 4))
+            for filename, size, pdf_data in pool.map(_render, enumerate(rows, 1), chunksize=chunksize):
+                if archive is not None:
+                    with archive.open(filename, "w") as entry:
+                        entry.write(pdf_data)
+                done += 1
+                total_bytes += size
+                if on_progress:
+                    on_progress(done, len(rows))
+    finally:
+        if archive is not None:
+            archive.close()
+    return BatchStats(done, time.perf_counter() - start, total_bytes)
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render construction agreements in bulk from CSV/JSONL.")
+    parser.add_argument("rows", help="CSV or JSONL file with one agreement per row")
+    parser.add_argument("--out", help="directory to write the PDFs to")
+    parser.add_argument("--zip", help="zip archive to write the PDFs to ('-' for stdout)")
+    parser.add_argument("--logo", help="logo image placed on every agreement")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+    if not args.out and not args.zip:
+        parser.error("give --out, --zip or both")
+
+    rows = read_rows(args.rows)
+    logo_bytes = Path(args.logo).read_bytes() if args.logo else None
+    zip_file = sys.stdout.buffer if args.zip == "-" else args.zip
+
+    def progress(done, total):
+        print(f"\r{done}/{total} agreements", end="", file=sys.stderr)
+
+    stats = render_batch(rows, out_dir=args.out, zip_file=zip_file, logo_bytes=logo_bytes,
+                         workers=args.workers, on_progress=progress)
+    print(f"\n✅ {stats.describe()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,38 @@
 # generate_pdf/llm_handler.py
-import os
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared/ lives at the repo root
+from shared.cache import prompt_version, response_cache
+from shared.generation import stream_generate
+from shared.grammar import section_template
+from shared.tracing import span
+
 # --- Load environment variables ---
 load_dotenv()
 
-# --- Local snapshot path for Mistral ---
-model_path = r"C:\Users\shibi\.cache\huggingface\hub\models--mistralai--Mistral-7B-Instruct-v0.2\snapshots\63a8b081895390a26e140280378bc85ec8bce07a"
+# --- Shared model registry (model path comes from MISTRAL_MODEL_PATH) ---
+# The model is loaded lazily on first use, once per process.
+# Tip: Mistral base model is NOT tuned for instructions.
+# For better results, use Mistral-7B-Instruct-v0.1 if available locally.
 
-if not os.path.isdir(model_path):
-    raise FileNotFoundError(
-        f"❌ Model directory not found at: {model_path}\n"
-        "Please ensure you provided the correct snapshot path."
-    )
+SECTION_MARKERS = [
+    ("scope_of_work", "--- Scope of Work ---"),
+    ("project_timeline", "--- Project Timeline ---"),
+    ("payment_details", "--- Payment Details ---"),
+]
 
-print(f"✅ Loading model from local snapshot: {model_path}")
+# The rewrite is decoded under this template: all three markers, once each and in order
+SECTION_GRAMMAR = section_template([marker for _, marker in SECTION_MARKERS])
 
-# --- Load Tokenizer and Model ---
-# Tip: Mistral base model is NOT tuned for instructions.
-# For better results, use Mistral-7B-Instruct-v0.1 if available locally.
-try:
-    tokenizer = AutoTokenizer.from_pretrained(model_path, legacy=False)
-    model = AutoModelForCausalLM.from_pretrained(
-        model_path,
-        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-        device_map="auto" if torch.cuda.is_available() else None
-    )
-    print("✅ Model and tokenizer loaded successfully.")
-except Exception as e:
-    raise RuntimeError(f"❌ Failed to load local model: {e}")
-
-# --- Main Function ---
-def formalize_contract_text(scope_of_work, project_timeline, payment_details):
-    """
-    Uses a local Mistral-7B model to formalize construction agreement text
-    into legally suitable contract language.
-    """
+GENERATION_KWARGS = dict(do_sample=True, top_k=50, top_p=0.95, temperature=0.7)
+MAX_NEW_TOKENS = 1024
+CACHE_NAMESPACE = "formalize"
 
-    prompt = f"""
+
+# Static instruction block: its keys/values are computed once per model and reused
+FORMALIZE_PREAMBLE = """
     <s>[INST] You are an expert legal contract drafter.
     Rewrite the following construction contract sections into
     a formal, precise, and professional legal tone
@@ -51,7 +44,11 @@ def formalize_contract_text(scope_of_work, project_timeline, payment_details):
     --- Payment Details ---
 
     Do not include any additional commentary or explanations.
+"""
+
 
+def build_prompt(scope_of_work, project_timeline, payment_details):
+    return FORMALIZE_PREAMBLE + f"""
     --- Scope of Work ---
     {scope_of_work}
 
@@ -62,39 +59,9 @@ def formalize_contract_text(scope_of_work, project_timeline, payment_details):
     {payment_details} [/INST]
     """
 
-    try:
-        # --- Tokenize prompt ---
-        inputs = tokenizer(prompt, return_tensors="pt")
-        if torch.cuda.is_available():
-            inputs = {k: v.to(model.device) for k, v in inputs.items()}
-
-        # --- Generate completion ---
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=1024,
-                do_sample=True,
-                top_k=50,
-                top_p=0.95,
-                temperature=0.7
-            )
-
-        formatted_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-        # --- Remove the prompt from model output ---
-        instruction_end_tag = "[/INST]"
-        if instruction_end_tag in formatted_text:
-            formatted_text = formatted_text.split(instruction_end_tag, 1)[1].strip()
 
-    except Exception as e:
-        print(f"[LLM Error] Local model generation failed: {e}")
-        return {
-            "scope_of_work": scope_of_work,
-            "project_timeline": project_timeline,
-            "payment_details": payment_details
-        }
-
-    # --- Parse model response into sections ---
+def parse_sections(formatted_text):
+    """Split the model response into the three agreement sections."""
     sections = {
         "scope_of_work": "",
         "project_timeline": "",
@@ -125,6 +92,80 @@ def formalize_contract_text(scope_of_work, project_timeline, payment_details):
     return sections
 
 
+def finished_sections(partial_text):
+    """
+    Sections of a still-streaming response that are already complete,
+    i.e. the marker of the following section has been generated.
+    """
+    finished = {}
+    for (key, marker), (_, next_marker) in zip(SECTION_MARKERS, SECTION_MARKERS[1:]):
+        if marker not in partial_text:
+            break
+        body = partial_text.split(marker, 1)[1]
+        if next_marker not in body:
+            break
+        finished[key] = body.split(next_marker, 1)[0].strip()
+    return finished
+
+
+# --- Main Functions ---
+def stream_formalized_sections(scope_of_work, project_timeline, payment_details, use_cache=True):
+    """
+    Streams the formalized text as it is generated.
+
+    Yields (raw_text, sections) pairs, where `sections` holds the sections
+    that are already complete. The last pair carries all three sections;
+    if generation fails, they are the original inputs.
+    With `use_cache`, a response cached for the same inputs is returned
+    as a single pair without generating. Fresh responses are always cached.
+    """
+    prompt = build_prompt(scope_of_work, project_timeline, payment_details)
+    # The template is part of the prompt itself; the decode constraint is not
+    params = dict(GENERATION_KWARGS, max_new_tokens=MAX_NEW_TOKENS, constraint=prompt_version(SECTION_MARKERS))
+    cache = response_cache()
+    if use_cache:
+        cached = cache.get(CACHE_NAMESPACE, prompt, params, similar=True)
+        if cached is not None:
+            yield cached, parse_sections(cached)
+            return
+
+    formatted_text = ""
+
+    try:
+        for delta in stream_generate(prompt, max_new_tokens=MAX_NEW_TOKENS, prefix=FORMALIZE_PREAMBLE,
+                                     constraint=SECTION_GRAMMAR, **GENERATION_KWARGS):
+            formatted_text += delta
+            yield formatted_text, finished_sections(formatted_text)
+
+    except Exception as e:
+        print(f"[LLM Error] Local model generation failed: {e}")
+        yield formatted_text, {
+            "scope_of_work": scope_of_work,
+            "project_timeline": project_timeline,
+            "payment_details": payment_details
+        }
+        return
+
+    formatted_text = formatted_text.strip()
+    if formatted_text:
+        cache.put(CACHE_NAMESPACE, prompt, formatted_text, params, similar=True)
+    with span("parse", chars=len(formatted_text)):
+        sections = parse_sections(formatted_text)
+    yield formatted_text, sections
+
+
+def formalize_contract_text(scope_of_work, project_timeline, payment_details, use_cache=True):
+    """
+    Uses a local Mistral-7B model to formalize construction agreement text
+    into legally suitable contract language.
+    Identical requests are answered from the response cache.
+    """
+    sections = {}
+    for _, sections in stream_formalized_sections(scope_of_work, project_timeline, payment_details, use_cache):
+        pass
+    return sections
+
+
 # --- Example Run ---
 if __name__ == '__main__':
     scope = "Build a two-story house with 3 bedrooms and 2 bathrooms. Use good quality bricks and cement. Painting should be done with weatherproof paint."
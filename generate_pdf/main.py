@@ -1,8 +1,11 @@
 # generate_pdf/main.py
 import streamlit as st
 from datetime import datetime
-from llm_handler import formalize_contract_text
-from pdf import create_agreement_pdf
+from llm_handler import stream_formalized_sections
+from pdf import create_agreement_pdf, preview_agreement
+from shared import tracing
+from shared.models import registry
+from shared.server import server_report
 
 # Set page configuration with custom icon
 st.set_page_config(page_title="Construction Agreement Generator", page_icon="🏗️", layout="centered")
@@ -58,6 +61,12 @@ st.image("logo.png", width=200, caption="Company Logo")
 
 st.title("Construction Agreement Generator")
 
+SECTION_TITLES = {
+    "scope_of_work": "Scope of Work",
+    "project_timeline": "Project Timeline",
+    "payment_details": "Payment Details",
+}
+
 # --- Initialize session state ---
 default_keys = [
     "scope_of_work", "project_timeline", "payment_details",
@@ -100,23 +109,53 @@ st.text_area("Scope of Work", key="scope_of_work", height=150)
 st.text_area("Project Timeline", key="project_timeline", height=150)
 st.text_area("Payment Details", key="payment_details", height=150)
 
+# Page-count preview: the compiled template lays the agreement out without rendering it
+layout = preview_agreement(
+    st.session_state.contractor_name,
+    st.session_state.contractor_address,
+    st.session_state.client_name,
+    st.session_state.client_address,
+    agreement_date,
+    st.session_state.scope_of_work,
+    st.session_state.project_timeline,
+    st.session_state.payment_details,
+    "Authorized Signatory", "Manager",
+    "Authorized Signatory", "Client Representative",
+    logo=uploaded_logo is not None
+)
+st.caption(f"📄 The agreement will run to {layout.pages} page{'s' if layout.pages > 1 else ''}.")
+
 st.divider()
 
 # --- LLM Formatter Button ---
+reuse_rewrite = st.checkbox("Reuse an earlier rewrite of the same text", value=True,
+                            help="Untick to generate a fresh rewrite instead of the cached one.")
 if st.button("✨ Format Text (LLM)", use_container_width=True):
-    with st.spinner("Formalizing content using Mistral LLM..."):
-        formatted = formalize_contract_text(
+    # Stream the rewrite; finished sections render before the rest is done
+    live = st.empty()
+    with tracing.span("formalize", cached=reuse_rewrite):
+        for raw_text, formatted in stream_formalized_sections(
             st.session_state.scope_of_work,
             st.session_state.project_timeline,
-            st.session_state.payment_details
-        )
-
-        st.session_state.formatted_scope_of_work = formatted["scope_of_work"]
-        st.session_state.formatted_project_timeline = formatted["project_timeline"]
-        st.session_state.formatted_payment_details = formatted["payment_details"]
-        st.session_state.pending_update = True
-        st.success("✅ Text formatted successfully! Updating fields...")
-        st.rerun()
+            st.session_state.payment_details,
+            use_cache=reuse_rewrite
+        ):
+            with live.container():
+                for key, title in SECTION_TITLES.items():
+                    if key in formatted:
+                        st.markdown(f"**{title}** ✅")
+                        st.write(formatted[key])
+                st.caption("Formalizing content using Mistral LLM...")
+                st.text(raw_text[-600:])
+
+    live.empty()
+
+    st.session_state.formatted_scope_of_work = formatted["scope_of_work"]
+    st.session_state.formatted_project_timeline = formatted["project_timeline"]
+    st.session_state.formatted_payment_details = formatted["payment_details"]
+    st.session_state.pending_update = True
+    st.success("✅ Text formatted successfully! Updating fields...")
+    st.rerun()
 
 # --- Generate PDF Button ---
 if st.button("📄 Generate Agreement PDF", use_container_width=True):
@@ -145,4 +184,17 @@ if st.button("📄 Generate Agreement PDF", use_container_width=True):
             use_container_width=True
         )
 
-st.info("💡 Tip: You can upload a logo, format text using LLM, and regenerate the PDF anytime.")
\ No newline at end of file
+st.info("💡 Tip: You can upload a logo, format text using LLM, and regenerate the PDF anytime.")
+
+# --- Model status (and the shared inference server's queue, when INFERENCE_SERVER is set) ---
+model_status = registry.report() + server_report()
+if model_status:
+    with st.sidebar.expander("Loaded models"):
+        for line in model_status:
+            st.caption(line)
+
+# --- Debug panel (TRACING=1) ---
+if tracing.enabled():
+    with st.sidebar.expander("Debug: step timings"):
+        for trace in tracing.recent_traces(3):
+            st.code("\n".join(tracing.describe_trace(trace)), language=None)
@@ -1,8 +1,118 @@
 # generate_pdf/pdf.py
+import fpdf
 from fpdf import FPDF
-from datetime import datetime
+from fpdf.enums import MethodReturnValue, XPos, YPos
+from fontTools import ttLib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import NamedTuple, Optional
+import copy
+import hashlib
+import io
 import os
-import tempfile
+import re
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # shared/ lives at the repo root
+from shared.tracing import record
+
+FONT_PATH = os.path.join(os.path.dirname(__file__), "fonts", "DejaVuSans.ttf")
+LOGO_CACHE_SIZE = 32
+# _attach_font and _attach_logo use fpdf internals, verified only against this release and
+# imported only when it is installed; other versions take the public add_font / image path.
+FPDF_FAST_PATH = fpdf.__version__ == "2.8.9"
+
+
+# ---------- Per-process Resource Cache ----------
+_resource_lock = threading.Lock()
+_font_template = None
+_font_data = None
+_logos = OrderedDict()
+
+
+def _parsed_font():
+    """DejaVu parsed once per process (add_font re-reads the whole TTF every time)."""
+    global _font_template, _font_data
+    with _resource_lock:
+        if _font_template is None:
+            probe = FPDF()
+            probe.add_font("DejaVu", "", FONT_PATH)
+            with open(FONT_PATH, "rb") as f:
+                _font_data = f.read()
+            _font_template = probe.fonts["dejavu"]
+    return _font_template
+
+
+def _attach_font(pdf):
+    """
+    Register the cached font on `pdf`. Metrics and glyph maps are shared;
+    the subset map and the fontTools object get a fresh per-document copy,
+    because fpdf subsets the latter in place when the PDF is written.
+    """
+    if not FPDF_FAST_PATH:
+        pdf.add_font("DejaVu", "", FONT_PATH)
+        return
+    from fpdf.fonts import SubsetMap
+
+    font = copy.copy(_parsed_font())
+    font.i = len(pdf.fonts) + 1
+    font.ttfont = ttLib.TTFont(io.BytesIO(_font_data), recalcTimestamp=False, fontNumber=0, lazy=True)
+    font.subset = SubsetMap(font)
+    font.missing_glyphs = []
+    font.biggest_size_pt = 0
+    font._hbfont = None
+    pdf.fonts[font.fontkey] = font
+
+
+def _parsed_logo(logo_bytes):
+    """
+    Logo decoded and compressed once per content hash (small LRU).
+    Returns (fpdf image name, image info, ICC profile bytes or None).
+    """
+    from fpdf.image_datastructures import ImageCache
+    from fpdf.image_parsing import preload_image
+
+    key = hashlib.sha256(logo_bytes).hexdigest()
+    with _resource_lock:
+        if key in _logos:
+            _logos.move_to_end(key)
+            return _logos[key]
+    scratch = ImageCache()
+    name, _, info = preload_image(scratch, logo_bytes)
+    iccp = next(iter(scratch.icc_profiles), None)
+    with _resource_lock:
+        _logos[key] = (name, info, iccp)
+        while len(_logos) > LOGO_CACHE_SIZE:
+            _logos.popitem(last=False)
+    return name, info, iccp
+
+
+def _attach_logo(pdf, logo_bytes):
+    """Seed `pdf`'s image cache so pdf.image(logo_bytes) reuses the parsed logo."""
+    from fpdf.image_datastructures import RasterImageInfo
+
+    name, template, iccp = _parsed_logo(logo_bytes)
+    images = pdf.image_cache.images
+    if name not in images:
+        info = RasterImageInfo(template)
+        info["i"] = len(images) + 1
+        info["usages"] = 0  # pdf.image() counts the actual use
+        if iccp is not None:
+            profiles = pdf.image_cache.icc_profiles
+            info["iccp_i"] = profiles.setdefault(iccp, len(profiles))
+        images[name] = info
+
+
+def preload_resources(logo_bytes=None):
+    """Parse the font (and decode a logo) ahead of time, e.g. in a batch worker initializer."""
+    if os.path.exists(FONT_PATH) and FPDF_FAST_PATH:
+        _parsed_font()
+    if logo_bytes and FPDF_FAST_PATH:
+        _parsed_logo(logo_bytes)
+    agreement_template()
+
 
 class AgreementPDF(FPDF):
     def __init__(self, contractor_name, client_name):
@@ -12,41 +122,332 @@ class AgreementPDF(FPDF):
         self.alias_nb_pages()
         self.set_auto_page_break(auto=True, margin=50)
 
-        # Add Unicode-safe font
-        font_path = os.path.join(os.path.dirname(__file__), "fonts", "DejaVuSans.ttf")
-        if os.path.exists(font_path):
-            self.add_font("DejaVu", "", font_path, uni=True)
-            self.set_font("DejaVu", "", 12)
+        # Add Unicode-safe font (parsed once per process, see _attach_font)
+        if os.path.exists(FONT_PATH):
+            _attach_font(self)
+            self.body_family = "DejaVu"
         else:
-            self.set_font("Arial", "", 12)
+            self.body_family = "helvetica"
+        self.set_font(self.body_family, "", 12)
 
     # ---------- Footer ----------
     def footer(self):
         self.set_y(-30)
-        self.set_font("Arial", size=10)
-        self.cell(90, 10, f"{self.contractor_name}", ln=False, align='L')
-        self.cell(90, 10, f"{self.client_name}", ln=True, align='R')
-        self.cell(90, 5, "__________________________", ln=False, align='L')
-        self.cell(90, 5, "__________________________", ln=True, align='R')
-        self.cell(90, 5, "Signature", ln=False, align='L')
-        self.cell(90, 5, "Signature", ln=True, align='R')
+        # Party names can be any script, so they stay in the body font
+        self.set_font(self.body_family, size=10)
+        self.cell(90, 10, f"{self.contractor_name}", new_x=XPos.RIGHT, new_y=YPos.TOP, align='L')
+        self.cell(90, 10, f"{self.client_name}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+        self.cell(90, 5, "__________________________", new_x=XPos.RIGHT, new_y=YPos.TOP, align='L')
+        self.cell(90, 5, "__________________________", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+        self.cell(90, 5, "Signature", new_x=XPos.RIGHT, new_y=YPos.TOP, align='L')
+        self.cell(90, 5, "Signature", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
         self.ln(3)
-        self.set_font("Arial", 'I', 9)
+        self.set_font("helvetica", 'I', 9)
         self.cell(0, 10, f"Page {self.page_no()} of {{nb}}", align='C')
 
 
 # ---------- Utility Function ----------
+SANITIZE_TABLE = str.maketrans({
+    "—": "-", "–": "-", "“": '"', "”": '"',
+    "’": "'", "‘": "'", "₹": "INR", "•": "-", "‣": "-", "‒": "-"
+})
+
+
 def sanitize_text(text: str) -> str:
-    replacements = {
-        "—": "-", "–": "-", "“": '"', "”": '"',
-        "’": "'", "‘": "'", "₹": "INR", "•": "-", "‣": "-", "‒": "-"
-    }
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-    return text
+    return text.translate(SANITIZE_TABLE)  # one pass for every replacement
+
+
+# ---------- Compiled Agreement Template ----------
+# Headings are static ASCII in core Helvetica Bold (DejaVu is registered in regular style only);
+# everything a user typed is set in the body font.
+TITLE_FONT = ("helvetica", "B", 16)
+HEADING_FONT = ("helvetica", "B", 12)
+BODY_SIZE = 12
+SECTIONS = [
+    ("scope_of_work", "1. Scope of Work:"),
+    ("project_timeline", "2. Project Timeline:"),
+    ("payment_details", "3. Payment Details:"),
+]
+# Text fpdf breaks differently than plain spaces (soft hyphens, NBSP, page breaks, the page alias)
+_UNMODELED = re.compile(r"[\u00ad\u00a0\u000c]|\{nb\}")
+# The spaces multi_cell breaks lines at (fpdf.line_break.BREAKING_SPACE_SYMBOLS)
+BREAKING_SPACES = " \u200b\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2008\u2009\u200a\u205f\u3000\t"
+_BREAKING_SPACES = re.compile(f"([{re.escape(BREAKING_SPACES)}])")
+
+
+class Line(NamedTuple):
+    text: str
+    units: float      # summed glyph widths, in 1/1000 of the font size
+    spaces: int       # breaking spaces, stretched when the line is justified
+    align: str        # "J", or "L" for the last line of a paragraph
+
+
+@dataclass
+class LayoutBlock:
+    name: str
+    page: int
+    y: float               # top of the block on `page`, in mm
+    line_count: int
+    text: str
+    lines: Optional[list]  # wrapped Lines of a text block; None for cells and where fpdf wraps the text itself
+
+
+@dataclass
+class AgreementLayout:
+    pages: int
+    blocks: list
+
+    def block(self, name):
+        return next(block for block in self.blocks if block.name == name)
+
+
+class AgreementTemplate:
+    """
+    The agreement, compiled once per process into a list of operations:
+    fonts resolved, static text sanitized, the header's height fixed and
+    glyph widths looked up once per character.
+
+    Per document only the variable fields are sanitized, wrapped and
+    placed. layout() does exactly that without drawing anything, so a
+    page-count preview costs a few milliseconds; render() draws the same
+    operations through fpdf's public cell / multi_cell.
+    """
+
+    def __init__(self):
+        probe = AgreementPDF("", "")
+        probe.add_page()
+        self.body_font = (probe.body_family, "", BODY_SIZE)
+        probe.set_font(*self.body_font)
+        font = probe.current_font
+        self._ttf = probe.is_ttf_font
+        self._cw = font.cw
+        self._units = {}
+        self.scale = BODY_SIZE * 0.001 / probe.k   # units -> mm, as fpdf computes text widths
+        self.width = probe.w - probe.r_margin - probe.l_margin
+        self.wrap_width = self.width - probe.c_margin - probe.c_margin
+        self.top = probe.t_margin
+        self.page_break_trigger = probe.page_break_trigger
+        # The header (logo or blank space) ends at a fixed height
+        self.header_end = {True: probe.t_margin + 25, False: probe.t_margin + 15}
+        self._normalize = probe.normalize_text
+
+        body = self.body_font
+        self.ops = [
+            ("cell", "title", TITLE_FONT, 10, "C", "Construction Agreement"),
+            ("ln", 5),
+            ("cell", "date", body, 10, "R", lambda f: f"Date: {f['agreement_date'].strftime('%B %d, %Y')}"),
+            ("ln", 10),
+            ("cell", "parties_heading", HEADING_FONT, 10, "L", "Parties:"),
+            ("text", "parties", body, 6, "J", lambda f: sanitize_text(
+                f'This Construction Agreement ("Agreement") is entered into on {f["agreement_date"].strftime("%B %d, %Y")}, '
+                f'between {f["contractor_name"]} (Contractor), located at {f["contractor_address"]}, and '
+                f'{f["client_name"]} (Client), located at {f["client_address"]}.'
+            )),
+            ("ln", 10),
+        ]
+        for key, title in SECTIONS:
+            self.ops += [
+                ("cell", f"{key}_heading", HEADING_FONT, 10, "L", title),
+                ("text", key, body, 6, "J", lambda f, key=key: sanitize_text(f[key])),
+                ("ln", 5),
+            ]
+        self.ops += [
+            ("ln", 10),
+            ("cell", "signatories_heading", HEADING_FONT, 10, "L", "Authorized Signatories:"),
+            ("text", "signatories", body, 6, "J", lambda f: sanitize_text(
+                f"{f['contractor_signer_name']}, {f['contractor_signer_title']} — for {f['contractor_name']}\n"
+                f"{f['client_signer_name']}, {f['client_signer_title']} — for {f['client_name']}"
+            )),
+        ]
+
+    # ---------- Layout ----------
+    def layout(self, fields, logo=False):
+        """Where every block of the agreement for `fields` lands, without rendering it."""
+        page, y = 1, self.header_end[bool(logo)]
+        blocks = []
+        for op in self.ops:
+            if op[0] == "ln":
+                y += op[1]
+                continue
+            kind, name, _, h, _, source = op
+            text = source(fields) if callable(source) else source
+            lines = None
+            if kind == "cell":
+                count = 1
+            else:
+                lines = self.wrap(text)
+                count = len(lines) if lines is not None else len(self._fpdf_lines(text, h))
+            start = None
+            for _ in range(count):
+                if y + h > self.page_break_trigger:
+                    page, y = page + 1, self.top
+                if start is None:
+                    start = (page, y)
+                y += h
+            if kind == "text" and self._trailing_newline(text):
+                y += h  # multi_cell's ln() after a last line that ends in "\n"; no page break check
+            blocks.append(LayoutBlock(name, start[0], start[1], count, text, lines))
+        return AgreementLayout(page, blocks)
+
+    def _width_units(self, text):
+        units = self._units
+        try:
+            return sum(map(units.__getitem__, text))
+        except KeyError:
+            for char in text:
+                if char not in units:
+                    units[char] = self._cw[ord(char)] if self._ttf else self._cw[char]
+            return sum(map(units.__getitem__, text))
+
+    def wrap(self, text):
+        """
+        Lines exactly as multi_cell(0, h, text, align="J") would break them,
+        from per-word widths, or None for text with break rules this does
+        not model (see _UNMODELED).
+        """
+        text = self._normalize(text).replace("\r", "")
+        if _UNMODELED.search(text):
+            return None
+        limit = self.wrap_width + 1e-9
+        scale = self.scale
+        paragraphs = text.split("\n")
+
+        lines = []
+        for number, paragraph in enumerate(paragraphs):
+            pieces, units, spaces, hint = [], 0, 0, None  # hint: the line up to its last space
+            for i, token in enumerate(_BREAKING_SPACES.split(paragraph)):
+                if i % 2:  # a breaking space
+                    width = self._width_units(token)
+                    if (units + width) * scale > limit:
+                        # The space that overflows is dropped
+                        lines.append(Line("".join(pieces), units, spaces, "J"))
+                        pieces, units, spaces, hint = [], 0, 0, None
+                        continue
+                    hint = (len(pieces), units, spaces)
+                    pieces.append(token)
+                    units += width
+                    spaces += 1
+                    continue
+                while token:
+                    width = self._width_units(token)
+                    if (units + width) * scale <= limit:
+                        pieces.append(token)
+                        units += width
+                        break
+                    if hint is not None:
+                        # Break at the last space; the word starts the next line
+                        kept, kept_units, kept_spaces = hint
+                        lines.append(Line("".join(pieces[:kept]), kept_units, kept_spaces, "J"))
+                    else:
+                        # A word wider than the line is cut where it overflows
+                        cut = 1
+                        while cut < len(token) and (units + self._width_units(token[:cut + 1])) * scale <= limit:
+                            cut += 1
+                        lines.append(Line("".join(pieces) + token[:cut], units + self._width_units(token[:cut]),
+                                          spaces, "L"))
+                        token = token[cut:]
+                    pieces, units, spaces, hint = [], 0, 0, None
+            if number < len(paragraphs) - 1 or units:
+                lines.append(Line("".join(pieces), units, spaces, "L"))
+        return lines or [Line("", 0, 0, "L")]
+
+    def _trailing_newline(self, text):
+        return self._normalize(text).replace("\r", "").endswith("\n")
+
+    def _fpdf_lines(self, text, h):
+        probe = AgreementPDF("", "")
+        probe.add_page()
+        probe.set_font(*self.body_font)
+        return probe.multi_cell(0, h, text, dry_run=True, output=MethodReturnValue.LINES)
+
+    # ---------- Rendering ----------
+    def render(self, fields, logo_bytes=None, layout=None):
+        """The agreement for `fields` as an FPDF document, ready to be output."""
+        layout = layout or self.layout(fields, logo=bool(logo_bytes))
+        pdf = AgreementPDF(fields["contractor_name"], fields["client_name"])
+        pdf.add_page()
+
+        # ---------- Header with Left-Aligned Logo ----------
+        if logo_bytes and FPDF_FAST_PATH:
+            # Draw logo in top-left corner (x=10, y=10), decoded once per process
+            _attach_logo(pdf, logo_bytes)
+            pdf.image(logo_bytes, x=10, y=10, w=30)
+        elif logo_bytes:
+            pdf.image(io.BytesIO(logo_bytes), x=10, y=10, w=30)
+        pdf.set_y(self.header_end[bool(logo_bytes)])
+
+        blocks = iter(layout.blocks)
+        for op in self.ops:
+            if op[0] == "ln":
+                pdf.ln(op[1])
+                continue
+            kind, _, font, h, align, _ = op
+            block = next(blocks)
+            pdf.set_font(*font)
+            if kind == "cell":
+                pdf.cell(0, h, text=block.text, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+            else:
+                pdf.multi_cell(0, h, block.text, align=align)
+        return pdf
+
+
+_template = None
+
+
+def agreement_template():
+    """The compiled AgreementTemplate, built once per process."""
+    global _template
+    with _resource_lock:
+        template = _template
+    if template is None:
+        template = AgreementTemplate()
+        with _resource_lock:
+            _template = _template or template
+    return _template
+
+
+def _fields(contractor_name, contractor_address, client_name, client_address, agreement_date, scope_of_work,
+            project_timeline, payment_details, contractor_signer_name, contractor_signer_title,
+            client_signer_name, client_signer_title):
+    return dict(locals())
+
+
+def preview_agreement(*args, logo=False, **kwargs):
+    """
+    Page count and block positions of an agreement without rendering it.
+    Takes the create_agreement_pdf arguments (`logo`: whether one is placed).
+    """
+    return agreement_template().layout(_fields(*args, **kwargs), logo=logo)
 
 
 # ---------- Main PDF Generator ----------
+def agreement_pdf_buffer(*args, logo_bytes=None, **kwargs):
+    """
+    The agreement as fpdf's output buffer (a bytearray), without the bytes
+    copy create_agreement_pdf makes. Takes its arguments. fpdf assembles
+    the whole file in memory, so this buffer is the size of the PDF.
+    """
+    start = time.perf_counter()
+    pdf = agreement_template().render(_fields(*args, **kwargs), logo_bytes)
+    data = pdf.output()
+    record("render", time.perf_counter() - start, pages=pdf.page_no(), bytes=len(data), logo=bool(logo_bytes))
+    return data
+
+
+def write_agreement_pdf(sink, *args, logo_bytes=None, **kwargs):
+    """
+    Render the agreement (create_agreement_pdf's arguments) and write it to
+    `sink` (a path or a writable binary stream) in one write. Returns its size.
+    """
+    data = agreement_pdf_buffer(*args, logo_bytes=logo_bytes, **kwargs)
+    if isinstance(sink, (str, os.PathLike)):
+        with open(sink, "wb") as f:
+            f.write(data)
+    else:
+        sink.write(data)
+    return len(data)
+
+
 def create_agreement_pdf(
     contractor_name, contractor_address,
     client_name, client_address,
@@ -56,63 +457,9 @@ def create_agreement_pdf(
     client_signer_name, client_signer_title,
     logo_bytes=None  # optional
 ):
-    pdf = AgreementPDF(contractor_name, client_name)
-    pdf.add_page()
-
-    # ---------- Header with Left-Aligned Logo ----------
-    if logo_bytes:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-            tmp.write(logo_bytes)
-            tmp.flush()
-            # Draw logo in top-left corner (x=10, y=10)
-            pdf.image(tmp.name, x=10, y=10, w=30)
-        pdf.set_y(10)  # ensure proper spacing
-        pdf.ln(25)     # space below the logo
-    else:
-        pdf.ln(15)
-
-    # ---------- Title and Date ----------
-    pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", "B", 16)
-    pdf.cell(0, 10, txt="Construction Agreement", ln=True, align='C')
-    pdf.ln(5)
-    pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", "", 12)
-    pdf.cell(0, 10, txt=f"Date: {agreement_date.strftime('%B %d, %Y')}", ln=True, align='R')
-    pdf.ln(10)
-
-    # ---------- Parties ----------
-    pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", 'B', 12)
-    pdf.cell(0, 10, txt="Parties:", ln=True)
-    pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", "", 12)
-    pdf.multi_cell(0, 6, sanitize_text(
-        f'This Construction Agreement ("Agreement") is entered into on {agreement_date.strftime("%B %d, %Y")}, '
-        f'between {contractor_name} (Contractor), located at {contractor_address}, and '
-        f'{client_name} (Client), located at {client_address}.'
-    ))
-    pdf.ln(10)
-
-    # ---------- Contract Sections ----------
-    sections = [
-        ("1. Scope of Work:", scope_of_work),
-        ("2. Project Timeline:", project_timeline),
-        ("3. Payment Details:", payment_details),
-    ]
-
-    for title, content in sections:
-        pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", 'B', 12)
-        pdf.cell(0, 10, txt=title, ln=True)
-        pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", "", 12)
-        pdf.multi_cell(0, 6, sanitize_text(content))
-        pdf.ln(5)
-
-    # ---------- Signatories ----------
-    pdf.ln(10)
-    pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", 'B', 12)
-    pdf.cell(0, 10, txt="Authorized Signatories:", ln=True)
-    pdf.set_font("DejaVu" if "DejaVu" in pdf.fonts else "Arial", "", 12)
-    pdf.multi_cell(0, 6, sanitize_text(
-        f"{contractor_signer_name}, {contractor_signer_title} — for {contractor_name}\n"
-        f"{client_signer_name}, {client_signer_title} — for {client_name}"
-    ))
-
     # ---------- Return PDF Bytes ----------
-    return bytes(pdf.output(dest='S'))
+    return bytes(agreement_pdf_buffer(
+        contractor_name, contractor_address, client_name, client_address, agreement_date, scope_of_work,
+        project_timeline, payment_details, contractor_signer_name, contractor_signer_title,
+        client_signer_name, client_signer_title, logo_bytes=logo_bytes
+    ))
@@ -0,0 +1,7 @@
+# shared/__init__.py
+"""
+Code shared by the three Streamlit apps (analyse _pdf, generate_pdf, vector_embed).
+
+The apps are started from their own folders, so each one appends the
+repository root to sys.path before importing from here.
+"""
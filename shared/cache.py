@@ -0,0 +1,221 @@
+# shared/cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from shared.models import draft_model_path, get_embedder, model_path, model_precision
+
+# --- Defaults (overridable through the environment) ---
+CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", str(Path(__file__).resolve().parent.parent / ".response_cache.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+CACHE_MEMORY_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MEMORY_ENTRIES", 256))
+CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL", 7 * 24 * 3600))  # 0 = never expire
+# Cosine similarity for the embedding tier; 0 disables it
+CACHE_SIMILARITY = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", 0))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key        TEXT PRIMARY KEY,
+    scope      TEXT NOT NULL,
+    numbers    TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    embedding  BLOB,
+    created    REAL NOT NULL,
+    accessed   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope, numbers);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def normalize_prompt(prompt):
+    """Whitespace-insensitive form of a prompt; wording and case are kept."""
+    return " ".join(prompt.split())
+
+
+def _numbers(text):
+    # Amounts and dates must match exactly, however similar the rest of the text is
+    return " ".join(re.findall(r"\d+(?:[.,]\d+)*", text))
+
+
+def _digest(*parts):
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def prompt_version(*parts):
+    """Short digest of prompt templates and decode constraints, for `params`: editing them retires old entries."""
+    return _digest(*(part if isinstance(part, str) else json.dumps(part, sort_keys=True) for part in parts))[:16]
+
+
+class ResponseCache:
+    """
+    Cache of generated responses, keyed by the normalized prompt, the model
+    (id, precision and draft model) and the generation parameters.
+
+    Exact tier: an in-memory LRU in front of a SQLite table, so hits survive
+    restarts and are shared by every Streamlit session of the process.
+    Entries older than `ttl` seconds are ignored and pruned; beyond
+    `max_entries` the least recently used rows are evicted.
+
+    Embedding tier (opt-in per lookup and via `similarity`): on an exact
+    miss, a stored response is reused when its prompt embedding has cosine
+    similarity >= `similarity` with the new one, for the same namespace,
+    model and parameters and exactly the same numbers in the prompt.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, memory_entries=CACHE_MEMORY_ENTRIES,
+                 ttl=CACHE_TTL_SECONDS, similarity=CACHE_SIMILARITY, embed=None):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed  # texts -> normalized vectors; defaults to the shared embedder
+        self.hits = {"memory": 0, "disk": 0, "similar": 0}
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    # --- Keys ---
+    @staticmethod
+    def scope(namespace, model=None, params=None):
+        """Identifies what produced a response: namespace, model, precision, draft model and generation parameters."""
+        return _digest(namespace, model or model_path(), model_precision(), draft_model_path() or "",
+                       json.dumps(params or {}, sort_keys=True, default=str))
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def _embed(self, text):
+        if self.embed is not None:
+            vector = self.embed([text])[0]
+        else:
+            vector = get_embedder().encode([text], normalize_embeddings=True)[0]
+        return np.asarray(vector, dtype=np.float32)
+
+    # --- Lookup ---
+    def get(self, namespace, prompt, params=None, model=None, similar=False):
+        """Cached value for this prompt, or None."""
+        prompt = normalize_prompt(prompt)
+        scope = self.scope(namespace, model, params)
+        key = _digest(scope, prompt)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return json.loads(entry[0])  # a fresh copy, callers may mutate it
+
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and not self._expired(row[1], now):
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._remember(key, row[0], row[1])
+                self.hits["disk"] += 1
+                return json.loads(row[0])
+
+        if similar and self.similarity > 0:
+            value = self._get_similar(scope, prompt, now)
+            if value is not None:
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _get_similar(self, scope, prompt, now):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value, embedding, created FROM responses "
+                "WHERE scope = ? AND numbers = ? AND embedding IS NOT NULL",
+                (scope, _numbers(prompt)),
+            ).fetchall()
+        rows = [row for row in rows if not self._expired(row[3], now)]
+        if not rows:
+            return None
+
+        query = self._embed(prompt)
+        matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        with self._lock:
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, rows[best][0]))
+            self.hits["similar"] += 1
+        return json.loads(rows[best][1])
+
+    # --- Store ---
+    def put(self, namespace, prompt, value, params=None, model=None, similar=False):
+        """Store a JSON-serializable value; with `similar`, also index it for the embedding tier."""
+        prompt = normalize_prompt(prompt)
+        scope = self.scope(namespace, model, params)
+        key = _digest(scope, prompt)
+        embedding = self._embed(prompt).tobytes() if similar and self.similarity > 0 else None
+        payload = json.dumps(value)
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, numbers, value, embedding, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, _numbers(prompt), payload, embedding, now, now),
+            )
+            self._remember(key, payload, now)
+            self._evict(now)
+
+    def _remember(self, key, payload, created):
+        self._memory[key] = (payload, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def describe(self):
+        hits = sum(self.hits.values())
+        return (f"Response cache: {len(self)} entries, {hits} hits "
+                f"({self.hits['similar']} similar), {self.misses} misses")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def response_cache():
+    """The process-wide response cache (opened on first use)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,128 @@
+# shared/chunking.py
+import os
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+from shared.tracing import span
+
+# --- Defaults (overridable through the environment) ---
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 32))
+
+# Break before blank lines and before numbered / titled clause headings
+CLAUSE_HEADING = r"\d+(?:\.\d+)*[.)]?\s+\S|(?:section|article|clause|schedule|annex(?:ure)?|appendix)\b"
+CLAUSE_BREAK = re.compile(r"\n\s*\n|\n(?=\s*(?:" + CLAUSE_HEADING + "))", re.IGNORECASE)
+SENTENCE_BREAK = re.compile(r"(?<=[^\d\s][.;:])\s+")  # not after clause numbers like "1."
+
+
+class Chunk(NamedTuple):
+    text: str
+    offset: int   # character offset of the chunk in the source text
+    tokens: int   # embedder tokens, special tokens excluded
+
+
+def split_clauses(text):
+    return [clause.strip() for clause in CLAUSE_BREAK.split(text) if clause and clause.strip()]
+
+
+def _spans(text, pattern, start, end):
+    """(start, end) of the non-blank pieces of text[start:end] between matches of `pattern`."""
+    spans, position = [], start
+    for match in pattern.finditer(text, start, end):
+        spans.append((position, match.start()))
+        position = match.end()
+    spans.append((position, end))
+    result = []
+    for a, b in spans:
+        piece = text[a:b]
+        if piece.strip():
+            a += len(piece) - len(piece.lstrip())
+            b -= len(piece) - len(piece.rstrip())
+            result.append((a, b))
+    return result
+
+
+def _token_count(tokenizer, texts):
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]] if texts else []
+
+
+def cut_by_tokens(text, start, end, tokenizer, max_tokens):
+    """Split one overlong sentence into runs of at most `max_tokens` tokens."""
+    piece = text[start:end]
+    if getattr(tokenizer, "is_fast", False):
+        offsets = tokenizer(piece, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        cuts = [offsets[i][0] for i in range(max_tokens, len(offsets), max_tokens)]
+    else:
+        # Slow tokenizers have no offsets: cut on words, leaving head-room for word pieces
+        words = list(re.finditer(r"\S+", piece))
+        step = max(1, max_tokens // 2)
+        cuts = [words[i].start() for i in range(step, len(words), step)]
+    bounds = [0, *cuts, len(piece)]
+    return [(start + a, start + b) for a, b in zip(bounds, bounds[1:]) if piece[a:b].strip()]
+
+
+def chunk_text(text, tokenizer, max_tokens):
+    """
+    Split `text` into chunks of at most `max_tokens` tokens of `tokenizer`.
+
+    Chunks end on clause and heading boundaries where possible; a clause
+    that is too long on its own is split on sentences, and a sentence that
+    is still too long is cut at token boundaries. Each chunk is a slice of
+    `text`, so its offset locates it (and its page) in the source.
+    """
+    with span("chunk", chars=len(text), limit=max_tokens) as traced:
+        pieces = []
+        clauses = _spans(text, CLAUSE_BREAK, 0, len(text))
+        for (start, end), size in zip(clauses, _token_count(tokenizer, [text[a:b] for a, b in clauses])):
+            if size <= max_tokens:
+                pieces.append((start, end, size))
+                continue
+            sentences = _spans(text, SENTENCE_BREAK, start, end)
+            for (s_start, s_end), s_size in zip(sentences, _token_count(tokenizer, [text[a:b] for a, b in sentences])):
+                if s_size <= max_tokens:
+                    pieces.append((s_start, s_end, s_size))
+                    continue
+                runs = cut_by_tokens(text, s_start, s_end, tokenizer, max_tokens)
+                for (r_start, r_end), r_size in zip(runs, _token_count(tokenizer, [text[a:b] for a, b in runs])):
+                    pieces.append((r_start, r_end, r_size))
+
+        chunks, first, last, size = [], None, None, 0
+        for start, end, tokens in pieces:
+            if first is not None and size + tokens > max_tokens:
+                chunks.append(Chunk(text[first:last], first, size))
+                first, size = None, 0
+            if first is None:
+                first = start
+            last = end
+            size += tokens
+        if first is not None:
+            chunks.append(Chunk(text[first:last], first, size))
+        traced.set(chunks=len(chunks), tokens=sum(chunk.tokens for chunk in chunks))
+        return chunks
+
+
+def embedder_max_tokens(embedder):
+    """Tokens per chunk that the embedder reads without truncating, after [CLS]/[SEP]."""
+    return embedder.max_seq_length - 2
+
+
+def encode_chunks(embedder, chunks, batch_size=EMBED_BATCH_SIZE, on_progress=None):
+    """
+    Embed chunks in batches of similar token length, so little of each
+    batch is padding; returns normalized vectors in the order of `chunks`.
+    `on_progress` is called with the number of chunks embedded so far.
+    """
+    order = sorted(range(len(chunks)), key=lambda i: chunks[i].tokens)
+    vectors = None
+    with span("embed", chunks=len(chunks), tokens=sum(chunk.tokens for chunk in chunks)):
+        for batch_start in range(0, len(order), batch_size):
+            rows = order[batch_start:batch_start + batch_size]
+            batch = embedder.encode([chunks[i].text for i in rows], batch_size=len(rows),
+                                    convert_to_numpy=True, normalize_embeddings=True)
+            if vectors is None:
+                vectors = np.empty((len(chunks), batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+            if on_progress is not None:
+                on_progress(batch_start + len(rows))
+    return vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
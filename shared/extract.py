@@ -0,0 +1,155 @@
+# shared/extract.py
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PyPDF2 import PdfReader
+
+from shared.tracing import record
+
+# --- Defaults (overridable through the environment) ---
+CACHE_DIR = os.environ.get("PDF_TEXT_CACHE_DIR", str(Path(__file__).resolve().parent.parent / ".pdf_text_cache"))
+EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_PAGES = 16   # below this, a process pool costs more than it saves
+PAGES_PER_TASK = 8
+WORKER_READERS = 4        # parsed PDFs each worker keeps, for files whose pages are still queued
+
+
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PageCache:
+    """Extracted page texts on disk, one file per (file hash, page)."""
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = Path(root)
+
+    def _path(self, digest, page):
+        return self.root / digest[:2] / digest / f"{page}.txt"
+
+    def get(self, digest, page):
+        try:
+            return self._path(digest, page).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest, page, text):
+        path = self._path(digest, page)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)  # atomic, so concurrent sessions never read half a page
+
+
+# --- Worker side: each process parses a file once, then extracts page ranges of it ---
+_worker_readers = OrderedDict()   # spooled file path -> PdfReader
+
+
+def _extract_range(path, pages):
+    reader = _worker_readers.get(path)
+    if reader is None:
+        reader = _worker_readers[path] = PdfReader(path)
+        while len(_worker_readers) > WORKER_READERS:
+            _worker_readers.popitem(last=False)
+    _worker_readers.move_to_end(path)
+    return [(page, reader.pages[page].extract_text() or "") for page in pages]
+
+
+# --- One pool per process, shared by every file being extracted ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _extract_pool(workers):
+    """
+    The process-wide extraction pool, started on first use with `workers`
+    processes. Workers are
+    spawned (forkserver where available), never forked: extraction is
+    called from ingest threads, and forking a threaded process can copy
+    held locks into the child.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+
+def _reset_pool(pool):
+    """Drop a broken pool, so the next file starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pages(data, digest=None, workers=EXTRACT_WORKERS, cache=None):
+    """
+    Yield (page index, text) for every page of a PDF, in page order.
+
+    Cached pages are served from disk; the rest are extracted inline (small
+    files) or in the shared process pool (large files), and cached as they
+    arrive, so later pages stream in while earlier ones are already usable.
+    Page ranges of every file in flight are queued on the same pool, so
+    concurrent uploads share the workers instead of each starting its own.
+    """
+    start = time.perf_counter()
+    digest = digest or file_hash(data)
+    cache = cache or PageCache()
+    reader = PdfReader(io.BytesIO(data))
+    cached = {page: cache.get(digest, page) for page in range(len(reader.pages))}
+    missing = [page for page, text in cached.items() if text is None]
+    # Recorded once the last page is out (consumer time between pages included)
+    attrs = dict(pages=len(cached), extracted=len(missing), bytes=len(data))
+
+    if len(missing) < PARALLEL_MIN_PAGES or workers <= 1:
+        for page, text in cached.items():
+            if text is None:
+                text = reader.pages[page].extract_text() or ""
+                cache.put(digest, page, text)
+            yield page, text
+        record("extract", time.perf_counter() - start, **attrs)
+        return
+
+    # Workers read the file from a spool file rather than receiving the bytes with every task
+    spool = tempfile.NamedTemporaryFile(prefix="extract-", suffix=".pdf", delete=False)
+    with spool:
+        spool.write(data)
+    pool = _extract_pool(workers)
+    tasks = [missing[i:i + PAGES_PER_TASK] for i in range(0, len(missing), PAGES_PER_TASK)]
+    futures = []
+    try:
+        futures = [pool.submit(_extract_range, spool.name, pages) for pages in tasks]
+        pending = iter(futures)
+        extracted = {}
+        for page, text in cached.items():
+            while text is None and page not in extracted:
+                for done_page, done_text in next(pending).result():
+                    cache.put(digest, done_page, done_text)
+                    extracted[done_page] = done_text
+            yield page, text if text is not None else extracted.pop(page)
+        record("extract", time.perf_counter() - start, tasks=len(tasks), **attrs)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()  # the consumer stopped early: leave the workers to other files
+        os.unlink(spool.name)
+
+
+def extract_text(data, **kwargs):
+    """Whole-document text, one line break after every non-empty page."""
+    return "".join(text + "\n" for _, text in extract_pages(data, **kwargs) if text)
@@ -0,0 +1,601 @@
+# shared/generation.py
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue
+
+import torch
+from transformers import DynamicCache, LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+from shared.models import get_draft_model, get_model, get_tokenizer, registry
+from shared.server import inference_client
+from shared import tracing
+
+
+class StopOnStrings(StoppingCriteria):
+    """
+    Per-row early stop for batched generation.
+
+    Returns a boolean mask over the batch: a row is finished once its
+    generated text contains one of `stop_strings`. `generate` then pads
+    finished rows and ends the loop as soon as every row is done.
+    """
+
+    def __init__(self, tokenizer, prompt_length, stop_strings, tail_tokens=16):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_strings = list(stop_strings)
+        self.tail_tokens = tail_tokens
+        self.done = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.done is None:
+            self.done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        start = max(self.prompt_length, input_ids.shape[1] - self.tail_tokens)
+        for row in torch.nonzero(~self.done).flatten().tolist():
+            tail = self.tokenizer.decode(input_ids[row, start:], skip_special_tokens=True)
+            if any(stop in tail for stop in self.stop_strings):
+                self.done[row] = True
+        return self.done.clone()
+
+
+# --- Constrained decoding ---
+# Best-scored tokens tried against the grammar before the whole vocabulary is scanned
+CONSTRAINT_CANDIDATES = int(os.environ.get("CONSTRAINT_CANDIDATES", 64))
+_token_texts = {}
+
+
+def token_texts(tokenizer):
+    """Text every vocabulary id adds to decoded output (None for special tokens); cached per tokenizer."""
+    key = id(tokenizer)
+    if key not in _token_texts:
+        special = set(tokenizer.all_special_ids)
+        texts = []
+        for i, token in enumerate(tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))):
+            byte = re.fullmatch(r"<0x([0-9A-Fa-f]{2})>", token or "")
+            if i in special or not token:
+                texts.append(None)
+            elif byte:
+                value = int(byte.group(1), 16)
+                texts.append(chr(value) if value < 0x80 else "\ufffd")  # part of a multi-byte character
+            elif "\u2581" in token:
+                texts.append(token.replace("\u2581", " "))  # sentencepiece word start
+            else:
+                texts.append(tokenizer.convert_tokens_to_string([token]))
+        _token_texts[key] = texts
+    return _token_texts[key]
+
+
+class ConstrainedLogits(LogitsProcessor):
+    """
+    Masks, row by row, every token that would break `grammar` (shared/grammar.py).
+
+    The best-scored CONSTRAINT_CANDIDATES tokens are tried first, so a step
+    usually costs a few dozen automaton steps; the whole vocabulary is only
+    scanned (and cached per state) when none of them fit. Once a row's
+    structure is closed only EOS is allowed, which ends the row right after
+    its closing brace. When the remaining budget is just enough to close the
+    structure, only tokens that close it are allowed, so output cut short by
+    `max_new_tokens` is still valid. Under speculative decoding a row can
+    also step back (rejected draft tokens); its states rewind with it.
+    """
+
+    def __init__(self, tokenizer, grammar, prompt_length, max_new_tokens):
+        self.grammar = grammar
+        self.texts = token_texts(tokenizer)
+        self.eos = tokenizer.eos_token_id
+        self.prompt_length = prompt_length
+        self.max_new_tokens = max_new_tokens
+        self.states = None   # per row: grammar state after each generated token
+        self.tokens = None   # per row: the generated tokens those states follow
+        self._scanned = {}
+        self._by_text = {}
+        for i, text in enumerate(self.texts):
+            if text:
+                self._by_text.setdefault(text, []).append(i)
+        self._longest = max(map(len, self._by_text), default=1)
+
+    def __call__(self, input_ids, scores):
+        if self.states is None:
+            self.states = [[self.grammar.start()] for _ in range(input_ids.shape[0])]
+            self.tokens = [[] for _ in range(input_ids.shape[0])]
+        for row, generated in enumerate(input_ids[:, self.prompt_length:].tolist()):
+            self._sync(row, generated)
+
+        remaining = self.max_new_tokens - (input_ids.shape[1] - self.prompt_length)
+        constrained = torch.full_like(scores, float("-inf"))
+        for row, state in enumerate(states[-1] for states in self.states):
+            allowed = torch.tensor(self._allowed(state, scores[row], remaining), device=scores.device)
+            constrained[row, allowed] = scores[row, allowed]
+            if torch.isinf(constrained[row]).all():
+                constrained[row, allowed] = 0.0  # every fitting token was already filtered out (top-k/top-p)
+        return constrained
+
+    def _sync(self, row, generated):
+        """
+        Bring the row's states in line with its generated tokens. Usually one
+        token was appended; speculative decoding also calls with draft tokens
+        that are later rejected, so the states rewind to the common prefix.
+        """
+        seen, states = self.tokens[row], self.states[row]
+        keep = len(seen)
+        if generated[:keep] != seen:
+            keep = next((i for i, (new, old) in enumerate(zip(generated, seen)) if new != old), len(generated))
+            del seen[keep:], states[keep + 1:]
+        for token in generated[keep:]:
+            state = states[-1]
+            text = self.texts[token] if state is not None and token < len(self.texts) else None
+            states.append(self.grammar.advance(state, text) if text else None)
+            seen.append(token)
+
+    def _fits(self, state, token):
+        text = self.texts[token] if token < len(self.texts) else None
+        return bool(text) and self.grammar.advance(state, text) is not None
+
+    def _closing_tokens(self, closing, remaining):
+        """Tokens that start `closing` and leave enough budget to write the rest of it."""
+        fewest = [0] * (len(closing) + 1)   # fewest tokens that write closing[i:]
+        for i in range(len(closing) - 1, -1, -1):
+            fewest[i] = 1 + min((fewest[j] for j in range(i + 1, min(len(closing), i + self._longest) + 1)
+                                 if closing[i:j] in self._by_text), default=len(closing))
+        steps = {j: 1 + fewest[j] for j in range(1, min(len(closing), self._longest) + 1) if closing[:j] in self._by_text}
+        if not steps:
+            return []
+        # Feasible moves, or the ones that get closest when the budget is already too small
+        limit = max(remaining, min(steps.values()))
+        return [i for j, needed in steps.items() if needed <= limit for i in self._by_text[closing[:j]]]
+
+    def _allowed(self, state, row_scores, remaining):
+        if state is None or self.grammar.is_closed(state):
+            return [self.eos]  # finished (or EOS already emitted): end the row
+        end = [self.eos] if self.grammar.is_complete(state) else []
+
+        closing = self.grammar.closing(state)
+        if closing and remaining <= len(closing):
+            return self._closing_tokens(closing, remaining) + end or [self.eos]
+
+        top = torch.topk(row_scores, min(CONSTRAINT_CANDIDATES, row_scores.shape[0])).indices.tolist()
+        allowed = [i for i in top if i != self.eos and self._fits(state, i)]
+        if allowed:
+            return allowed + end
+        if state not in self._scanned:
+            self._scanned[state] = [i for i in range(len(self.texts)) if self._fits(state, i)]
+        return (self._scanned[state] + end) or [self.eos]
+
+
+# --- Prefix (KV) cache ---
+# Prefilled prompt prefixes kept per model, bounded by their total token count
+# (~128 KB of keys/values per token for Mistral-7B in bf16).
+PREFIX_CACHE_TOKENS = int(os.environ.get("PREFIX_CACHE_TOKENS", 8192))
+
+
+class PrefixCache:
+    """
+    Keys/values of static prompt prefixes (instruction preambles), computed
+    once and reused by every prompt that starts with the same tokens. Least recently used prefixes are
+    dropped once more than `max_tokens` tokens are held.
+    """
+
+    def __init__(self, max_tokens=PREFIX_CACHE_TOKENS):
+        self.max_tokens = max_tokens
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # (model id, prefix ids) -> legacy ((key, value), ...) per layer
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def get(self, model, prefix_ids):
+        key = (id(model), tuple(prefix_ids))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        with tracing.span("prefix_prefill", prefix_tokens=len(prefix_ids)), torch.no_grad():
+            output = model(input_ids=torch.tensor([prefix_ids], device=model.device), use_cache=True)
+        past = _legacy_cache(output.past_key_values)
+        with self._lock:
+            if key not in self._entries and len(prefix_ids) <= self.max_tokens:
+                self._entries[key] = past
+                self._tokens += len(prefix_ids)
+                while self._tokens > self.max_tokens:
+                    (_, old_ids), _ = self._entries.popitem(last=False)
+                    self._tokens -= len(old_ids)
+        return past
+
+
+prefix_cache = PrefixCache()
+
+
+def _legacy_cache(past):
+    """((key, value), ...) per layer, whichever Cache API this transformers version has."""
+    if hasattr(past, "to_legacy_cache"):
+        return past.to_legacy_cache()
+    if hasattr(past, "layers"):
+        return tuple((layer.keys, layer.values) for layer in past.layers)
+    return tuple(past)
+
+
+def _dynamic_cache(layers):
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(layers)
+    return DynamicCache(layers)
+
+
+def prepare_inputs(tokenizer, model, prompts, prefix=None):
+    """
+    Tokenize a batch of prompts for `generate`, reusing cached prefix keys/values.
+
+    `prefix` is a string every prompt starts with, or one string (or None)
+    per prompt. Each row is laid out as [its prefix | padding | the rest],
+    with padding masked out: the prefixes come from `prefix_cache` and are
+    zero-padded to a common length, so only the rest is prefilled.
+    Without usable prefixes this is plain left-padded tokenization.
+    """
+    prompts = list(prompts)
+    prefixes = prefix if isinstance(prefix, (list, tuple)) else [prefix] * len(prompts)
+    if not any(prefixes):
+        return tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+
+    rows = []
+    prefix_ids = {p: tokenizer(p)["input_ids"] for p in set(prefixes) if p}
+    for prompt, text in zip(prompts, prefixes):
+        ids = tokenizer(prompt)["input_ids"]
+        head = prefix_ids.get(text, []) if text and prompt.startswith(text) else []
+        if ids[:len(head)] != head or len(ids) == len(head):
+            head = []  # tokenizes differently inside this prompt, or nothing would be left to prefill
+        rows.append((head, ids[len(head):]))
+
+    head_length = max(len(head) for head, _ in rows)
+    tail_length = max(len(tail) for _, tail in rows)
+    if head_length == 0:
+        return tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+
+    pad = tokenizer.pad_token_id
+    input_ids, attention_mask = [], []
+    for head, tail in rows:
+        gap = head_length - len(head) + tail_length - len(tail)
+        input_ids.append(head + [pad] * gap + tail)
+        attention_mask.append([1] * len(head) + [0] * gap + [1] * len(tail))
+
+    pasts = [prefix_cache.get(model, head) if head else None for head, _ in rows]
+    reference = next(past for past in pasts if past is not None)
+    layers = []
+    for layer, (reference_key, _) in enumerate(reference):
+        keys, values = [], []
+        for past in pasts:
+            if past is None:
+                key = value = reference_key.new_zeros(*reference_key.shape[:2], head_length, reference_key.shape[3])
+            else:
+                key, value = past[layer]
+                missing = head_length - key.shape[2]
+                if missing:
+                    key = torch.nn.functional.pad(key, (0, 0, 0, missing))
+                    value = torch.nn.functional.pad(value, (0, 0, 0, missing))
+            keys.append(key)
+            values.append(value)
+        layers.append((torch.cat(keys), torch.cat(values)))
+
+    cache = _dynamic_cache(tuple(layers))
+    return {
+        "input_ids": torch.tensor(input_ids, device=model.device),
+        "attention_mask": torch.tensor(attention_mask, device=model.device),
+        "past_key_values": cache,
+    }
+
+
+def template_prefix(template):
+    """Static text of a str.format template before its first field, cut after a line break."""
+    head = template[:template.index("{")] if "{" in template else template
+    return head[:head.rfind("\n") + 1]
+
+
+def context_limit(tokenizer, model=None, cap=None):
+    """
+    Usable prompt+completion length: the smallest of the model, tokenizer and
+    `cap` limits. `model` may be a loaded model or just its config
+    (get_model_config), which is all a client of the inference server has.
+    """
+    limits = [cap] if cap else []
+    if 0 < getattr(tokenizer, "model_max_length", 0) < 1_000_000:
+        limits.append(tokenizer.model_max_length)
+    positions = getattr(getattr(model, "config", model), "max_position_embeddings", None)
+    if positions:
+        limits.append(positions)
+    return min(limits) if limits else None
+
+
+class FirstTokenTimer(BaseStreamer):
+    """Notes when `generate` emits its first new token, splitting a call into prefill and decode."""
+
+    def __init__(self):
+        self.prompt_seen = False
+        self.first_token_at = None
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True
+        elif self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def end(self):
+        pass
+
+
+def _trace_generate(start, first_token_at, inputs, new_tokens, **attrs):
+    end = time.perf_counter()
+    first_token_at = first_token_at or end
+    rows = inputs["input_ids"].shape[0]
+    tracing.record("prefill", first_token_at - start, rows=rows, prompt_tokens=int(inputs["attention_mask"].sum()))
+    tracing.record("decode", end - first_token_at, rows=rows, new_tokens=int(new_tokens), **attrs)
+
+
+def _constraint_processors(tokenizer, constraint, prompt_length, max_new_tokens):
+    if constraint is None:
+        return None
+    return LogitsProcessorList([ConstrainedLogits(tokenizer, constraint, prompt_length, max_new_tokens)])
+
+
+# --- Speculative decoding ---
+_same_vocabulary = {}
+
+
+class SpeculationCounter:
+    """
+    Generator and draft forward passes made on the current thread during
+    one speculative generate() call; does nothing without speculation.
+    """
+
+    def __init__(self, model, speculation):
+        self.models = [model, speculation["assistant_model"]] if speculation else []
+        self.passes = [0, 0]
+        self._thread = None
+        self._handles = []
+
+    def __enter__(self):
+        self._thread = threading.get_ident()
+        for i, model in enumerate(self.models):
+            self._handles.append(model.register_forward_hook(lambda *_, i=i: self._count(i)))
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def _count(self, i):
+        if threading.get_ident() == self._thread:  # other sessions may be using the same model
+            self.passes[i] += 1
+
+    def record(self, new_tokens, seconds, rows):
+        """Acceptance into registry.speculative; single plain prompts count as the baseline. Returns trace attributes."""
+        if not self.models:
+            if rows == 1:
+                registry.speculative.record_plain(new_tokens, seconds)
+            return {}
+        generator_passes, drafted = self.passes
+        accepted = registry.speculative.record(new_tokens, seconds, generator_passes, drafted)
+        return {"draft_tokens": drafted, "accepted_tokens": accepted}
+
+
+def _speculation(draft, tokenizer, rows):
+    """
+    generate() arguments that let `draft` propose tokens for the generator
+    to verify, or None. `draft=None` means the configured draft model
+    (DRAFT_MODEL_PATH), `False` turns it off. transformers only speculates
+    for a single sequence, so batches of several prompts decode as before.
+    """
+    if draft is None:
+        draft = get_draft_model()
+    if not draft or rows != 1:
+        return None
+    options = {"assistant_model": draft}
+    draft_tokenizer = get_tokenizer(draft.name_or_path)
+    key = (id(tokenizer), id(draft_tokenizer))
+    if key not in _same_vocabulary:
+        _same_vocabulary[key] = tokenizer.get_vocab() == draft_tokenizer.get_vocab()
+    if not _same_vocabulary[key]:
+        # A draft with another vocabulary: candidates are re-tokenized between the two (slower)
+        options.update(tokenizer=tokenizer, assistant_tokenizer=draft_tokenizer)
+    return options
+
+
+def trim_at_stop(text, stop_strings):
+    for stop in stop_strings or ():
+        text = text.split(stop, 1)[0]
+    return text
+
+
+def generate_batch(prompts, max_new_tokens, stop=None, batch_size=8, model=None, tokenizer=None, prefix=None,
+                   constraint=None, draft=None, **generate_kwargs):
+    """
+    Generate completions for many prompts with padded batches.
+
+    Prompts are sorted by length so each batch carries little padding,
+    left-padded, and decoded together with a shared `max_new_tokens`.
+    Rows stop early on EOS or on any of the `stop` strings. Returns only
+    the completions, in the order of `prompts`. `prefix` marks prompt
+    prefixes whose keys/values are reused (see prepare_inputs). With a
+    `constraint` (a shared.grammar.Grammar), every completion follows it
+    and ends as soon as its structure closes. Batches of one prompt are
+    decoded speculatively when a `draft` model is configured (see _speculation).
+    With INFERENCE_SERVER set, the prompts go to the shared server instead.
+    """
+    client = inference_client() if model is None and tokenizer is None else None
+    if client is not None:
+        if constraint is not None:
+            generate_kwargs["constraint"] = constraint
+        completions = [""] * len(prompts)
+        for row, delta in client.stream(prompts, max_new_tokens, stop=stop, prefix=prefix, **generate_kwargs):
+            completions[row] += delta
+        return [completion.strip() for completion in completions]
+
+    tokenizer = tokenizer or get_tokenizer()
+    model = model or get_model()
+    lengths = [len(ids) for ids in tokenizer(prompts)["input_ids"]]
+    order = sorted(range(len(prompts)), key=lengths.__getitem__)
+
+    completions = [None] * len(prompts)
+    for batch_start in range(0, len(order), batch_size):
+        rows = order[batch_start:batch_start + batch_size]
+        row_prefix = [prefix[i] for i in rows] if isinstance(prefix, (list, tuple)) else prefix
+        inputs = prepare_inputs(tokenizer, model, [prompts[i] for i in rows], row_prefix)
+        prompt_length = inputs["input_ids"].shape[1]
+        criteria = StoppingCriteriaList([StopOnStrings(tokenizer, prompt_length, stop)]) if stop else None
+        processors = _constraint_processors(tokenizer, constraint, prompt_length, max_new_tokens)
+        speculation = _speculation(draft, tokenizer, len(rows))
+        counter = SpeculationCounter(model, speculation)
+
+        timer = FirstTokenTimer() if tracing.enabled() else None
+        start = time.perf_counter()
+        with torch.no_grad(), counter:
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=tokenizer.pad_token_id,
+                stopping_criteria=criteria,
+                logits_processor=processors,
+                streamer=timer,
+                **(speculation or {}),
+                **generate_kwargs
+            )
+        new_tokens = int((outputs[:, prompt_length:] != tokenizer.pad_token_id).sum())
+        seconds = time.perf_counter() - start
+        registry.decode.record(new_tokens, seconds)
+        drafted = counter.record(new_tokens, seconds, len(rows))
+        if timer is not None:
+            _trace_generate(start, timer.first_token_at, inputs, new_tokens, **drafted)
+
+        texts = tokenizer.batch_decode(outputs[:, prompt_length:], skip_special_tokens=True)
+        for i, text in zip(rows, texts):
+            completions[i] = trim_at_stop(text, stop).strip()
+    return completions
+
+
+class BatchTextStreamer(BaseStreamer):
+    """
+    Token streamer that works for any batch size.
+
+    `generate` calls `put` with the prompt first and then with each step's
+    new tokens; every row is decoded on its own and the text deltas are
+    queued as (row, delta) pairs for the consuming thread.
+    """
+
+    def __init__(self, tokenizer, batch_size):
+        self.tokenizer = tokenizer
+        self.tokens = [[] for _ in range(batch_size)]
+        self.texts = [""] * batch_size
+        self.queue = Queue()
+        self.prompt_seen = False
+        self.first_token_at = None
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        for row, new_tokens in enumerate(value.reshape(len(self.tokens), -1).tolist()):
+            self.tokens[row].extend(new_tokens)
+            text = self.tokenizer.decode(self.tokens[row], skip_special_tokens=True)
+            # Wait for the rest of a multi-byte character before emitting
+            if len(text) > len(self.texts[row]) and not text.endswith("\ufffd"):
+                self.queue.put((row, text[len(self.texts[row]):]))
+                self.texts[row] = text
+
+    def end(self):
+        # Flush text held back for a character that never completed (e.g. a cut-off emoji)
+        for row, tokens in enumerate(self.tokens):
+            text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+            if len(text) > len(self.texts[row]):
+                self.queue.put((row, text[len(self.texts[row]):]))
+                self.texts[row] = text
+        self.queue.put(None)
+
+    def __iter__(self):
+        while (item := self.queue.get()) is not None:
+            yield item
+
+
+def stream_batch(prompts, max_new_tokens, stop=None, model=None, tokenizer=None, prefix=None, constraint=None,
+                 draft=None, **generate_kwargs):
+    """
+    Stream completions for a batch of prompts as (row, text delta) pairs.
+
+    Generation runs in a background thread; text after a stop string is
+    never emitted. Errors raised by `generate` are re-raised here.
+    `prefix`, `constraint` and `draft` work as in generate_batch.
+    With INFERENCE_SERVER set, the prompts go to the shared server instead.
+    """
+    client = inference_client() if model is None and tokenizer is None else None
+    if client is not None:
+        if constraint is not None:
+            generate_kwargs["constraint"] = constraint
+        yield from client.stream(prompts, max_new_tokens, stop=stop, prefix=prefix, **generate_kwargs)
+        return
+
+    tokenizer = tokenizer or get_tokenizer()
+    model = model or get_model()
+    inputs = prepare_inputs(tokenizer, model, prompts, prefix)
+    prompt_length = inputs["input_ids"].shape[1]
+    streamer = BatchTextStreamer(tokenizer, len(prompts))
+    criteria = StoppingCriteriaList([StopOnStrings(tokenizer, prompt_length, stop)]) if stop else None
+    processors = _constraint_processors(tokenizer, constraint, prompt_length, max_new_tokens)
+    speculation = _speculation(draft, tokenizer, len(prompts))
+    counter = SpeculationCounter(model, speculation)
+    errors = []
+
+    def run():
+        try:
+            with torch.no_grad(), counter:
+                model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=tokenizer.pad_token_id,
+                    stopping_criteria=criteria,
+                    logits_processor=processors,
+                    streamer=streamer,
+                    **(speculation or {}),
+                    **generate_kwargs
+                )
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+
+    texts = [""] * len(prompts)
+    stopped = [False] * len(prompts)
+    for row, delta in streamer:
+        if stopped[row]:
+            continue
+        text = texts[row] + delta
+        if stop:
+            trimmed = trim_at_stop(text, stop)
+            stopped[row] = trimmed != text
+            text = trimmed
+        if len(text) > len(texts[row]):
+            yield row, text[len(texts[row]):]
+        texts[row] = text
+
+    thread.join()
+    if errors:
+        raise errors[0]
+    new_tokens = sum(token != tokenizer.pad_token_id for row in streamer.tokens for token in row)
+    seconds = time.perf_counter() - start
+    registry.decode.record(new_tokens, seconds)
+    drafted = counter.record(new_tokens, seconds, len(prompts))
+    if tracing.enabled():
+        _trace_generate(start, streamer.first_token_at, inputs, new_tokens, **drafted)
+
+
+def stream_generate(prompt, max_new_tokens, stop=None, **generate_kwargs):
+    """Stream the completion of a single prompt as text deltas."""
+    for _, delta in stream_batch([prompt], max_new_tokens, stop=stop, **generate_kwargs):
+        yield delta
@@ -0,0 +1,249 @@
+# shared/grammar.py
+"""
+Output grammars for constrained decoding (see ConstrainedLogits in shared/generation.py).
+
+A Grammar is a character-level pushdown automaton over immutable states,
+so the logits processor can try a candidate token's text against a row's
+state without copying anything:
+
+    grammar = json_schema({"type": "object", "properties": {...}})
+    state = grammar.advance(grammar.start(), '{"summary": [')   # None: not allowed
+
+Supported JSON schema subset: objects (properties in declared order, all
+of them required), arrays and strings, which is what the prompts ask for.
+section_template() describes marker-separated free text.
+"""
+from functools import lru_cache
+
+WHITESPACE = " \t\n\r"
+MAX_WHITESPACE = 16   # per run: stops a model from padding forever with newlines
+HEX = "0123456789abcdefABCDEF"
+ESCAPES = '"\\/bfnrt'
+
+# --- Nodes (hashable, so states can be cached) ---
+STRING = ("string",)
+FREE = ("free",)
+
+
+def array(item):
+    return ("array", item)
+
+
+def obj(fields):
+    return ("object", tuple(fields))
+
+
+def until(terminator):
+    """Free text that ends with `terminator` (the terminator is part of the output)."""
+    return ("until", terminator)
+
+
+def literal(text):
+    return ("literal", text)
+
+
+def _schema_node(schema):
+    kind = schema.get("type")
+    if kind == "string":
+        return STRING
+    if kind == "array":
+        return array(_schema_node(schema.get("items", {"type": "string"})))
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return obj((name, _schema_node(sub)) for name, sub in properties.items())
+    raise ValueError(f"❌ Unsupported schema type for constrained decoding: {kind!r}")
+
+
+@lru_cache(maxsize=None)
+def _failure(terminator):
+    """KMP failure table, so a partial terminator match survives a mismatch."""
+    table, k = [0] * len(terminator), 0
+    for i in range(1, len(terminator)):
+        while k and terminator[i] != terminator[k]:
+            k = table[k - 1]
+        if terminator[i] == terminator[k]:
+            k += 1
+        table[i] = k
+    return tuple(table)
+
+
+def _minimal(node):
+    """Shortest text that is a complete `node`."""
+    kind = node[0]
+    if kind == "string":
+        return '""'
+    if kind == "array":
+        return "[]"
+    if kind == "object":
+        return "{" + ",".join(f'"{name}":{_minimal(sub)}' for name, sub in node[1]) + "}"
+    if kind in ("until", "literal"):
+        return node[1]
+    return ""
+
+
+class Grammar:
+    """
+    States are tuples of pending tasks, the next one last:
+        ("value", node)          a node still to be produced
+        ("ws", n)                optional whitespace, n characters so far
+        ("lit", text, i)         text[i:] must come next
+        ("str", phase)           JSON string: 0 before the quote, 1 inside,
+                                 2 after a backslash, 3-6 inside a \\uXXXX escape
+        ("items", node)          array just opened: an item or "]"
+        ("more", node)           after an item: "," or "]"
+        ("until", text, j)       free text, j characters of `text` matched
+        ("free",)                any text, to the end
+    """
+
+    def __init__(self, tasks, name):
+        self.name = name
+        self._start = tuple(reversed(tasks))
+
+    def __repr__(self):
+        return f"Grammar({self.name})"
+
+    def __eq__(self, other):
+        return isinstance(other, Grammar) and self._start == other._start
+
+    def __hash__(self):
+        return hash(self._start)
+
+    def start(self):
+        return self._start
+
+    def advance(self, state, text):
+        """State after `text`, or None if the grammar does not allow it."""
+        for char in text:
+            state = self._step(state, char)
+            if state is None:
+                return None
+        return state
+
+    @staticmethod
+    def is_closed(state):
+        """Nothing more may follow: the structure is complete."""
+        return not state
+
+    @staticmethod
+    def is_complete(state):
+        """The output may end here (it may still go on, e.g. trailing free text)."""
+        return all(task[0] in ("ws", "free") or task == ("value", FREE) for task in state)
+
+    @staticmethod
+    def closing(state):
+        """Shortest text that completes `state`."""
+        parts = []
+        for task in reversed(state):
+            kind = task[0]
+            if kind == "value":
+                parts.append(_minimal(task[1]))
+            elif kind == "lit":
+                parts.append(task[1][task[2]:])
+            elif kind == "str":
+                phase = task[1]
+                parts.append('""' if phase in (0, 2) else "0" * (7 - phase) + '"' if phase >= 3 else '"')
+            elif kind in ("items", "more"):
+                parts.append("]")
+            elif kind == "until":
+                parts.append(task[1][task[2]:])
+        return "".join(parts)
+
+    @staticmethod
+    def _step(state, char):
+        while state:
+            task, rest = state[-1], state[:-1]
+            kind = task[0]
+
+            if kind == "value":
+                node = task[1]
+                if node[0] == "string":
+                    state = rest + (("str", 0),)
+                elif node[0] == "array":
+                    state = rest + (("items", node[1]), ("ws", 0), ("lit", "[", 0))
+                elif node[0] == "object":
+                    tasks = [("lit", "{", 0)]
+                    for i, (name, sub) in enumerate(node[1]):
+                        if i:
+                            tasks += [("ws", 0), ("lit", ",", 0)]
+                        tasks += [("ws", 0), ("lit", f'"{name}"', 0), ("ws", 0), ("lit", ":", 0), ("ws", 0), ("value", sub)]
+                    tasks += [("ws", 0), ("lit", "}", 0)]
+                    state = rest + tuple(reversed(tasks))
+                elif node[0] == "literal":
+                    state = rest + (("lit", node[1], 0),)
+                elif node[0] == "until":
+                    state = rest + (("until", node[1], 0),)
+                else:
+                    state = rest + (("free",),)
+                continue
+
+            if kind == "ws":
+                if char in WHITESPACE and task[1] < MAX_WHITESPACE:
+                    return rest + (("ws", task[1] + 1),)
+                state = rest
+                continue
+
+            if kind == "lit":
+                text, i = task[1], task[2]
+                if char != text[i]:
+                    return None
+                return rest + ((("lit", text, i + 1),) if i + 1 < len(text) else ())
+
+            if kind == "str":
+                phase = task[1]
+                if phase == 0:
+                    return rest + (("str", 1),) if char == '"' else None
+                if phase == 1:
+                    if char == '"':
+                        return rest
+                    if char == "\\":
+                        return rest + (("str", 2),)
+                    return None if ord(char) < 0x20 else state
+                if phase == 2:
+                    if char in ESCAPES:
+                        return rest + (("str", 1),)
+                    return rest + (("str", 3),) if char == "u" else None
+                if char not in HEX:
+                    return None
+                return rest + (("str", phase + 1 if phase < 6 else 1),)
+
+            if kind == "items":
+                if char == "]":
+                    return rest
+                state = rest + (("more", task[1]), ("ws", 0), ("value", task[1]))
+                continue
+
+            if kind == "more":
+                if char == "]":
+                    return rest
+                if char == ",":
+                    return rest + (("more", task[1]), ("ws", 0), ("value", task[1]), ("ws", 0))
+                return None
+
+            if kind == "until":
+                text, j = task[1], task[2]
+                failure = _failure(text)
+                while j and char != text[j]:
+                    j = failure[j - 1]
+                if char == text[j]:
+                    j += 1
+                return rest if j == len(text) else rest + (("until", text, j),)
+
+            return state  # free text takes anything
+
+        return None  # the structure is already closed
+
+
+def json_schema(schema):
+    """Grammar for a JSON document matching `schema` (see the module docstring for the subset)."""
+    return Grammar([("ws", 0), ("value", _schema_node(schema))], "json")
+
+
+def section_template(markers):
+    """
+    Grammar for `markers[0]`, text, `markers[1]`, text, ..., text: every
+    marker appears once and in order, the last section runs to the end.
+    """
+    tasks = [("ws", 0), ("value", literal(markers[0]))]
+    tasks += [("value", until(marker)) for marker in markers[1:]]
+    tasks.append(("value", FREE))
+    return Grammar(tasks, "sections")
@@ -0,0 +1,321 @@
+# shared/models.py
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# --- Defaults (overridable through the environment / .env) ---
+DEFAULT_MODEL_PATH = r"C:\Users\shibi\.cache\huggingface\hub\models--mistralai--Mistral-7B-Instruct-v0.2\snapshots\63a8b081895390a26e140280378bc85ec8bce07a"
+DEFAULT_EMBEDDER = "all-MiniLM-L6-v2"
+# auto: the checkpoint dtype, on GPU if there is one. bf16 / int8 / int4 / fp32 select a CPU-friendly precision.
+PRECISIONS = ("auto", "bf16", "int8", "int4", "fp32")
+
+
+def model_path():
+    """Generator snapshot directory or hub id, from MISTRAL_MODEL_PATH."""
+    return os.environ.get("MISTRAL_MODEL_PATH", DEFAULT_MODEL_PATH)
+
+
+def embedder_name():
+    return os.environ.get("EMBEDDING_MODEL", DEFAULT_EMBEDDER)
+
+
+def model_precision():
+    """Generator precision from MODEL_PRECISION (see PRECISIONS)."""
+    precision = os.environ.get("MODEL_PRECISION", "auto").lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"❌ MODEL_PRECISION must be one of {', '.join(PRECISIONS)}, not {precision!r}")
+    return precision
+
+
+def draft_model_path():
+    """Small draft model for speculative decoding, from DRAFT_MODEL_PATH; None (the default) turns it off."""
+    return os.environ.get("DRAFT_MODEL_PATH") or None
+
+
+def speculative_tokens():
+    """Draft tokens proposed per round to start with (SPECULATIVE_TOKENS); adapted to the acceptance rate as it runs."""
+    return int(os.environ.get("SPECULATIVE_TOKENS", 5))
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident memory of this process, or None when it cannot be measured."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # peak, not current
+    except ImportError:
+        return None
+
+
+@dataclass
+class LoadStats:
+    key: str
+    seconds: float
+    rss_before: Optional[int]
+    rss_after: Optional[int]
+
+    @property
+    def rss_delta(self):
+        if self.rss_before is None or self.rss_after is None:
+            return None
+        return self.rss_after - self.rss_before
+
+    def describe(self):
+        text = f"{self.key}: loaded in {self.seconds:.1f}s"
+        if self.rss_delta is not None:
+            text += f", +{self.rss_delta / 2**30:.2f} GB RSS"
+        return text
+
+
+class DecodeStats:
+    """Running tokens/s of everything the generator has produced in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.seconds = 0.0
+        self.last_rate = None
+
+    def record(self, tokens, seconds):
+        with self._lock:
+            self.tokens += tokens
+            self.seconds += seconds
+            self.last_rate = tokens / seconds if seconds else None
+
+    @property
+    def tokens_per_second(self):
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def describe(self):
+        text = f"decode: {self.tokens_per_second:.1f} tok/s over {self.tokens} tokens"
+        if self.last_rate is not None:
+            text += f" (last {self.last_rate:.1f} tok/s)"
+        rss = rss_bytes()
+        if rss is not None:
+            text += f", {rss / 2**30:.1f} GB RSS"
+        return text
+
+
+class SpeculativeStats:
+    """
+    Draft acceptance and speed of speculative decoding, against plain
+    decoding of single prompts (the only case speculative decoding covers).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.seconds = 0.0
+        self.target_passes = 0
+        self.drafted = 0
+        self.accepted = 0
+        self.plain_tokens = 0
+        self.plain_seconds = 0.0
+
+    def record(self, tokens, seconds, target_passes, drafted):
+        # Every verification pass yields the accepted draft tokens plus one of the generator's own
+        accepted = min(drafted, max(0, tokens - target_passes))
+        with self._lock:
+            self.tokens += tokens
+            self.seconds += seconds
+            self.target_passes += target_passes
+            self.drafted += drafted
+            self.accepted += accepted
+        return accepted
+
+    def record_plain(self, tokens, seconds):
+        with self._lock:
+            self.plain_tokens += tokens
+            self.plain_seconds += seconds
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def speedup(self):
+        """Speculative over plain tokens/s, once both have been measured."""
+        if not (self.seconds and self.plain_tokens and self.plain_seconds):
+            return None
+        return (self.tokens / self.seconds) / (self.plain_tokens / self.plain_seconds)
+
+    def describe(self):
+        text = (f"speculative: {self.acceptance_rate:.0%} of {self.drafted} draft tokens accepted, "
+                f"{self.tokens / max(self.target_passes, 1):.2f} tokens per generator pass, "
+                f"{self.tokens / self.seconds if self.seconds else 0.0:.1f} tok/s")
+        if self.speedup is not None:
+            text += f" ({self.speedup:.2f}x plain decoding)"
+        return text
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Every object is built lazily on first use and then shared by all
+    Streamlit sessions and reruns in the process. Loading is guarded by a
+    per-key lock, so concurrent sessions asking for the same model wait for
+    a single load instead of each starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._entries = {}
+        self.stats = {}
+        self.decode = DecodeStats()
+        self.speculative = SpeculativeStats()
+
+    def get(self, key, loader):
+        if key in self._entries:
+            return self._entries[key]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._entries:
+                before = rss_bytes()
+                start = time.perf_counter()
+                self._entries[key] = loader()
+                self.stats[key] = LoadStats(key, time.perf_counter() - start, before, rss_bytes())
+                print(f"✅ {self.stats[key].describe()}")
+        return self._entries[key]
+
+    def loaded(self, key):
+        return key in self._entries
+
+    def report(self):
+        """One human-readable line per loaded model, plus decode throughput once there is any."""
+        lines = [stats.describe() for stats in self.stats.values()]
+        if self.decode.tokens:
+            lines.append(self.decode.describe())
+        if self.speculative.tokens:
+            lines.append(self.speculative.describe())
+        return lines
+
+
+registry = ModelRegistry()
+
+
+# --- Loaders ---
+def _check_path(path):
+    # Absolute paths must exist locally; anything else is treated as a hub id
+    if os.path.isabs(path) and not os.path.isdir(path):
+        raise FileNotFoundError(
+            f"❌ Model directory not found at: {path}\n"
+            "Set MISTRAL_MODEL_PATH to the local snapshot path."
+        )
+
+
+def get_tokenizer(path=None):
+    from transformers import AutoTokenizer
+
+    path = path or model_path()
+
+    def load():
+        _check_path(path)
+        tokenizer = AutoTokenizer.from_pretrained(path, legacy=False)
+        # Mistral ships without a pad token; batched decoder-only generation pads on the left
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+        return tokenizer
+
+    return registry.get(f"tokenizer:{path}", load)
+
+
+def get_model_config(path=None):
+    """The generator's config.json only (context length etc.), without loading any weights."""
+    from transformers import AutoConfig
+
+    path = path or model_path()
+
+    def load():
+        _check_path(path)
+        return AutoConfig.from_pretrained(path)
+
+    return registry.get(f"config:{path}", load)
+
+
+def _load_options(precision):
+    """from_pretrained keyword arguments for a precision."""
+    import torch
+
+    if precision == "auto":
+        return dict(device_map="auto", torch_dtype="auto")
+    if precision == "fp32":
+        return dict(device_map="cpu", torch_dtype=torch.float32)
+
+    # Low precision CPU modes: weights stay in bf16 (~14 GB for 7B) unless quantized further
+    if not torch.ops.mkldnn._is_mkldnn_bf16_supported():
+        print("⚠️ This CPU has no native bf16 support; bf16 matmuls will be emulated and slow")
+    options = dict(device_map="cpu", torch_dtype=torch.bfloat16, low_cpu_mem_usage=True)
+    if precision in ("int8", "int4"):
+        # Weight-only quantization (~7.5 GB int8, ~4 GB int4), activations stay in bf16
+        try:
+            from transformers import QuantoConfig
+            import optimum.quanto  # noqa: F401  (QuantoConfig needs it at load time)
+        except ImportError:
+            raise RuntimeError(f"❌ MODEL_PRECISION={precision} needs the optimum-quanto package (pip install optimum-quanto)")
+        options["quantization_config"] = QuantoConfig(weights=precision)
+    return options
+
+
+def _load_causal_lm(path, precision):
+    from transformers import AutoModelForCausalLM
+    import torch
+
+    _check_path(path)
+    threads = os.environ.get("MODEL_THREADS")
+    if threads:
+        # e.g. half the cores each when two model workers share a node
+        torch.set_num_threads(int(threads))
+    options = _load_options(precision)
+    try:
+        model = AutoModelForCausalLM.from_pretrained(path, **options)
+    except Exception as e:
+        raise RuntimeError(f"❌ Failed to load local model: {e}")
+    model.eval()
+    return model
+
+
+def get_model(path=None, precision=None):
+    path = path or model_path()
+    precision = precision or model_precision()
+    return registry.get(f"generator:{path}:{precision}", lambda: _load_causal_lm(path, precision))
+
+
+def get_draft_model(path=None, precision=None):
+    """
+    The draft model for speculative decoding (DRAFT_MODEL_PATH), or None
+    when none is configured. It is loaded like the generator, so both end
+    up on the same device; it should share the generator's tokenizer
+    (e.g. a small Mistral-vocabulary model), though any causal LM works.
+    """
+    path = path or draft_model_path()
+    if path is None:
+        return None
+    precision = precision or model_precision()
+
+    def load():
+        draft = _load_causal_lm(path, precision)
+        # Start at SPECULATIVE_TOKENS; grow the window while drafts are accepted, shrink it when not
+        draft.generation_config.num_assistant_tokens = speculative_tokens()
+        draft.generation_config.num_assistant_tokens_schedule = "heuristic"
+        return draft
+
+    return registry.get(f"draft:{path}:{precision}", load)
+
+
+def get_embedder(name=None):
+    from sentence_transformers import SentenceTransformer
+
+    name = name or embedder_name()
+    return registry.get(f"embedder:{name}", lambda: SentenceTransformer(name))
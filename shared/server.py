@@ -0,0 +1,432 @@
+# shared/server.py
+"""
+Shared inference service: one process owns the generator and serves
+all three apps, batching concurrent requests together.
+
+    python -m shared.server --address localhost:7011
+
+Apps opt in through INFERENCE_SERVER:
+    unset        generate in the calling thread (default)
+    inprocess    queue and batch requests of all sessions of this process
+    host:port    send requests to a running `python -m shared.server`
+
+Connections carry pickled messages, so the server and its clients both
+refuse to run without an explicit INFERENCE_AUTHKEY, and the server only
+binds to loopback or a Unix socket unless started with --allow-remote.
+"""
+import argparse
+import ipaddress
+import os
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+# --- Defaults (overridable through the environment) ---
+INFERENCE_SERVER = os.environ.get("INFERENCE_SERVER", "")
+INFERENCE_AUTHKEY = os.environ.get("INFERENCE_AUTHKEY", "")   # shared secret, no default
+MIN_AUTHKEY_LENGTH = 16
+MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", 8))
+MAX_WAIT_SECONDS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 50)) / 1000
+MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", 64))
+REQUEST_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", 600))
+
+
+class ServerBusy(RuntimeError):
+    """The request queue is full; retry later."""
+
+
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    return (host or "localhost", int(port)) if sep and port.isdigit() else address
+
+
+def is_local(address):
+    """True for a Unix socket path or a loopback host."""
+    if isinstance(address, str):
+        return True
+    host = address[0].strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def resolve_authkey(authkey=None):
+    """
+    The connection authkey as bytes. multiprocessing connections unpickle
+    what the peer sends, so a missing or short key is refused rather than
+    replaced by a default anyone could know.
+    """
+    key = INFERENCE_AUTHKEY if authkey is None else authkey
+    key = key.encode() if isinstance(key, str) else key
+    if len(key) < MIN_AUTHKEY_LENGTH:
+        raise RuntimeError(
+            f"❌ Set INFERENCE_AUTHKEY to a secret of at least {MIN_AUTHKEY_LENGTH} characters, the same for the "
+            "server and every app (e.g. python -c \"import secrets; print(secrets.token_hex(16))\")"
+        )
+    return key
+
+
+class _Request:
+    __slots__ = ("prompt", "prefix", "row", "out", "key", "max_new_tokens", "stop", "kwargs", "enqueued", "deadline",
+                 "abandoned")
+
+    def __init__(self, prompt, prefix, row, out, max_new_tokens, stop, kwargs, timeout):
+        self.prompt = prompt
+        self.prefix = prefix  # rows with different prefixes still batch together
+        self.row = row
+        self.out = out
+        self.max_new_tokens = max_new_tokens
+        self.stop = list(stop or [])
+        self.kwargs = kwargs
+        # Only requests with identical settings can share a generate call
+        self.key = (max_new_tokens, tuple(self.stop), tuple(sorted(kwargs.items())))
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout
+        self.abandoned = False  # set once the client stops waiting (timeout, error, closed stream)
+
+
+class ServerMetrics:
+    """Queue depth, batch sizes and latency percentiles over the last `window` requests."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.queue_wait = deque(maxlen=window)
+        self.first_token = deque(maxlen=window)
+        self.latency = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.abandoned = 0
+        self.failed = 0
+
+    def record_batch(self, requests, started):
+        with self._lock:
+            self.batch_sizes.append(len(requests))
+            self.queue_wait.extend(started - r.enqueued for r in requests)
+
+    def record_done(self, request, first_token_at):
+        with self._lock:
+            self.completed += 1
+            self.latency.append(time.monotonic() - request.enqueued)
+            if first_token_at is not None:
+                self.first_token.append(first_token_at - request.enqueued)
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return {"p50": None, "p95": None}
+        values = sorted(values)
+        return {"p50": statistics.median(values), "p95": values[min(len(values) - 1, int(0.95 * len(values)))]}
+
+    def snapshot(self, queue_depth, in_flight):
+        with self._lock:
+            return {
+                "queue_depth": queue_depth,
+                "in_flight": in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "abandoned": self.abandoned,
+                "failed": self.failed,
+                "mean_batch_size": statistics.fmean(self.batch_sizes) if self.batch_sizes else None,
+                "queue_wait_seconds": self._percentiles(self.queue_wait),
+                "first_token_seconds": self._percentiles(self.first_token),
+                "latency_seconds": self._percentiles(self.latency),
+            }
+
+
+class InferenceServer:
+    """
+    Owns the shared generator and serves requests from any thread.
+
+    Requests wait in a bounded queue (full queue: ServerBusy). A single
+    worker thread takes the oldest request, waits up to `max_wait` seconds
+    for more with the same settings, and streams them through the model as
+    one padded batch of up to `max_batch` prompts. Requests still queued
+    after their timeout, or whose client has stopped waiting, are dropped
+    without being generated.
+
+    `generate` (stream_batch's signature) defaults to the shared model.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT_SECONDS, max_queue=MAX_QUEUE, timeout=REQUEST_TIMEOUT,
+                 generate=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._generate = generate
+        self.metrics = ServerMetrics()
+        self._pending = queue.Queue(maxsize=max_queue)
+        self._backlog = deque()   # dequeued but not batchable with the previous batch
+        self._admit = threading.Lock()
+        self._in_flight = 0
+        self._worker = threading.Thread(target=self._run, name="inference-server", daemon=True)
+        self._worker.start()
+
+    # --- Client side ---
+    def stream(self, prompts, max_new_tokens, stop=None, timeout=None, prefix=None, **generate_kwargs):
+        """Same contract as shared.generation.stream_batch: yields (row, text delta) pairs."""
+        timeout = timeout or self.timeout
+        out = queue.Queue()
+        prefixes = prefix if isinstance(prefix, (list, tuple)) else [prefix] * len(prompts)
+        requests = [_Request(prompt, row_prefix, row, out, max_new_tokens, stop, generate_kwargs, timeout)
+                    for row, (prompt, row_prefix) in enumerate(zip(prompts, prefixes))]
+        with self._admit:
+            # All rows of a call are admitted together or not at all
+            if self._pending.maxsize - self._pending.qsize() < len(requests):
+                self.metrics.count("rejected")
+                raise ServerBusy(f"❌ Inference queue is full ({self._pending.maxsize} requests), try again shortly")
+            for request in requests:
+                self._pending.put_nowait(request)
+
+        open_rows = len(prompts)
+        deadline = time.monotonic() + timeout
+        try:
+            while open_rows:
+                try:
+                    row, item = out.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise TimeoutError(f"❌ No response from the inference server within {timeout:.0f}s")
+                if item is None:
+                    open_rows -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield row, item
+        finally:
+            if open_rows:
+                for request in requests:
+                    request.abandoned = True  # rows still queued are dropped, not generated
+
+    def describe_metrics(self):
+        return self.metrics.snapshot(self._pending.qsize() + len(self._backlog), self._in_flight)
+
+    # --- Worker side ---
+    def _next(self, timeout=None):
+        if self._backlog:
+            return self._backlog.popleft()
+        return self._pending.get(timeout=timeout)
+
+    def _wanted(self, request):
+        """False for a request nobody waits for any more; it is dropped and counted."""
+        if request.abandoned:
+            self.metrics.count("abandoned")
+            return False
+        if time.monotonic() > request.deadline:
+            self.metrics.count("timed_out")
+            request.out.put((request.row, TimeoutError("❌ Request timed out in the inference queue")))
+            return False
+        return True
+
+    def _collect(self):
+        first = self._next()
+        while not self._wanted(first):
+            first = self._next()
+        batch, key = [first], first.key
+        skipped = []
+        # Matching requests that were set aside earlier go first
+        for request in list(self._backlog):
+            if len(batch) < self.max_batch and request.key == key:
+                self._backlog.remove(request)
+                if self._wanted(request):
+                    batch.append(request)
+        window_end = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request.key != key:
+                skipped.append(request)
+            elif self._wanted(request):
+                batch.append(request)
+        self._backlog.extend(skipped)
+        return batch
+
+    def _stream_batch(self, prompts, max_new_tokens, **kwargs):
+        if self._generate is not None:
+            return self._generate(prompts, max_new_tokens, **kwargs)
+        from shared.generation import stream_batch
+        from shared.models import get_model, get_tokenizer
+
+        return stream_batch(prompts, max_new_tokens, model=get_model(), tokenizer=get_tokenizer(), **kwargs)
+
+    def _run(self):
+        while True:
+            live = self._collect()
+            self.metrics.record_batch(live, time.monotonic())
+            self._in_flight = len(live)
+            first_token = [None] * len(live)
+            head = live[0]
+            try:
+                for row, delta in self._stream_batch([r.prompt for r in live], head.max_new_tokens,
+                                                     stop=head.stop or None, prefix=[r.prefix for r in live],
+                                                     **head.kwargs):
+                    if first_token[row] is None:
+                        first_token[row] = time.monotonic()
+                    live[row].out.put((live[row].row, delta))
+            except Exception as e:
+                for request in live:
+                    self.metrics.count("failed")
+                    request.out.put((request.row, RuntimeError(f"❌ Generation failed: {e}")))
+            else:
+                for request, first in zip(live, first_token):
+                    self.metrics.record_done(request, first)
+                    request.out.put((request.row, None))
+            finally:
+                self._in_flight = 0
+
+
+class RemoteInference:
+    """Client for a `python -m shared.server` process; same interface as InferenceServer."""
+
+    def __init__(self, address, authkey=None, timeout=REQUEST_TIMEOUT):
+        self.address = parse_address(address)
+        self.authkey = resolve_authkey(authkey)
+        self.timeout = timeout
+
+    def _call(self, message):
+        conn = Client(self.address, authkey=self.authkey)
+        conn.send(message)
+        return conn
+
+    def stream(self, prompts, max_new_tokens, stop=None, timeout=None, prefix=None, **generate_kwargs):
+        timeout = timeout or self.timeout
+        conn = self._call({"op": "stream", "prompts": list(prompts), "max_new_tokens": max_new_tokens,
+                           "stop": stop, "timeout": timeout, "prefix": prefix, "kwargs": generate_kwargs})
+        try:
+            while True:
+                if not conn.poll(timeout):
+                    raise TimeoutError(f"❌ No response from the inference server within {timeout:.0f}s")
+                kind, *payload = conn.recv()
+                if kind == "delta":
+                    yield payload[0], payload[1]
+                elif kind == "done":
+                    return
+                else:
+                    error, text = payload
+                    raise (ServerBusy if error == "ServerBusy" else TimeoutError if error == "TimeoutError" else RuntimeError)(text)
+        finally:
+            conn.close()
+
+    def describe_metrics(self):
+        conn = self._call({"op": "metrics"})
+        try:
+            return conn.recv()
+        finally:
+            conn.close()
+
+
+def _handle(conn, server):
+    try:
+        message = conn.recv()
+        if message["op"] == "metrics":
+            conn.send(server.describe_metrics())
+            return
+        try:
+            for row, delta in server.stream(message["prompts"], message["max_new_tokens"], stop=message["stop"],
+                                            timeout=message["timeout"], prefix=message.get("prefix"),
+                                            **message["kwargs"]):
+                conn.send(("delta", row, delta))
+            conn.send(("done",))
+        except Exception as e:
+            conn.send(("error", type(e).__name__, str(e)))
+    except (EOFError, OSError):
+        pass  # client went away
+    finally:
+        conn.close()
+
+
+def serve(address, server=None, authkey=None, allow_remote=False):
+    """
+    Accept requests on `address` until interrupted; one thread per connection.
+    Non-loopback addresses need `allow_remote` (and a network you trust).
+    """
+    authkey = resolve_authkey(authkey)
+    listen_on = parse_address(address)
+    if not is_local(listen_on) and not allow_remote:
+        raise RuntimeError(f"❌ {address} is reachable from other hosts; pass --allow-remote to serve on it anyway")
+    server = server or InferenceServer()
+    with Listener(listen_on, authkey=authkey) as listener:
+        print(f"✅ Inference server listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                continue  # failed handshake, e.g. wrong authkey
+            threading.Thread(target=_handle, args=(conn, server), daemon=True).start()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def inference_client():
+    """The configured InferenceServer / RemoteInference, or None to generate in the caller's thread."""
+    global _client
+    if not INFERENCE_SERVER:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = InferenceServer() if INFERENCE_SERVER == "inprocess" else RemoteInference(INFERENCE_SERVER)
+    return _client
+
+
+def server_report():
+    """Sidebar lines on the shared inference server's queue and latency; empty when INFERENCE_SERVER is unset."""
+    if not INFERENCE_SERVER:
+        return []
+    try:
+        metrics = inference_client().describe_metrics()
+    except (OSError, EOFError, RuntimeError) as e:  # not running, or no INFERENCE_AUTHKEY
+        return [f"⚠️ Inference server unavailable: {e}"]
+
+    def seconds(p):
+        return "-" if p is None else f"{p * 1000:.0f} ms"
+
+    batch = metrics["mean_batch_size"]
+    return [
+        f"Inference server: {metrics['queue_depth']} queued, {metrics['in_flight']} in flight, "
+        f"mean batch {batch:.1f}" if batch is not None else
+        f"Inference server: {metrics['queue_depth']} queued, {metrics['in_flight']} in flight",
+        f"Requests: {metrics['completed']} done, {metrics['rejected']} rejected, {metrics['timed_out']} timed out, "
+        f"{metrics['abandoned']} abandoned, {metrics['failed']} failed",
+        f"Queue wait p50/p95 {seconds(metrics['queue_wait_seconds']['p50'])}/"
+        f"{seconds(metrics['queue_wait_seconds']['p95'])}, first token p50/p95 "
+        f"{seconds(metrics['first_token_seconds']['p50'])}/{seconds(metrics['first_token_seconds']['p95'])}",
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the shared generator to all apps over a local socket.")
+    parser.add_argument("--address", default="localhost:7011", help="host:port or Unix socket path")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_SECONDS * 1000)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    parser.add_argument("--allow-remote", action="store_true", help="allow binding to a non-loopback address")
+    args = parser.parse_args(argv)
+
+    resolve_authkey()  # fail before loading the model
+    from shared.models import get_model, get_tokenizer
+    get_tokenizer(), get_model()  # load before accepting requests
+    serve(args.address, InferenceServer(args.max_batch, args.max_wait_ms / 1000, args.max_queue),
+          allow_remote=args.allow_remote)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# shared/tracing.py
+"""
+Opt-in timing spans around the hot paths of the three apps.
+
+    with span("embed", chunks=len(chunks)) as s:
+        vectors = ...
+        s.set(tokens=total)
+
+Tracing is off unless TRACING=1 (or enable() is called); span() then
+returns a shared no-op object, so instrumented code pays one function call.
+When on, every finished span records its duration, its attributes (token
+counts, sizes) and the peak RSS of the process, and is
+    logged         as one JSON line on the "hive.trace" logger (TRACE_LOG or stderr)
+    aggregated     into Prometheus text metrics: render_metrics(), or over HTTP
+                   on TRACE_METRICS_PORT (GET /metrics)
+    kept           with its child spans, for the Streamlit debug panels (recent_traces())
+"""
+import contextvars
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from shared.models import rss_bytes
+
+# --- Defaults (overridable through the environment) ---
+TRACING = os.environ.get("TRACING", "").lower() in ("1", "true", "yes", "on")
+TRACE_LOG = os.environ.get("TRACE_LOG", "")             # JSON lines file; empty = stderr
+TRACE_METRICS_PORT = int(os.environ.get("TRACE_METRICS_PORT", 0))   # 0 = no HTTP endpoint
+TRACE_KEEP = int(os.environ.get("TRACE_KEEP", 50))      # finished top-level spans kept for the UI
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+logger = logging.getLogger("hive.trace")
+_current = contextvars.ContextVar("hive_trace_span", default=None)
+_trace_ids = itertools.count(1)
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process so far, or None when it cannot be measured."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return rss_bytes()
+
+
+class _NoSpan:
+    """What span() returns while tracing is off."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    """One timed step; spans opened inside it (same thread / context) become its children."""
+
+    __slots__ = ("name", "attrs", "seconds", "peak_rss", "children", "parent", "trace_id", "_start", "_token")
+
+    def __init__(self, name, attrs, seconds=None):
+        self.name = name
+        self.attrs = attrs
+        self.seconds = seconds
+        self.peak_rss = None
+        self.children = []
+        self.parent = _current.get()
+        self.trace_id = self.parent.trace_id if self.parent else next(_trace_ids)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        tracer.finish(self)
+        return False
+
+    def as_dict(self):
+        record = {"span": self.name, "trace": self.trace_id, "seconds": round(self.seconds, 6)}
+        if self.parent is not None:
+            record["parent"] = self.parent.name
+        record.update(self.attrs)
+        if self.peak_rss is not None:
+            record["peak_rss"] = self.peak_rss
+        return record
+
+
+class _SpanMetrics:
+    __slots__ = ("count", "seconds", "buckets", "errors", "tokens")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.errors = 0
+        self.tokens = {}   # attribute name (e.g. "prompt_tokens") -> total
+
+
+class Tracer:
+    """Collects finished spans: log lines, per-name aggregates and the recent top-level spans."""
+
+    def __init__(self, keep=TRACE_KEEP):
+        self._lock = threading.Lock()
+        self.metrics = {}
+        self.recent = deque(maxlen=keep)
+
+    def finish(self, span):
+        span.peak_rss = peak_rss_bytes()
+        with self._lock:
+            metrics = self.metrics.get(span.name)
+            if metrics is None:
+                metrics = self.metrics[span.name] = _SpanMetrics()
+            metrics.count += 1
+            metrics.seconds += span.seconds
+            for i, bound in enumerate(BUCKETS):
+                if span.seconds <= bound:
+                    metrics.buckets[i] += 1
+            if "error" in span.attrs:
+                metrics.errors += 1
+            for key, value in span.attrs.items():
+                if key.endswith("tokens") and isinstance(value, int):
+                    metrics.tokens[key] = metrics.tokens.get(key, 0) + value
+            if span.parent is None:
+                self.recent.append(span)
+            else:
+                span.parent.children.append(span)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(span.as_dict(), default=str))
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            "# HELP hive_span_seconds Duration of traced steps.",
+            "# TYPE hive_span_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self.metrics.items())
+            for name, metrics in items:
+                label = _label(name)
+                for bound, count in zip(BUCKETS, metrics.buckets):
+                    lines.append(f'hive_span_seconds_bucket{{span="{label}",le="{bound}"}} {count}')
+                lines.append(f'hive_span_seconds_bucket{{span="{label}",le="+Inf"}} {metrics.count}')
+                lines.append(f'hive_span_seconds_sum{{span="{label}"}} {metrics.seconds:.6f}')
+                lines.append(f'hive_span_seconds_count{{span="{label}"}} {metrics.count}')
+            lines += ["# HELP hive_span_errors_total Traced steps that raised.",
+                      "# TYPE hive_span_errors_total counter"]
+            lines += [f'hive_span_errors_total{{span="{_label(name)}"}} {metrics.errors}' for name, metrics in items]
+            lines += ["# HELP hive_span_tokens_total Tokens processed by traced steps.",
+                      "# TYPE hive_span_tokens_total counter"]
+            for name, metrics in items:
+                for kind, total in sorted(metrics.tokens.items()):
+                    lines.append(f'hive_span_tokens_total{{span="{_label(name)}",kind="{_label(kind)}"}} {total}')
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines += ["# HELP hive_process_peak_rss_bytes Peak resident memory of the process.",
+                      "# TYPE hive_process_peak_rss_bytes gauge",
+                      f"hive_process_peak_rss_bytes {peak}"]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self.metrics.clear()
+            self.recent.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+tracer = Tracer()
+
+
+# --- Instrumentation API ---
+def enabled():
+    return TRACING
+
+
+def span(name, **attrs):
+    """Context manager timing one step; a no-op unless tracing is enabled."""
+    if not TRACING:
+        return _NO_SPAN
+    return Span(name, attrs)
+
+
+def record(name, seconds, **attrs):
+    """Add a span measured by the caller (e.g. the prefill part of a generate call)."""
+    if TRACING:
+        tracer.finish(Span(name, attrs, seconds))
+
+
+# --- Output ---
+_metrics_server = None
+_setup_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = tracer.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are not worth a line on stderr
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve render_metrics() on http://host:port/metrics from a daemon thread (once per process)."""
+    global _metrics_server
+    with _setup_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ Trace metrics endpoint not started on {host}:{port}: {e}")
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="trace-metrics", daemon=True).start()
+            print(f"✅ Trace metrics on http://{host}:{port}/metrics")
+    return _metrics_server
+
+
+def render_metrics():
+    return tracer.render()
+
+
+def enable(log_path=TRACE_LOG, metrics_port=TRACE_METRICS_PORT):
+    """Turn tracing on for this process, with a JSON-lines log and optionally the metrics endpoint."""
+    global TRACING
+    with _setup_lock:
+        if not logger.handlers:
+            handler = logging.FileHandler(log_path, encoding="utf-8") if log_path else logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        TRACING = True
+    if metrics_port:
+        serve_metrics(metrics_port)
+
+
+def disable():
+    global TRACING
+    TRACING = False
+
+
+# --- Debug panel helpers ---
+def recent_traces(n=5):
+    """The last `n` finished top-level spans, newest first."""
+    with tracer._lock:
+        return list(tracer.recent)[-n:][::-1]
+
+
+def describe_trace(root):
+    """One line per span of a trace, children indented under their parent with their share of the total."""
+    lines = []
+
+    def walk(span, depth):
+        share = f" ({span.seconds / root.seconds:.0%})" if depth and root.seconds else ""
+        details = ", ".join(f"{key}={value}" for key, value in span.attrs.items())
+        lines.append(f"{'  ' * depth}{span.name}: {span.seconds * 1000:.0f} ms{share}" + (f"  [{details}]" if details else ""))
+        for child in span.children:
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    if root.peak_rss is not None:
+        lines.append(f"peak RSS {root.peak_rss / 2**30:.2f} GB")
+    return lines
+
+
+if TRACING:
+    enable()
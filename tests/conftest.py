@@ -0,0 +1,21 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# The apps import their own modules flat (from index import ...) and shared/ from the repo root
+sys.path[:0] = [str(ROOT), str(ROOT / "vector_embed"), str(ROOT / "generate_pdf")]
+
+from benchmarks.run import HashingEmbedder, WordTokenizer  # noqa: E402  (model-free stand-ins)
+
+
+@pytest.fixture
+def tokenizer():
+    return WordTokenizer()
+
+
+@pytest.fixture
+def embedder():
+    return HashingEmbedder()
@@ -0,0 +1,40 @@
+# tests/test_analysis.py
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+sys.path.insert(0, str(ROOT / "analyse _pdf"))
+
+from analysis import clause_windows, count_tokens  # noqa: E402
+
+
+class CharTokenizer:
+    """One token per character and no offsets, like a slow tokenizer on unspaced text."""
+
+    is_fast = False
+
+    def __call__(self, texts, add_special_tokens=False, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": list(texts)}
+        return {"input_ids": [list(text) for text in texts]}
+
+
+@pytest.mark.parametrize("text", [
+    "x" * 950,                                     # no spaces, no sentences
+    "1. Scope. " + "word " * 300 + "\n\n2. Fees. Paid monthly.",
+])
+def test_windows_stay_within_budget_and_keep_every_character(text):
+    tokenizer = CharTokenizer()
+    windows = clause_windows(text, tokenizer, 100)
+    assert max(count_tokens(tokenizer, windows)) <= 100
+    assert "".join(window.replace("\n\n", "") for window in windows).replace(" ", "") == \
+        text.replace("\n\n", "").replace(" ", "")
+
+
+def test_short_contracts_are_one_window(tokenizer):
+    assert clause_windows("1. Scope. Build it.\n\n2. Fees. Paid monthly.", tokenizer, 100) == \
+        ["1. Scope. Build it.\n\n2. Fees. Paid monthly."]
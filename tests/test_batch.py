@@ -0,0 +1,68 @@
+# tests/test_batch.py
+import io
+import json
+import zipfile
+from datetime import date
+
+import pytest
+from PyPDF2 import PdfReader
+
+import batch
+
+ROW = {
+    "contractor_name": "Acme Builders / Pvt Ltd", "contractor_address": "12 MG Road, Bengaluru",
+    "client_name": "R. Sharma", "client_address": "4 Park Street, Kolkata",
+    "scope_of_work": "Build the site office.", "project_timeline": "Six weeks.", "payment_details": "₹5,00,000.",
+    "agreement_date": "2025-01-31",
+}
+
+
+def _csv(path, rows, bom=False):
+    header = list(ROW)
+    lines = [",".join(header)] + [",".join(f'"{row[field]}"' for field in header) for row in rows]
+    path.write_text(("\ufeff" if bom else "") + "\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("bom", [False, True])
+def test_csv_rows_are_read_with_or_without_a_bom(tmp_path, bom):
+    rows = batch.read_rows(_csv(tmp_path / "rows.csv", [ROW], bom=bom))
+    assert rows == [ROW]
+
+
+def test_jsonl_rows_and_missing_fields(tmp_path):
+    path = tmp_path / "rows.jsonl"
+    path.write_text(json.dumps(ROW) + "\n\n" + json.dumps({**ROW, "client_name": ""}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Row 2 of rows.jsonl is missing: client_name"):
+        batch.read_rows(path)
+
+
+def test_filenames_and_dates():
+    assert batch.agreement_filename(7, ROW) == "0007_Acme_Builders_Pvt_Ltd_agreement.pdf"
+    assert batch.agreement_filename(1, {"contractor_name": "—"}) == "0001_agreement_agreement.pdf"
+    assert batch._agreement_date("2025-01-31") == date(2025, 1, 31)
+    assert batch._agreement_date(None) == date.today()
+
+
+def test_render_batch_writes_files_and_a_zip(tmp_path):
+    rows = [ROW, {**ROW, "contractor_name": "Second Co"}]
+    archive = io.BytesIO()
+    progress = []
+    stats = batch.render_batch(rows, out_dir=tmp_path / "out", zip_file=archive, workers=2,
+                               on_progress=lambda done, total: progress.append((done, total)))
+
+    names = sorted(path.name for path in (tmp_path / "out").iterdir())
+    assert names == ["0001_Acme_Builders_Pvt_Ltd_agreement.pdf", "0002_Second_Co_agreement.pdf"]
+    assert stats.documents == 2 and progress[-1] == (2, 2)
+    with zipfile.ZipFile(archive) as zipped:
+        assert sorted(zipped.namelist()) == names
+        for name in names:
+            data = zipped.read(name)
+            assert data == (tmp_path / "out" / name).read_bytes()
+            assert len(PdfReader(io.BytesIO(data)).pages) >= 1
+    assert stats.total_bytes == sum((tmp_path / "out" / name).stat().st_size for name in names)
+
+
+def test_render_batch_needs_a_destination():
+    with pytest.raises(ValueError):
+        batch.render_batch([ROW])
@@ -0,0 +1,70 @@
+# tests/test_cache.py
+import pytest
+
+from shared import cache as cache_module
+from shared.cache import ResponseCache, prompt_version
+
+
+@pytest.fixture
+def cache(tmp_path, embedder):
+    return ResponseCache(tmp_path / "responses.sqlite3", embed=lambda texts: embedder.encode(texts), similarity=0.9)
+
+
+def test_hits_survive_a_restart_and_ignore_whitespace(cache, tmp_path):
+    cache.put("analysis", "Clause 1:  pay  within 30 days", {"risk": "low"}, {"max_new_tokens": 64})
+    assert cache.get("analysis", "Clause 1: pay within\n30 days", {"max_new_tokens": 64}) == {"risk": "low"}
+    assert cache.hits["memory"] == 1
+
+    reopened = ResponseCache(tmp_path / "responses.sqlite3")
+    assert reopened.get("analysis", "Clause 1: pay within 30 days", {"max_new_tokens": 64}) == {"risk": "low"}
+    assert reopened.hits["disk"] == 1
+
+
+def test_parameters_model_settings_and_prompt_version_are_part_of_the_key(cache, monkeypatch):
+    prompt, params = "Rewrite this clause.", {"max_new_tokens": 64, "prompt": prompt_version("v1 {text}")}
+    cache.put("formalize", prompt, "done", params)
+    assert cache.get("formalize", prompt, {**params, "max_new_tokens": 128}) is None
+    assert cache.get("formalize", prompt, {**params, "prompt": prompt_version("v2 {text}")}) is None
+    assert cache.get("other", prompt, params) is None
+
+    monkeypatch.setenv("MODEL_PRECISION", "int8")
+    assert cache.get("formalize", prompt, params) is None
+    monkeypatch.delenv("MODEL_PRECISION")
+    monkeypatch.setenv("DRAFT_MODEL_PATH", "/models/draft")
+    assert cache.get("formalize", prompt, params) is None
+    monkeypatch.delenv("DRAFT_MODEL_PATH")
+    assert cache.get("formalize", prompt, params) == "done"
+
+
+def test_prompt_version_tracks_templates_and_constraints():
+    assert prompt_version("a", {"type": "object"}) == prompt_version("a", {"type": "object"})
+    assert prompt_version("a", {"type": "object"}) != prompt_version("a", {"type": "array"})
+    assert prompt_version(["--- A ---", "--- B ---"]) != prompt_version(["--- A ---"])
+
+
+def test_expired_entries_are_ignored(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache.ttl = 60
+    cache.put("analysis", "prompt", 1)
+    now[0] += 61
+    assert cache.get("analysis", "prompt") is None
+
+
+def test_least_recently_used_rows_are_evicted(cache):
+    cache.max_entries = 2
+    for i in range(3):
+        cache.put("analysis", f"prompt {i}", i)
+    assert len(cache) == 2
+    cache._memory.clear()
+    assert cache.get("analysis", "prompt 0") is None
+    assert cache.get("analysis", "prompt 2") == 2
+
+
+def test_similar_prompts_need_the_same_numbers(cache):
+    cache.put("formalize", "pay the contractor INR 5000 within 30 days of invoice", "answer", similar=True)
+    similar = "pay the contractor INR 5000 within 30 days of the invoice"
+    assert cache.get("formalize", similar, similar=True) == "answer"
+    assert cache.hits["similar"] == 1
+    assert cache.get("formalize", similar.replace("5000", "6000"), similar=True) is None
+    assert cache.get("formalize", "an unrelated question about 5000 and 30", similar=True) is None
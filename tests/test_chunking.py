@@ -0,0 +1,62 @@
+# tests/test_chunking.py
+import numpy as np
+import pytest
+
+from shared.chunking import Chunk, chunk_text, embedder_max_tokens, encode_chunks, split_clauses
+
+CONTRACT = (
+    "1. Scope\nThe contractor shall build a two storey house on the plot described in Schedule A.\n\n"
+    "2. Payment\nThe client pays in four instalments. Each instalment is due within thirty days of the invoice. "
+    "Late payments carry interest at one percent per month.\n"
+    "Section 3 Termination\nEither party may terminate on thirty days written notice.\n\n"
+    "4. Disputes\n" + " ".join(f"word{i}" for i in range(60)) + ".\n"
+)
+
+
+@pytest.mark.parametrize("limit", [5, 12, 25, 200])
+def test_chunks_are_slices_located_by_offset(tokenizer, limit):
+    chunks = chunk_text(CONTRACT, tokenizer, limit)
+    for chunk in chunks:
+        assert CONTRACT[chunk.offset:chunk.offset + len(chunk.text)] == chunk.text
+        assert chunk.text.strip()
+    offsets = [chunk.offset for chunk in chunks]
+    assert offsets == sorted(offsets)
+    # Slices never overlap and only whitespace falls between them
+    for left, right in zip(chunks, chunks[1:]):
+        assert left.offset + len(left.text) <= right.offset
+        assert not CONTRACT[left.offset + len(left.text):right.offset].strip()
+    assert " ".join(chunk.text for chunk in chunks).split() == CONTRACT.split()
+
+
+@pytest.mark.parametrize("limit", [5, 12, 25, 200])
+def test_chunks_respect_the_token_limit(tokenizer, limit):
+    for chunk in chunk_text(CONTRACT, tokenizer, limit):
+        assert chunk.tokens == len(chunk.text.split())
+        assert chunk.tokens <= limit
+
+
+def test_clauses_that_fit_are_packed_whole(tokenizer):
+    chunks = chunk_text(CONTRACT, tokenizer, 40)
+    # Clauses 2 and 3 share a chunk; the overlong clause 4 is split on its own
+    assert [chunk.text.split("\n")[0] for chunk in chunks[:3]] == ["1. Scope", "2. Payment", "4. Disputes"]
+    assert "Section 3 Termination" in chunks[1].text
+
+
+def test_split_clauses_breaks_on_headings_and_blank_lines():
+    assert [clause.split("\n")[0] for clause in split_clauses(CONTRACT)] == [
+        "1. Scope", "2. Payment", "Section 3 Termination", "4. Disputes"]
+
+
+def test_encode_chunks_keeps_input_order(tokenizer):
+    class LengthEmbedder:
+        max_seq_length = 10
+
+        def encode(self, texts, batch_size, convert_to_numpy, normalize_embeddings):
+            return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+    chunks = [Chunk("a" * n, 0, n) for n in (5, 1, 3, 2, 4)]
+    seen = []
+    vectors = encode_chunks(LengthEmbedder(), chunks, batch_size=2, on_progress=seen.append)
+    assert vectors[:, 0].tolist() == [5, 1, 3, 2, 4]
+    assert seen[-1] == len(chunks)
+    assert embedder_max_tokens(LengthEmbedder()) == 8
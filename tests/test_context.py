@@ -0,0 +1,75 @@
+# tests/test_context.py
+import numpy as np
+import pytest
+
+from context import MIN_PIECE_TOKENS, Passage, build_contexts, drop_near_duplicates, join_chunks, merge_hits, pack
+from index import EmbeddingIndex
+from shared.chunking import chunk_text
+from test_chunking import CONTRACT
+
+CHUNKS = ["1. Scope of the works.", "The contractor builds the house.", "2. Payment is monthly.",
+          "Interest accrues on late payments.", "3. Either party may terminate."]
+
+
+def _index():
+    index = EmbeddingIndex()
+    offsets = np.cumsum([0] + [len(chunk) + 1 for chunk in CHUNKS[:-1]]).tolist()
+    index.add_document("a", "a.pdf", CHUNKS, np.ones((len(CHUNKS), 2)), [(1, offset) for offset in offsets])
+    return index
+
+
+def test_merge_hits_groups_neighbours_per_document():
+    index = _index()
+    index.add_document("b", "b.pdf", ["other"], np.ones((1, 2)))
+    last = len(index) - 1
+    passages = merge_hits(index, [last, 0, 1, 3], [0.9, 0.2, 0.7, 0.4])
+    assert [(p.doc_id, p.first_row, p.last_row) for p in passages] == [("a", 0, 1), ("a", 3, 3), ("b", last, last)]
+    assert passages[0].score == 0.7
+    assert passages[0].text.split() == " ".join(CHUNKS[:2]).split()
+
+
+def test_near_duplicates_keep_the_better_score():
+    text = "the contractor shall indemnify the client against all third party claims"
+    passages = [Passage("a", 0, 0, text, 0.3), Passage("a", 5, 5, text + " arising", 0.8),
+                Passage("a", 9, 9, "payment is due within thirty days of the invoice", 0.5)]
+    assert [p.first_row for p in drop_near_duplicates(passages)] == [5, 9]
+
+
+def test_pack_fills_the_budget_by_score_and_returns_document_order(tokenizer):
+    passages = [Passage("a", row, row, " ".join(["w"] * size), score)
+                for row, size, score in ((0, 50, 0.1), (1, 30, 0.9), (2, 200, 0.5))]
+    chosen = pack(passages, tokenizer, budget=30 + 2 + MIN_PIECE_TOKENS)
+    assert [p.first_row for p in chosen] == [1, 2]
+    assert chosen[1].tokens == MIN_PIECE_TOKENS  # truncated to the room left
+    assert sum(p.tokens for p in chosen) + 2 <= 30 + 2 + MIN_PIECE_TOKENS
+
+
+def test_build_contexts_is_per_source_best_first(tokenizer):
+    index = _index()
+    index.add_document("b", "b.pdf", ["Disputes go to arbitration."], np.ones((1, 2)))
+    contexts = build_contexts(index, [len(index) - 1, 0], [0.9, 0.4], tokenizer, budget=500)
+    assert list(contexts) == ["b.pdf", "a.pdf"]
+    assert contexts["b.pdf"] == "Disputes go to arbitration."
+    assert contexts["a.pdf"] == CHUNKS[0]
+
+
+@pytest.mark.parametrize("left, right, gap, joined", [
+    ("Clause ends here", "2. Next clause", 2, "Clause ends here\n\n2. Next clause"),  # repeated words survive
+    ("first sentence.", "Second one.", 1, "first sentence. Second one."),
+    ("Payment terms", "3. Termination", 1, "Payment terms\n3. Termination"),
+    ("a very long wo", "rd cut mid-sentence", 0, "a very long word cut mid-sentence"),
+    ("no offsets", "known", None, "no offsets\nknown"),
+])
+def test_join_chunks_rebuilds_the_separator(left, right, gap, joined):
+    assert join_chunks(left, right, gap) == joined
+
+
+@pytest.mark.parametrize("limit", [5, 12, 40])
+def test_merging_every_row_restores_the_source(tokenizer, limit):
+    index = EmbeddingIndex()
+    chunks = chunk_text(CONTRACT, tokenizer, limit)
+    index.add_document("a", "a.pdf", [c.text for c in chunks], np.ones((len(chunks), 2)),
+                       [(1, c.offset) for c in chunks])
+    [passage] = merge_hits(index, range(len(index)), [0.5] * len(index))
+    assert passage.text.split() == CONTRACT.split()
+    assert passage.text.count("\n") >= CONTRACT.strip().count("\n\n")
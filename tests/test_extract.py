@@ -0,0 +1,63 @@
+# tests/test_extract.py
+import io
+import threading
+
+import pytest
+from PyPDF2 import PdfReader
+
+from benchmarks.run import synthetic_pdf
+from shared import extract
+from shared.extract import PageCache, extract_pages, extract_text
+
+
+@pytest.fixture(scope="module")
+def pdfs():
+    return [synthetic_pdf(3, seed=seed) for seed in range(3)]
+
+
+def _expected(data):
+    return [(page, p.extract_text() or "") for page, p in enumerate(PdfReader(io.BytesIO(data)).pages)]
+
+
+def test_inline_extraction_fills_and_reuses_the_cache(tmp_path, pdfs):
+    cache = PageCache(tmp_path)
+    expected = _expected(pdfs[0])
+    assert list(extract_pages(pdfs[0], workers=1, cache=cache)) == expected
+    digest = extract.file_hash(pdfs[0])
+    assert [cache.get(digest, page) for page, _ in expected] == [text for _, text in expected]
+
+    cache.put(digest, 0, "from the cache")
+    assert next(extract_pages(pdfs[0], workers=1, cache=cache)) == (0, "from the cache")
+    assert extract_text(pdfs[0], workers=1, cache=cache).startswith("from the cache\n")
+
+
+def test_concurrent_files_share_one_spawned_pool(tmp_path, monkeypatch, pdfs):
+    monkeypatch.setattr(extract, "PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(extract, "PAGES_PER_TASK", 1)
+    monkeypatch.setattr(extract.tempfile, "tempdir", str(tmp_path))
+    results = {}
+
+    def run(i):
+        results[i] = list(extract_pages(pdfs[i], workers=2, cache=PageCache(tmp_path / str(i))))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(pdfs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: _expected(data) for i, data in enumerate(pdfs)}
+    pool = extract._extract_pool(2)
+    assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert not list(tmp_path.glob("extract-*.pdf"))
+
+
+def test_early_exit_cancels_the_rest_and_removes_the_spool(tmp_path, monkeypatch, pdfs):
+    monkeypatch.setattr(extract, "PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(extract, "PAGES_PER_TASK", 1)
+    monkeypatch.setattr(extract.tempfile, "tempdir", str(tmp_path))
+    pages = extract_pages(pdfs[0], workers=2, cache=PageCache(tmp_path / "cache"))
+    assert next(pages)[0] == 0
+    assert list(tmp_path.glob("extract-*.pdf"))
+    pages.close()
+    assert not list(tmp_path.glob("extract-*.pdf"))
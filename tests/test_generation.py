@@ -0,0 +1,77 @@
+# tests/test_generation.py
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from benchmarks.run import Skip, tiny_generator  # noqa: E402
+from shared import generation  # noqa: E402
+from shared.generation import BatchTextStreamer, PrefixCache, StopOnStrings, template_prefix, trim_at_stop  # noqa: E402
+
+
+class ByteTokenizer:
+    """One token per UTF-8 byte, decoded the way byte-level tokenizers do (U+FFFD for a partial character)."""
+
+    def decode(self, ids, skip_special_tokens=True):
+        return bytes(ids).decode("utf-8", errors="replace")
+
+
+def _ids(*rows):
+    return torch.tensor([list(row.encode()) for row in rows])
+
+
+def test_stop_strings_finish_rows_independently():
+    prompt = _ids("Q: a", "Q: b")
+    stop = StopOnStrings(ByteTokenizer(), prompt.shape[1], ["\nQuestion:"])
+    generated = torch.cat([prompt, _ids("yes\nQuestion:", "no, and more.")], dim=1)
+    assert stop(generated, None).tolist() == [True, False]
+    # Text in the prompt never counts
+    assert not StopOnStrings(ByteTokenizer(), 0, ["Q:"])(prompt[:, :0], None).any()
+
+
+def test_batch_streamer_waits_for_whole_characters():
+    streamer = BatchTextStreamer(ByteTokenizer(), batch_size=2)
+    streamer.put(_ids("prompt", "prompt"))  # the prompt is skipped
+    first, second = "é".encode(), "x".encode()
+    streamer.put(torch.tensor([[first[0]], [second[0]]]))
+    streamer.put(torch.tensor([[first[1]], [ord("!")]]))
+    streamer.end()
+    assert list(streamer) == [(1, "x"), (0, "é"), (1, "!")]
+
+
+def test_trim_and_template_prefix():
+    assert trim_at_stop("an answer\nQuestion: next", ["\nQuestion:"]) == "an answer"
+    assert template_prefix("Rules.\nText:\n{context}\nQ: {question}") == "Rules.\nText:\n"
+    assert template_prefix("Text: {context}") == ""
+
+
+@pytest.fixture(scope="module")
+def tiny():
+    try:
+        return tiny_generator()
+    except Skip as e:
+        pytest.skip(str(e))
+
+
+def test_cached_prefix_decodes_like_a_full_prefill(tiny, monkeypatch):
+    model, tokenizer = tiny
+    monkeypatch.setattr(generation, "prefix_cache", PrefixCache())
+    preamble = "You answer from the contract only.\n"
+    prompt = preamble + "Contract: the fee is due monthly.\nQuestion: when?\nAnswer:"
+    plain = generation.generate_batch([prompt], 12, model=model, tokenizer=tokenizer, do_sample=False)
+    for _ in range(2):  # a miss, then a hit
+        cached = generation.generate_batch([prompt], 12, model=model, tokenizer=tokenizer, prefix=preamble,
+                                           do_sample=False)
+        assert cached == plain
+    assert (generation.prefix_cache.misses, generation.prefix_cache.hits) == (1, 1)
+
+
+def test_prefix_cache_is_bounded_by_tokens(tiny):
+    model, tokenizer = tiny
+    cache = PrefixCache(max_tokens=40)
+    heads = [tokenizer(f"Preamble number {i} with some words.\n")["input_ids"] for i in range(4)]
+    for head in heads:
+        cache.get(model, head)
+    assert cache._tokens <= 40
+    assert (id(model), tuple(heads[-1])) in cache._entries
+    assert (id(model), tuple(heads[0])) not in cache._entries
@@ -0,0 +1,67 @@
+# tests/test_grammar.py
+import json
+
+import pytest
+
+from shared.grammar import Grammar, json_schema, section_template
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "risks": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+
+@pytest.mark.parametrize("text", [
+    '{"summary": "ok", "risks": []}',
+    '{\n  "summary": "a \\"quoted\\" \\u00e9 word",\n  "risks": ["late payment", "no cap"]\n}',
+])
+def test_valid_json_is_accepted_and_closed(text):
+    grammar = json_schema(SCHEMA)
+    state = grammar.advance(grammar.start(), text)
+    assert state is not None
+    assert Grammar.is_closed(state)
+    json.loads(text)
+
+
+@pytest.mark.parametrize("text", [
+    '{"risks": [], "summary": ""}',      # properties out of order
+    '{"summary": 1',                      # not a string
+    '{"summary": "a\nb"',                 # raw control character in a string
+    '{"summary": "", "risks": [],',       # no more properties allowed
+    '{"summary": "x"}',                   # a required property is missing
+])
+def test_invalid_json_is_rejected(text):
+    grammar = json_schema(SCHEMA)
+    state = grammar.advance(grammar.start(), text)
+    assert state is None or not Grammar.is_closed(state)
+
+
+@pytest.mark.parametrize("prefix", [
+    "", "{", '{"sum', '{"summary": "half', '{"summary": "esc \\u00', '{"summary": "", "risks": ["a", ',
+])
+def test_closing_completes_any_prefix_to_valid_json(prefix):
+    grammar = json_schema(SCHEMA)
+    state = grammar.advance(grammar.start(), prefix)
+    text = prefix + Grammar.closing(state)
+    assert Grammar.is_closed(grammar.advance(grammar.start(), text))
+    assert set(json.loads(text)) == {"summary", "risks"}
+
+
+def test_whitespace_runs_are_bounded():
+    grammar = json_schema(SCHEMA)
+    assert grammar.advance(grammar.start(), "\n" * 16 + "{") is not None
+    assert grammar.advance(grammar.start(), "\n" * 17) is None
+
+
+def test_section_template_requires_markers_in_order():
+    grammar = section_template(["SCOPE:", "TIMELINE:", "PAYMENT:"])
+    good = grammar.advance(grammar.start(), "SCOPE: build it TIMELINE: soon PAYMENT: monthly, with TIMELINE: repeated")
+    assert good is not None and Grammar.is_complete(good)
+    assert grammar.advance(grammar.start(), "TIMELINE:") is None
+    # A partial terminator match (KMP) must not swallow the real marker
+    state = grammar.advance(grammar.start(), "SCOPE: x TIMTIMELINE: y")
+    assert state is not None and not Grammar.is_complete(state)
+    assert Grammar.is_complete(grammar.advance(state, "PAYMENT: z"))
@@ -0,0 +1,67 @@
+# tests/test_ingest.py
+import functools
+import time
+
+import pytest
+
+import ingest
+from benchmarks.run import synthetic_pdf
+from index import EmbeddingIndex, document_hash
+from ingest import IngestPipeline
+from shared.extract import PageCache, extract_pages
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch, embedder):
+    monkeypatch.setattr(ingest, "extract_pages", functools.partial(extract_pages, cache=PageCache(tmp_path), workers=1))
+    return IngestPipeline(embedder=embedder, idle_seconds=0.2)
+
+
+def _wait(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_uploads_become_searchable_after_drain(pipeline):
+    index = EmbeddingIndex()
+    files = [synthetic_pdf(2, seed=seed) for seed in range(2)]
+    for i, data in enumerate(files):
+        assert pipeline.submit(document_hash(data), f"{i}.pdf", data)
+    assert not pipeline.submit(document_hash(files[0]), "again.pdf", files[0])
+
+    _wait(lambda: all(p.stage == "ready" for p in pipeline.progress()))
+    assert sorted(pipeline.drain(index)) == ["0.pdf", "1.pdf"]
+    assert not pipeline.busy and set(index.names) == {document_hash(data) for data in files}
+    assert len(index.embeddings) == len(index) > 0
+    assert all(p.stage == "searchable" and p.fraction == 1.0 for p in pipeline.progress())
+    assert pipeline.progress()[0].describe().startswith("✅ 0.pdf: ")
+
+
+def test_removed_uploads_are_cancelled(pipeline):
+    data = synthetic_pdf(2)
+    pipeline.submit(document_hash(data), "gone.pdf", data)
+    pipeline.retain([])
+    _wait(lambda: not pipeline._threads)  # workers skip the file, then go idle
+    index = EmbeddingIndex()
+    assert pipeline.drain(index) == [] and len(index) == 0 and pipeline.progress() == []
+
+
+def test_failures_are_reported_per_file(pipeline):
+    pipeline.submit("broken", "broken.pdf", b"not a pdf")
+    _wait(lambda: not pipeline.busy)
+    (progress,) = pipeline.progress()
+    assert progress.stage == "failed" and progress.describe().startswith("❌ broken.pdf: ")
+
+
+def test_idle_workers_exit_and_restart(pipeline):
+    data = synthetic_pdf(1)
+    pipeline.submit(document_hash(data), "a.pdf", data)
+    _wait(lambda: not pipeline._threads)
+    assert pipeline.drain(EmbeddingIndex()) == ["a.pdf"]
+    other = synthetic_pdf(1, seed=1)
+    pipeline.submit(document_hash(other), "b.pdf", other)
+    assert set(pipeline._threads) == {"extract", "chunk", "embed"}
+    _wait(lambda: pipeline._ready)
+    assert pipeline.drain(EmbeddingIndex()) == ["b.pdf"] and not pipeline.busy
@@ -0,0 +1,72 @@
+# tests/test_lexical.py
+import numpy as np
+import pytest
+
+from lexical import BM25Index, PostingCache, terms
+from search import Retriever, fuse
+from test_search import index  # noqa: F401  (fixture)
+
+
+def test_terms_keep_clause_numbers_and_amounts_whole():
+    assert terms("Clause 14.2: Rs 5,00,000") == ["clause", "14.2", "rs", "500000"]
+
+
+def test_lexical_finds_exact_terms(index):
+    rows, scores = Retriever(index, backend="exact", mode="lexical").search(None, k=3, query_text="14.2")
+    assert rows.tolist() == [1] and scores[0] > 0
+
+
+def test_hybrid_fuses_both_rankings(index, embedder):
+    retriever = Retriever(index, backend="exact", mode="hybrid")
+    query = embedder.encode(["Disputes go to arbitration in Mumbai."])[0]
+    rows, _ = retriever.search(query, k=6, query_text="liability 5,00,000")
+    assert {1, 5} <= set(rows.tolist())
+    # Without query text every mode is plain vector search
+    vector_rows, _ = Retriever(index, backend="exact", mode="vector").search(query, k=6)
+    np.testing.assert_array_equal(retriever.search(query, k=6)[0], vector_rows)
+
+
+def test_fuse_scores_by_reciprocal_rank():
+    rows, scores = fuse([np.array([3, 1, 2]), np.array([1, 4])], k=3, rrf_k=0)
+    assert rows.tolist() == [1, 3, 4]
+    assert scores[0] == pytest.approx(1 / 2 + 1 / 1)
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_scoped_search_only_returns_chosen_documents(index, embedder, mode):
+    retriever = Retriever(index, backend="exact", mode=mode)
+    query = embedder.encode(["liability thirty days"])[0]
+    rows, _ = retriever.search(query, k=6, query_text="liability thirty days", sources=["b"])
+    assert rows.size and set(rows.tolist()) <= {3, 4, 5}
+    rows, _ = retriever.search(query, k=6, query_text="liability", sources=[])
+    assert rows.size == 0
+
+
+def test_lexical_index_follows_appends_and_removals(index, embedder):
+    retriever = Retriever(index, backend="exact", mode="lexical")
+    assert retriever.search(None, k=1, query_text="arbitration")[0].tolist() == [5]
+    index.remove_document("a")
+    assert retriever.search(None, k=1, query_text="arbitration")[0].tolist() == [2]
+    index.add_document("c", "c.pdf", ["Arbitration seat is Pune."], embedder.encode(["Arbitration seat is Pune."]))
+    rows, _ = retriever.search(None, k=2, query_text="arbitration pune")
+    assert rows.tolist() == [3, 2]
+
+
+def test_cached_postings_match_a_fresh_build(index):
+    chunks = list(index.chunks)
+    fresh = BM25Index()
+    fresh.update(chunks)
+    cache = PostingCache()
+    for _ in range(2):  # cold, then served from the cache
+        cached = BM25Index()
+        cached.update(chunks[:3], 0, index.doc_ids, cache)
+        cached.update(chunks, 3, index.doc_ids, cache)
+        for query in ("liability", "thirty days notice", "14.2"):
+            for ranges in (None, [(3, 6)]):
+                expected, got = fresh.search(query, 6, ranges), cached.search(query, 6, ranges)
+                np.testing.assert_array_equal(got[0], expected[0])
+                np.testing.assert_allclose(got[1], expected[1])
+
+
+def test_default_mode_is_vector(index):
+    assert Retriever(index).mode == "vector"
@@ -0,0 +1,129 @@
+# tests/test_pdf.py
+import io
+import random
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import pytest
+
+import pdf
+
+LOGO = Path(pdf.__file__).parent / "logo.png"
+CREATED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+WORDS = ["the", "Contractor", "shall", "deliver", "all", "materials", "₹5,00,000", "within", "thirty", "days",
+         "é", "supercalifragilisticexpialidociousnessandthensomemoretomakeitoverflowtheline" * 2, "—", "(a)", "14.2"]
+
+
+def _random_text(rng):
+    paragraphs = []
+    for _ in range(rng.randint(1, 4)):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(0, 80))]
+        paragraphs.append("".join(word + rng.choice([" ", " ", "  ", "\t"]) for word in words).rstrip(" "))
+    return pdf.sanitize_text("\n".join(paragraphs) + rng.choice(["", "\n", "\n\n"]))
+
+
+def _fields(**overrides):
+    rng = random.Random(1)
+    fields = dict(
+        contractor_name="Acme Builders", contractor_address="12 MG Road, Bengaluru",
+        client_name="R. Sharma", client_address="4 Park Street, Kolkata", agreement_date=date(2025, 1, 1),
+        scope_of_work=_random_text(rng), project_timeline=_random_text(rng), payment_details=_random_text(rng),
+        contractor_signer_name="A. Signatory", contractor_signer_title="Manager",
+        client_signer_name="B. Signatory", client_signer_title="Owner",
+    )
+    fields.update(overrides)
+    return fields
+
+
+def test_wrap_matches_multi_cell_line_breaks():
+    template = pdf.agreement_template()
+    rng = random.Random(0)
+    for _ in range(100):
+        text = _random_text(rng)
+        lines = template.wrap(text)
+        expected = template._fpdf_lines(text, 6)
+        assert [line.text for line in lines] == expected, repr(text)
+
+
+def test_unmodeled_text_falls_back_to_fpdf():
+    template = pdf.agreement_template()
+    assert template.wrap("soft­hyphen") is None
+    assert template.wrap("page {nb}") is None
+
+
+@pytest.mark.parametrize("overrides", [
+    {},
+    {"scope_of_work": "Build it."},
+    {"scope_of_work": "\n".join(["Clause with a fairly long line of text that keeps going"] * 120)},
+])
+@pytest.mark.parametrize("logo", [False, True])
+def test_preview_page_count_matches_the_rendered_pdf(overrides, logo):
+    fields = _fields(**overrides)
+    logo_bytes = LOGO.read_bytes() if logo else None
+    layout = pdf.agreement_template().layout(fields, logo=logo)
+    assert layout.pages == pdf.agreement_template().render(fields, logo_bytes).page_no()
+
+
+def _output(fields, logo_bytes=None):
+    document = pdf.agreement_template().render(fields, logo_bytes)
+    document.set_creation_date(CREATED)  # the only part of the file that depends on the clock
+    return bytes(document.output())
+
+
+@pytest.mark.parametrize("logo", [False, True])
+def test_cached_font_and_logo_render_the_same_bytes_as_the_public_api(monkeypatch, logo):
+    if not pdf.FPDF_FAST_PATH:
+        pytest.skip("fpdf2 is not the verified release; only the public API is in use")
+    logo_bytes = LOGO.read_bytes() if logo else None
+    cached = _output(_fields(), logo_bytes)
+    monkeypatch.setattr(pdf, "FPDF_FAST_PATH", False)
+    assert _output(_fields(), logo_bytes) == cached
+
+
+def test_layout_places_cells_where_fpdf_draws_them(monkeypatch):
+    drawn = []
+    cell = pdf.AgreementPDF.cell
+
+    def recording_cell(self, w=None, h=None, text="", *args, **kwargs):
+        result = cell(self, w, h, text, *args, **kwargs)
+        if w == 0 and "new_y" in kwargs:  # template cells, not the footer's
+            drawn.append((self.page_no(), round(self.y - h, 3)))
+        return result
+
+    monkeypatch.setattr(pdf.AgreementPDF, "cell", recording_cell)
+    cells = {op[1] for op in pdf.agreement_template().ops if op[0] == "cell"}
+    rng = random.Random(5)
+    for _ in range(20):
+        fields = _fields(scope_of_work=_random_text(rng) * 3, project_timeline=_random_text(rng) + "\n")
+        layout = pdf.agreement_template().layout(fields)
+        drawn.clear()
+        pdf.agreement_template().render(fields)
+        assert drawn == [(block.page, round(block.y, 3)) for block in layout.blocks if block.name in cells]
+
+
+def test_sanitize_text_replaces_typographic_characters():
+    assert pdf.sanitize_text("“₹5” — ‘ok’ • done") == '"INR5" - \'ok\' - done'
+
+
+def test_write_agreement_pdf_writes_the_whole_file(tmp_path):
+    args = list(_fields().values())
+    sink = io.BytesIO()
+    size = pdf.write_agreement_pdf(sink, *args)
+    data = sink.getvalue()
+    assert size == len(data)
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+
+    path = tmp_path / "agreement.pdf"
+    assert pdf.write_agreement_pdf(path, *args) == path.stat().st_size
+    assert path.read_bytes().startswith(b"%PDF-")
+
+
+def test_public_path_places_the_logo_without_the_image_cache(monkeypatch):
+    monkeypatch.setattr(pdf, "FPDF_FAST_PATH", False)
+    monkeypatch.setattr(pdf, "_logos", pdf.OrderedDict())
+    document = pdf.agreement_template().render(_fields(), LOGO.read_bytes())
+    assert len(document.image_cache.images) == 1
+    assert not pdf._logos
+    for internal in ("SubsetMap", "ImageCache", "RasterImageInfo", "preload_image", "TextLine"):
+        assert not hasattr(pdf, internal)  # only imported behind FPDF_FAST_PATH
@@ -0,0 +1,101 @@
+# tests/test_search.py
+import numpy as np
+import pytest
+
+from index import EmbeddingIndex
+from search import ExactSearch, HNSWSearch, IVFSearch, Retriever, hnswlib
+
+DOCS = {
+    "a": ["The contractor shall complete the works by March.",
+          "Clause 14.2 caps liability at 5,00,000 rupees.",
+          "Payment is due within thirty days of invoice."],
+    "b": ["The client may terminate on thirty days notice.",
+          "Liability for delay is limited to the contract price.",
+          "Disputes go to arbitration in Mumbai."],
+}
+
+
+@pytest.fixture
+def index(embedder):
+    index = EmbeddingIndex()
+    for doc, chunks in DOCS.items():
+        index.add_document(doc, f"{doc}.pdf", chunks, embedder.encode(chunks))
+    return index
+
+
+def test_vector_search_ranks_the_matching_chunk_first(index, embedder):
+    query = embedder.encode(["Disputes go to arbitration in Mumbai."])[0]
+    rows, scores = Retriever(index, backend="exact", mode="vector").search(query, k=2)
+    assert rows[0] == 5 and scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert scores[0] >= scores[1]
+
+
+def test_retriever_follows_appends_and_removals(index, embedder):
+    retriever = Retriever(index, backend="exact", mode="vector")
+    query = embedder.encode(["Arbitration seat is Pune."])[0]
+    assert retriever.search(query, k=1)[0].tolist() != [6]
+    index.add_document("c", "c.pdf", ["Arbitration seat is Pune."], embedder.encode(["Arbitration seat is Pune."]))
+    assert retriever.search(query, k=1)[0].tolist() == [6]
+    index.remove_document("a")
+    assert retriever.search(query, k=1)[0].tolist() == [3]
+
+
+def test_exact_search_scores_unnormalized_rows_by_cosine():
+    vectors = np.array([[3.0, 0.0], [0.0, 0.5], [1.0, 1.0]], dtype=np.float32)
+    backend = ExactSearch()
+    backend.update(vectors)
+    rows, scores = backend.search(np.array([1.0, 0.0], dtype=np.float32), 3)
+    assert rows.tolist() == [0, 2, 1]
+    np.testing.assert_allclose(scores, [1.0, np.sqrt(0.5), 0.0], atol=1e-6)
+
+
+def test_exact_search_checks_every_appended_row_for_unit_length():
+    rng = np.random.default_rng(0)
+    unit = rng.standard_normal((3000, 8)).astype(np.float32)
+    unit /= np.linalg.norm(unit, axis=1, keepdims=True)
+    backend = ExactSearch()
+    backend.update(unit[:1000])
+    assert backend.inv_norms is None
+
+    appended = unit.copy()
+    appended[2500] *= 4.0  # far past the first 1024 new rows
+    backend.update(appended, start=1000)
+    assert backend.inv_norms is not None
+    rows, scores = backend.search(appended[2500] / 4.0, 1)
+    assert rows.tolist() == [2500]
+    np.testing.assert_allclose(scores, [1.0], atol=1e-5)
+
+
+def test_ivf_probing_every_cell_matches_exact_search():
+    vectors = np.random.default_rng(0).standard_normal((500, 16)).astype(np.float32)
+    query = vectors[7] + 0.01
+    exact, ivf = ExactSearch(), IVFSearch(nlist=8, nprobe=8)
+    exact.update(vectors)
+    ivf.update(vectors)
+    np.testing.assert_array_equal(ivf.search(query, 10)[0], exact.search(query, 10)[0])
+
+
+def test_ivf_indexes_appended_rows():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((400, 16)).astype(np.float32)
+    ivf = IVFSearch(nlist=4, nprobe=4)
+    ivf.update(vectors[:300])
+    ivf.update(vectors, start=300)
+    assert sum(len(rows) for rows in ivf.lists) == 400
+    assert ivf.search(vectors[350], 1)[0].tolist() == [350]
+
+
+@pytest.mark.skipif(hnswlib is None, reason="hnswlib is optional")
+def test_hnsw_finds_an_exact_duplicate():
+    vectors = np.random.default_rng(2).standard_normal((300, 16)).astype(np.float32)
+    hnsw = HNSWSearch()
+    hnsw.update(vectors)
+    assert hnsw.search(vectors[42], 1)[0].tolist() == [42]
+
+
+def test_auto_backend_switches_to_ivf_for_large_corpora(index, monkeypatch):
+    import search
+    retriever = Retriever(index, backend="auto")
+    assert retriever._backend_for(10) == "exact"
+    monkeypatch.setattr(search, "EXACT_MAX_ROWS", 5)
+    assert retriever._backend_for(10) == "ivf"
@@ -0,0 +1,133 @@
+# tests/test_server.py
+import threading
+import time
+
+import pytest
+
+from shared import server
+from shared.server import InferenceServer, ServerBusy, is_local, parse_address, resolve_authkey, serve
+
+
+@pytest.mark.parametrize("address, local", [
+    ("localhost:7011", True), ("127.0.0.1:7011", True), (":7011", True), ("/tmp/inference.sock", True),
+    ("0.0.0.0:7011", False), ("10.1.2.3:7011", False), ("inference.example.com:7011", False),
+])
+def test_only_loopback_and_unix_sockets_count_as_local(address, local):
+    assert is_local(parse_address(address)) == local
+
+
+def test_authkey_must_be_set_explicitly(monkeypatch):
+    monkeypatch.setattr(server, "INFERENCE_AUTHKEY", "")
+    with pytest.raises(RuntimeError, match="INFERENCE_AUTHKEY"):
+        resolve_authkey()
+    with pytest.raises(RuntimeError):
+        resolve_authkey("short")
+    monkeypatch.setattr(server, "INFERENCE_AUTHKEY", "0123456789abcdef")
+    assert resolve_authkey() == b"0123456789abcdef"
+
+
+def test_remote_client_and_server_refuse_without_a_key(monkeypatch):
+    monkeypatch.setattr(server, "INFERENCE_AUTHKEY", "")
+    with pytest.raises(RuntimeError):
+        server.RemoteInference("localhost:7011")
+    with pytest.raises(RuntimeError):
+        serve("localhost:7011")
+
+
+def test_server_refuses_public_addresses_without_opt_in():
+    with pytest.raises(RuntimeError, match="--allow-remote"):
+        serve("0.0.0.0:7011", authkey="0123456789abcdef")
+
+
+class FakeGenerator:
+    """stream_batch stand-in: echoes each prompt upper-cased; `gate` holds a batch until set."""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, prompts, max_new_tokens, stop=None, prefix=None, **kwargs):
+        self.batches.append(list(prompts))
+        self.gate.wait(5)
+        for row, prompt in enumerate(prompts):
+            yield row, prompt.upper()
+
+
+def _answers(server, prompts, **kwargs):
+    answers = [""] * len(prompts)
+    for row, delta in server.stream(prompts, 8, **kwargs):
+        answers[row] += delta
+    return answers
+
+
+def test_concurrent_requests_share_one_batch():
+    generate = FakeGenerator()
+    server = InferenceServer(max_batch=8, max_wait=0.3, generate=generate)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.update({i: _answers(server, [f"q{i}"])})) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {0: ["Q0"], 1: ["Q1"], 2: ["Q2"]}
+    assert sorted(sum(generate.batches, [])) == ["q0", "q1", "q2"] and len(generate.batches) < 3
+    assert server.describe_metrics()["completed"] == 3
+
+
+def test_different_settings_are_never_batched_together():
+    generate = FakeGenerator()
+    server = InferenceServer(max_wait=0.2, generate=generate)
+    threads = [threading.Thread(target=_answers, args=(server, ["a"]), kwargs={"temperature": t}) for t in (0.1, 0.9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(generate.batches) == [["a"], ["a"]]
+
+
+def test_full_queue_rejects_whole_calls():
+    generate = FakeGenerator()
+    generate.gate.clear()
+    server = InferenceServer(max_wait=0, max_queue=1, generate=generate)
+    busy = threading.Thread(target=_answers, args=(server, ["first"]))
+    busy.start()
+    while not generate.batches:
+        time.sleep(0.01)
+    with pytest.raises(ServerBusy):
+        _answers(server, ["second", "third"])
+    generate.gate.set()
+    busy.join()
+    assert server.describe_metrics()["rejected"] == 1
+
+
+def test_requests_whose_client_gave_up_are_not_generated():
+    generate = FakeGenerator()
+    generate.gate.clear()
+    server = InferenceServer(max_wait=0, generate=generate)
+    busy = threading.Thread(target=_answers, args=(server, ["first"]))
+    busy.start()
+    while not generate.batches:
+        time.sleep(0.01)
+    with pytest.raises(TimeoutError):
+        _answers(server, ["late"], timeout=0.1)
+    generate.gate.set()
+    busy.join()
+    assert _answers(server, ["next"]) == ["NEXT"]
+    assert generate.batches == [["first"], ["next"]]
+    metrics = server.describe_metrics()
+    assert metrics["abandoned"] + metrics["timed_out"] == 1
+
+
+def test_server_report_is_empty_without_a_server(monkeypatch):
+    monkeypatch.setattr(server, "INFERENCE_SERVER", "")
+    assert server.server_report() == []
+
+
+def test_server_report_describes_the_queue(monkeypatch):
+    monkeypatch.setattr(server, "INFERENCE_SERVER", "inprocess")
+    monkeypatch.setattr(server, "_client", InferenceServer(generate=FakeGenerator()))
+    _answers(server._client, ["q"])
+    lines = server.server_report()
+    assert lines[0].startswith("Inference server: 0 queued, 0 in flight, mean batch 1.0")
+    assert "1 done" in lines[1]
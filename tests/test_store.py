@@ -0,0 +1,150 @@
+# tests/test_store.py
+import threading
+
+import numpy as np
+import pytest
+
+from index import EmbeddingIndex
+import store as store_module
+from store import EmbeddingStore
+
+
+def _vectors(rows, dim=4, seed=0):
+    return np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+
+
+def _put(store, doc, rows, seed=0):
+    chunks = [f"{doc} chunk {i} é" for i in range(rows)]
+    vectors = _vectors(rows, seed=seed)
+    store.put(doc, f"{doc}.pdf", chunks, vectors, [(i + 1, 100 * i) for i in range(rows)])
+    return chunks, vectors
+
+
+def test_reopen_reads_back_every_document(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    a = _put(store, "a", 3, seed=1)
+    b = _put(store, "b", 2, seed=2)
+
+    reopened = EmbeddingStore(tmp_path)
+    assert len(reopened) == 5 and "a" in reopened and "b" in reopened
+    for doc, (chunks, vectors) in (("a", a), ("b", b)):
+        texts, provenance, stored = reopened.load(doc)
+        assert list(texts) == chunks
+        assert provenance == [(i + 1, 100 * i) for i in range(len(chunks))]
+        np.testing.assert_array_equal(stored, vectors)
+
+
+def test_known_hashes_are_not_appended_twice(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    _put(store, "a", 3)
+    _put(store, "a", 3)
+    assert len(EmbeddingStore(tmp_path)) == 3
+
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    _put(store, "a", 2)
+    with pytest.raises(ValueError):
+        store.put("b", "b.pdf", ["x"], np.ones((1, 8)))
+
+
+def test_tombstones_survive_reopen_and_compact_reclaims_rows(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    _put(store, "a", 3, seed=1)
+    b = _put(store, "b", 2, seed=2)
+    store.delete("a")
+
+    reopened = EmbeddingStore(tmp_path)
+    assert "a" not in reopened and reopened.dead_rows == 3
+
+    reopened.compact()
+    assert len(reopened) == 2 and reopened.dead_rows == 0
+    again = EmbeddingStore(tmp_path)
+    texts, _, vectors = again.load("b")
+    assert list(texts) == b[0]
+    np.testing.assert_array_equal(vectors, b[1])
+
+
+def test_uncommitted_tail_is_trimmed_on_open(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    chunks, vectors = _put(store, "a", 3)
+    sizes = {name: (tmp_path / name).stat().st_size for name in ("vectors.bin", "texts.bin", "rows.bin")}
+    # A crash after the data was written but before the manifest line
+    for name in sizes:
+        with open(tmp_path / name, "ab") as f:
+            f.write(b"\x00" * 37)
+
+    repaired = EmbeddingStore(tmp_path)
+    assert {name: (tmp_path / name).stat().st_size for name in sizes} == sizes
+    _put(repaired, "b", 2, seed=3)
+    texts, _, stored = EmbeddingStore(tmp_path).load("a")
+    assert list(texts) == chunks
+    np.testing.assert_array_equal(stored, vectors)
+    assert len(EmbeddingStore(tmp_path).load("b")[0]) == 2
+
+
+def test_read_only_open_never_trims_a_write_in_progress(tmp_path, capsys):
+    store = EmbeddingStore(tmp_path)
+    _put(store, "a", 3)
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(b"\x00" * 37)  # another process is half-way through a put
+    size = (tmp_path / "vectors.bin").stat().st_size
+
+    assert len(EmbeddingStore(tmp_path, repair=False)) == 3
+    store_module.main([str(tmp_path), "list"])
+    assert "1 documents, 3 rows" in capsys.readouterr().out
+    assert (tmp_path / "vectors.bin").stat().st_size == size
+
+
+def test_repair_waits_for_the_writer_lock(tmp_path):
+    if store_module.fcntl is None:
+        pytest.skip("file locks need fcntl")
+    writer = EmbeddingStore(tmp_path)
+    opened = threading.Event()
+    with writer._exclusive():
+        thread = threading.Thread(target=lambda: (EmbeddingStore(tmp_path), opened.set()))
+        thread.start()
+        assert not opened.wait(0.2)
+    assert opened.wait(5)
+    thread.join()
+
+
+def test_handles_in_two_processes_append_after_each_other(tmp_path):
+    first, second = EmbeddingStore(tmp_path), EmbeddingStore(tmp_path)
+    a = _put(first, "a", 3, seed=1)
+    b = _put(second, "b", 2, seed=2)  # second never saw "a" being written
+    _put(second, "a", 3, seed=1)
+
+    reopened = EmbeddingStore(tmp_path)
+    assert len(reopened) == 5 and set(reopened.docs) == {"a", "b"}
+    for doc, (chunks, vectors) in (("a", a), ("b", b)):
+        texts, _, stored = reopened.load(doc)
+        assert list(texts) == chunks
+        np.testing.assert_array_equal(stored, vectors)
+
+
+def test_float16_store_round_trips_within_precision(tmp_path):
+    store = EmbeddingStore(tmp_path, dtype="float16")
+    _, vectors = _put(store, "a", 3)
+    reopened = EmbeddingStore(tmp_path, dtype="float32")  # the dtype on disk wins
+    assert reopened.dtype == np.float16
+    np.testing.assert_allclose(reopened.load("a")[2], vectors, atol=1e-2)
+
+
+def test_index_attaches_only_requested_documents(tmp_path):
+    store = EmbeddingStore(tmp_path)
+    _put(store, "a", 3)
+    _put(store, "b", 2)
+
+    index = EmbeddingIndex(store)
+    assert len(index) == 0
+    chunks, provenance, vectors = store.load("b")
+    index.add_document("b", "b.pdf", chunks, vectors, provenance)
+    assert list(index.names) == ["b"] and len(index) == 2
+    index.retain([])
+    assert len(index) == 0
+
+    archive = EmbeddingIndex(store, archive=True)
+    assert set(archive.names) == {"a", "b"} and len(archive) == 5
+    archive.retain([])
+    assert len(archive) == 5  # archived documents are pinned
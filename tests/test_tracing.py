@@ -0,0 +1,53 @@
+# tests/test_tracing.py
+import pytest
+
+from shared import tracing
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING", True)
+    monkeypatch.setattr(tracing, "tracer", tracing.Tracer(keep=5))
+    return tracing.tracer
+
+
+def test_disabled_spans_are_a_shared_no_op(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING", False)
+    with tracing.span("embed", chunks=3) as s:
+        s.set(tokens=10)
+    assert s is tracing._NO_SPAN
+    tracing.record("prefill", 0.1)
+
+
+def test_nested_spans_form_one_trace(traced):
+    with tracing.span("chat", documents=2) as root:
+        with tracing.span("embed") as child:
+            child.set(prompt_tokens=7)
+        tracing.record("prefill", 0.02, prompt_tokens=5)
+    assert [span.name for span in root.children] == ["embed", "prefill"]
+    assert {span.trace_id for span in root.children} == {root.trace_id}
+    assert tracing.recent_traces(1) == [root]
+    assert traced.metrics["embed"].tokens == {"prompt_tokens": 7}
+
+    lines = tracing.describe_trace(root)
+    assert lines[0].startswith("chat: ") and "[documents=2]" in lines[0]
+    assert lines[1].startswith("  embed: ")
+
+
+def test_errors_are_recorded_and_reraised(traced):
+    with pytest.raises(KeyError):
+        with tracing.span("search"):
+            raise KeyError("missing")
+    assert traced.metrics["search"].errors == 1
+    assert tracing.recent_traces(1)[0].attrs["error"] == "KeyError"
+
+
+def test_prometheus_histogram_is_cumulative(traced):
+    for seconds in (0.001, 0.03, 3.0):
+        tracing.record("render", seconds, prompt_tokens=2)
+    text = tracing.render_metrics()
+    assert 'hive_span_seconds_bucket{span="render",le="0.005"} 1' in text
+    assert 'hive_span_seconds_bucket{span="render",le="0.05"} 2' in text
+    assert 'hive_span_seconds_bucket{span="render",le="+Inf"} 3' in text
+    assert 'hive_span_seconds_count{span="render"} 3' in text
+    assert 'hive_span_tokens_total{span="render",kind="prompt_tokens"} 6' in text
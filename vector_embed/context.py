@@ -0,0 +1,140 @@
+# vector_embed/context.py
+import re
+from dataclasses import dataclass, field
+
+from shared.chunking import CLAUSE_HEADING
+from shared.tracing import span
+
+SHINGLE_WORDS = 5
+MIN_PIECE_TOKENS = 64   # never pack a truncated passage shorter than this
+
+
+@dataclass
+class Passage:
+    """A run of consecutive chunks from one document, merged into one text."""
+    doc_id: str
+    first_row: int
+    last_row: int
+    text: str
+    score: float
+    tokens: int = 0
+    shingles: frozenset = field(default=frozenset(), repr=False)
+
+
+def join_chunks(left, right, gap):
+    """
+    Join two consecutive chunks of a document. `gap` is the number of
+    characters between them in the source (from the chunk offsets), None
+    when unknown. chunk_text only drops whitespace between its slices, so
+    the separator is rebuilt from the gap: nothing for a cut inside a
+    sentence, a line break before a clause heading, a blank line for a
+    wider gap and a space between sentences.
+    """
+    if gap is None or gap < 0:
+        return left + "\n" + right
+    if gap == 0:
+        return left + right
+    if gap > 1:
+        return left + "\n\n" + right
+    return left + ("\n" if re.match(CLAUSE_HEADING, right, re.IGNORECASE) else " ") + right
+
+
+def _gap(index, row):
+    """Characters between row - 1 and `row` in their document, or None without offsets."""
+    left, right = index.offsets[row - 1], index.offsets[row]
+    if left is None or right is None:
+        return None
+    return right - (left + len(index.chunks[row - 1]))
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+
+
+def merge_hits(index, rows, scores):
+    """
+    Group retrieved rows into passages: rows that are neighbours in the
+    same document become one passage scored by its best chunk.
+    """
+    passages = []
+    for row, score in sorted(zip(map(int, rows), map(float, scores))):
+        previous = passages[-1] if passages else None
+        if previous and previous.last_row == row - 1 and previous.doc_id == index.doc_ids[row]:
+            previous.text = join_chunks(previous.text, index.chunks[row], _gap(index, row))
+            previous.last_row = row
+            previous.score = max(previous.score, score)
+        else:
+            passages.append(Passage(index.doc_ids[row], row, row, index.chunks[row], score))
+    return passages
+
+
+def drop_near_duplicates(passages, containment=0.8):
+    """
+    Keep the better-scored of any two passages whose word 5-gram sets
+    overlap by `containment` of the smaller one (repeated boilerplate,
+    the same clause quoted twice, ...).
+    """
+    kept = []
+    for passage in sorted(passages, key=lambda p: -p.score):
+        passage.shingles = _shingles(passage.text)
+        if not passage.shingles:
+            continue
+        if any(len(passage.shingles & other.shingles) >= containment * min(len(passage.shingles), len(other.shingles))
+               for other in kept):
+            continue
+        kept.append(passage)
+    return kept
+
+
+def pack(passages, tokenizer, budget):
+    """
+    Choose passages by relevance until `budget` tokens are used, truncating
+    the first one that no longer fits when enough room is left for it.
+    Returns the chosen passages in document order.
+    """
+    passages = sorted(passages, key=lambda p: -p.score)
+    if passages:
+        counts = tokenizer([p.text for p in passages], add_special_tokens=False)["input_ids"]
+        for passage, ids in zip(passages, counts):
+            passage.tokens = len(ids)
+
+    chosen, used = [], 0
+    separator = 2  # "\n\n" between passages
+    for passage in passages:
+        room = budget - used - (separator if chosen else 0)
+        if passage.tokens <= room:
+            chosen.append(passage)
+            used += passage.tokens + (separator if len(chosen) > 1 else 0)
+        elif room >= MIN_PIECE_TOKENS:
+            ids = tokenizer(passage.text, add_special_tokens=False)["input_ids"][:room]
+            passage.text = tokenizer.decode(ids)
+            passage.tokens = len(ids)
+            chosen.append(passage)
+            used += passage.tokens + (separator if len(chosen) > 1 else 0)
+    return sorted(chosen, key=lambda p: p.first_row)
+
+
+def build_contexts(index, rows, scores, tokenizer, budget):
+    """
+    Per-source prompt contexts for retrieved rows: neighbouring chunks are
+    joined as they read in the source, near-duplicates within a PDF are dropped,
+    and each source's passages are packed by relevance into `budget` tokens.
+    Returns {source name: context text}, best-scoring source first.
+    """
+    with span("context", hits=len(rows), budget=budget) as traced:
+        by_doc = {}
+        for passage in merge_hits(index, rows, scores):
+            by_doc.setdefault(passage.doc_id, []).append(passage)
+
+        # Duplicates are only dropped within a PDF: every source gets its own answer
+        ranked = sorted(by_doc.items(), key=lambda item: -max(p.score for p in item[1]))
+        contexts, packed = {}, []
+        for doc_id, passages in ranked:
+            chosen = pack(drop_near_duplicates(passages), tokenizer, budget)
+            contexts[index.names[doc_id][0]] = "\n\n".join(p.text for p in chosen)
+            packed += chosen
+        traced.set(sources=len(contexts), passages=len(packed), context_tokens=sum(p.tokens for p in packed))
+        return contexts
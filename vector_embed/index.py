@@ -0,0 +1,174 @@
+# vector_embed/index.py
+import hashlib
+import numpy as np
+
+
+def document_hash(data: bytes) -> str:
+    """
+    Content hash used as the identity of an uploaded PDF, so the same
+    contract uploaded under two names is only chunked and embedded once.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingIndex:
+    """
+    Incremental chunk/embedding index for the multi-PDF chat.
+
+    Vectors are appended per document (keyed by content hash) and dropped
+    again when the document is removed, so `embeddings`, `chunks`,
+    `doc_ids` and `offsets` always stay row-aligned.
+
+    With a `store` (see store.py) new documents are persisted on add, and
+    callers attach stored documents one hash at a time via `store.load`.
+    Only with `archive=True` is every stored document loaded as a pinned
+    entry (whole-archive search, shared by every user of the store); while
+    the index then mirrors the store row-for-row, vectors and texts are
+    served straight from its memory maps instead of being copied into RAM.
+    """
+
+    def __init__(self, store=None, archive=False):
+        self.chunks = []        # chunk text, one entry per row
+        self.doc_ids = []       # document hash, one entry per row
+        self.offsets = []       # character offset of the chunk in its document, or None
+        self.names = {}         # document hash -> list of uploaded file names
+        self.pinned = set()     # archived documents, kept regardless of the uploader
+        self.generation = 0     # bumped whenever rows are removed (row ids shift)
+        self.store = store
+        self._vectors = None    # over-allocated buffer, rows [0, len(self)) are live
+        self._mapped = False    # rows are the store's memory maps, one-to-one
+        self._ranges, self._ranges_key = {}, None
+        if store is not None and archive:
+            self._load_archive()
+
+    # --- Size / lookup ---
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, doc_hash):
+        return doc_hash in self.names
+
+    @property
+    def embeddings(self):
+        if self._vectors is None:
+            return None
+        return self._vectors[:len(self)]
+
+    def row_ranges(self):
+        """document hash -> (first row, end row): a document's rows are always contiguous."""
+        key = (self.generation, len(self))
+        if self._ranges_key != key:
+            ranges = {}
+            for row, doc_id in enumerate(self.doc_ids):
+                start, _ = ranges.get(doc_id, (row, row))
+                ranges[doc_id] = (start, row + 1)
+            self._ranges, self._ranges_key = ranges, key
+        return self._ranges
+
+    # --- Updates ---
+    def add_document(self, doc_hash, name, chunks, vectors, provenance=None):
+        """
+        Append the chunks and vectors of one new document.
+        Re-adding a known hash only records `name` as an alias.
+        `provenance` is an optional list of (page, offset) pairs kept by the store.
+        """
+        if doc_hash in self.names:
+            self.add_alias(doc_hash, name)
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(chunks) != len(vectors):
+            raise ValueError(f"Got {len(chunks)} chunks but {len(vectors)} vectors for {name}")
+
+        if self.store is not None and doc_hash not in self.store:
+            self.store.put(doc_hash, name, chunks, vectors, provenance)
+        self.names[doc_hash] = [name]
+        if not len(chunks):
+            return
+        self.offsets.extend([offset for _, offset in provenance] if provenance else [None] * len(chunks))
+        if self._mapped and self.store.rows == len(self) + len(chunks):
+            # The store appended exactly our new rows: just re-map
+            self.chunks = self.store.texts
+            self._vectors = self.store.vectors
+            self.doc_ids.extend([doc_hash] * len(chunks))
+            return
+
+        self._materialize()
+        self._reserve(len(self) + len(vectors), vectors.shape[1])
+        self._vectors[len(self):len(self) + len(vectors)] = vectors
+        self.chunks.extend(chunks)
+        self.doc_ids.extend([doc_hash] * len(chunks))
+
+    def add_alias(self, doc_hash, name):
+        if name not in self.names[doc_hash]:
+            self.names[doc_hash].append(name)
+
+    def remove_document(self, doc_hash):
+        """Drop every row belonging to `doc_hash`."""
+        if doc_hash not in self.names:
+            return
+        del self.names[doc_hash]
+        self.pinned.discard(doc_hash)
+        keep = [i for i, doc_id in enumerate(self.doc_ids) if doc_id != doc_hash]
+        if len(keep) == len(self):
+            return
+        self._materialize()
+        self.generation += 1
+        if keep:
+            self._vectors[:len(keep)] = self._vectors[keep]
+        self.chunks = [self.chunks[i] for i in keep]
+        self.doc_ids = [self.doc_ids[i] for i in keep]
+        self.offsets = [self.offsets[i] for i in keep]
+
+    def retain(self, uploads):
+        """
+        Sync the index with the files currently in the uploader.
+        `uploads` is an iterable of (doc_hash, name) pairs; documents and
+        aliases that are no longer uploaded are removed. Pinned archive
+        documents are left alone.
+        """
+        live = {}
+        for doc_hash, name in uploads:
+            live.setdefault(doc_hash, set()).add(name)
+        for doc_hash in list(self.names):
+            if doc_hash in self.pinned:
+                continue
+            if doc_hash not in live:
+                self.remove_document(doc_hash)
+            else:
+                self.names[doc_hash] = [n for n in self.names[doc_hash] if n in live[doc_hash]] or self.names[doc_hash]
+
+    # --- Internal ---
+    def _load_archive(self):
+        docs = sorted(self.store.docs.values(), key=lambda doc: doc["start"])
+        for doc in docs:
+            self.names[doc["doc"]] = [doc["name"]]
+            self.pinned.add(doc["doc"])
+            self.doc_ids.extend([doc["doc"]] * doc["count"])
+            self.offsets.extend(self.store.row_meta["offset"][doc["start"]:doc["start"] + doc["count"]].tolist())
+        if self.store.dead_rows == 0:
+            self.chunks = self.store.texts
+            self._vectors = self.store.vectors
+            self._mapped = True
+        else:
+            rows = np.concatenate([np.arange(doc["start"], doc["start"] + doc["count"]) for doc in docs])
+            self.chunks = [self.store.texts[i] for i in rows]
+            self._vectors = np.asarray(self.store.vectors[rows], dtype=np.float32)
+
+    def _materialize(self):
+        """Copy memory-mapped rows into private, writable buffers."""
+        if not self._mapped:
+            return
+        self.chunks = list(self.chunks)
+        self._vectors = np.array(self._vectors, dtype=np.float32)
+        self._mapped = False
+
+    def _reserve(self, rows, dim):
+        """Grow the vector buffer geometrically so appends stay amortised O(1)."""
+        if self._vectors is None:
+            self._vectors = np.empty((max(rows, 1024), dim), dtype=np.float32)
+        elif self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension changed from {self._vectors.shape[1]} to {dim}")
+        elif rows > len(self._vectors):
+            grown = np.empty((max(rows, 2 * len(self._vectors)), dim), dtype=np.float32)
+            grown[:len(self)] = self._vectors[:len(self)]
+            self._vectors = grown
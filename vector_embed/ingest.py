@@ -0,0 +1,224 @@
+# vector_embed/ingest.py
+import os
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from shared.chunking import chunk_text, embedder_max_tokens, encode_chunks
+from shared.extract import extract_pages
+from shared.models import get_embedder
+from shared.tracing import span
+
+# --- Defaults (overridable through the environment) ---
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 4))   # documents waiting between two stages
+INGEST_IDLE_SECONDS = float(os.environ.get("INGEST_IDLE_SECONDS", 30))  # idle workers exit after this long
+
+
+@dataclass
+class FileProgress:
+    doc_hash: str
+    name: str
+    stage: str = "queued"
+    pages: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    error: Optional[str] = None
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def fraction(self):
+        if self.stage in ("ready", "searchable", "failed"):
+            return 1.0 if self.stage != "ready" else 0.95
+        if self.stage == "embedding" and self.chunks:
+            return 0.2 + 0.75 * self.embedded / self.chunks
+        return {"queued": 0.0, "extracting": 0.05, "chunking": 0.15}.get(self.stage, 0.2)
+
+    def describe(self):
+        if self.stage == "failed":
+            return f"❌ {self.name}: {self.error}"
+        if self.stage == "searchable":
+            return f"✅ {self.name}: {self.chunks} chunks from {self.pages} pages in {self.finished - self.started:.1f}s"
+        if self.stage == "embedding":
+            return f"{self.name}: embedding {self.embedded}/{self.chunks} chunks"
+        return f"{self.name}: {self.stage}"
+
+
+class _Document:
+    """What travels down the pipeline for one file."""
+
+    def __init__(self, doc_hash, name, data):
+        self.doc_hash = doc_hash
+        self.name = name
+        self.data = data
+        self.text = ""
+        self.page_starts = []
+        self.pieces = []
+        self.vectors = None
+
+
+class IngestPipeline:
+    """
+    Background ingestion for the multi-PDF chat: extract -> chunk -> embed,
+    one worker thread per stage, connected by bounded queues so a large
+    upload never holds more than a few documents in memory per stage.
+    Extraction of large files fans out to the shared process pool (shared/extract.py).
+
+    Finished documents wait in `ready` until the script thread calls
+    `drain(index)`, which adds them to the (single-threaded) index, so each
+    document becomes searchable as soon as its own vectors land while the
+    rest are still being processed.
+
+    Workers are started by `submit` and exit once nothing has been in
+    flight for `idle_seconds`, so an idle session holds no threads.
+    """
+
+    def __init__(self, queue_size=INGEST_QUEUE_SIZE, embedder=None, idle_seconds=INGEST_IDLE_SECONDS):
+        self._embedder = embedder
+        self._idle_seconds = idle_seconds
+        # Submissions are not bounded (the uploader already holds their bytes); the stages are
+        self._queues = [queue.Queue(), queue.Queue(maxsize=queue_size), queue.Queue(maxsize=queue_size)]
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._files = {}          # doc_hash -> FileProgress, in submission order
+        self._cancelled = set()
+        self._threads = {}        # stage name -> live worker thread
+
+    @property
+    def embedder(self):
+        return self._embedder or get_embedder()
+
+    # --- Script side ---
+    def submit(self, doc_hash, name, data):
+        """Queue one PDF; files already queued or done are ignored. Never blocks."""
+        with self._lock:
+            if doc_hash in self._files and doc_hash not in self._cancelled:
+                return False
+            self._cancelled.discard(doc_hash)
+            self._files[doc_hash] = FileProgress(doc_hash, name)
+            self._start()
+        self._queues[0].put(_Document(doc_hash, name, data))
+        return True
+
+    def retain(self, doc_hashes):
+        """Cancel queued or in-flight files that are no longer uploaded."""
+        doc_hashes = set(doc_hashes)
+        with self._lock:
+            for doc_hash, progress in list(self._files.items()):
+                if doc_hash not in doc_hashes:
+                    if progress.stage != "searchable":
+                        self._cancelled.add(doc_hash)
+                    del self._files[doc_hash]
+
+    def drain(self, index):
+        """Add every finished document to `index` (call from the script thread); returns their names."""
+        added = []
+        while True:
+            try:
+                document = self._ready.popleft()
+            except IndexError:
+                return added
+            with self._lock:
+                progress = self._files.get(document.doc_hash)
+                if progress is None or document.doc_hash in self._cancelled:
+                    continue
+            chunks = [piece.text for piece in document.pieces]
+            provenance = [(bisect_right(document.page_starts, piece.offset), piece.offset) for piece in document.pieces]
+            index.add_document(document.doc_hash, document.name, chunks, document.vectors, provenance)
+            self._update(document, stage="searchable", finished=time.monotonic())
+            added.append(document.name)
+
+    def progress(self):
+        with self._lock:
+            return [FileProgress(**vars(progress)) for progress in self._files.values()]
+
+    @property
+    def busy(self):
+        with self._lock:
+            return any(progress.stage not in ("searchable", "failed") for progress in self._files.values())
+
+    # --- Worker side ---
+    def _start(self):
+        """(Re)start the stages whose worker has exited; call with the lock held."""
+        stages = [(self._extract, self._queues[0], self._queues[1]),
+                  (self._chunk, self._queues[1], self._queues[2]),
+                  (self._embed, self._queues[2], None)]
+        for work, inbox, outbox in stages:
+            stage = work.__name__.strip("_")
+            if stage in self._threads:
+                continue
+            thread = threading.Thread(target=self._worker, args=(work, inbox, outbox),
+                                      name=f"ingest-{stage}", daemon=True)
+            self._threads[stage] = thread
+            thread.start()
+
+    def _idle(self):
+        """Nothing queued or in flight (call with the lock held)."""
+        return not any(progress.stage not in ("searchable", "failed", "ready") for progress in self._files.values())
+
+    def _update(self, document, **changes):
+        with self._lock:
+            progress = self._files.get(document.doc_hash)
+            if progress is not None:
+                for key, value in changes.items():
+                    setattr(progress, key, value)
+
+    def _worker(self, work, inbox, outbox):
+        while True:
+            try:
+                document = inbox.get(timeout=self._idle_seconds)
+            except queue.Empty:
+                with self._lock:
+                    # submit() marks a file queued under this lock before it enqueues it
+                    if self._idle() and inbox.empty():
+                        del self._threads[work.__name__.strip("_")]
+                        return
+                continue
+            with self._lock:
+                if document.doc_hash in self._cancelled:
+                    continue
+            try:
+                with span("ingest", stage=work.__name__.strip("_"), file=document.name):
+                    work(document)
+            except Exception as e:
+                print(f"❌ Ingestion of {document.name} failed: {e}")
+                self._update(document, stage="failed", error=str(e), finished=time.monotonic())
+                continue
+            if outbox is None:
+                self._update(document, stage="ready")
+                self._ready.append(document)
+            else:
+                with self._lock:
+                    if document.doc_hash in self._cancelled:
+                        continue  # never park a cancelled file where an exited stage would not take it
+                outbox.put(document)  # blocks while the next stage is behind
+
+    def _extract(self, document):
+        self._update(document, stage="extracting")
+        # Pages are extracted in parallel and cached on disk per (file hash, page)
+        page_texts, position = [], 0
+        for page, text in extract_pages(document.data, digest=document.doc_hash):
+            document.page_starts.append(position)
+            if text:
+                page_texts.append(text + "\n")
+                position += len(text) + 1
+            self._update(document, pages=page + 1)
+        document.text = "".join(page_texts)
+        document.data = None  # the bytes are no longer needed downstream
+
+    def _chunk(self, document):
+        self._update(document, stage="chunking")
+        # Chunks fit the embedder's window and end on clause boundaries where possible
+        embedder = self.embedder
+        document.pieces = chunk_text(document.text, embedder.tokenizer, embedder_max_tokens(embedder))
+        document.text = ""
+        self._update(document, chunks=len(document.pieces))
+
+    def _embed(self, document):
+        self._update(document, stage="embedding")
+        document.vectors = encode_chunks(self.embedder, document.pieces,
+                                         on_progress=lambda done: self._update(document, embedded=done))
@@ -0,0 +1,162 @@
+# vector_embed/lexical.py
+import math
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+import numpy as np
+
+# --- Defaults (overridable through the environment) ---
+POSTING_CACHE_DOCS = int(os.environ.get("BM25_CACHE_DOCS", 256))  # documents whose postings stay tokenized
+
+# Clause numbers ("14.2") and amounts ("5,00,000" == "500000") stay single terms
+TERM = re.compile(r"\d+(?:[.,]\d+)*|[^\W\d_]+")
+
+
+def terms(text):
+    return [term.replace(",", "") for term in TERM.findall(text.lower())]
+
+
+def document_postings(chunks):
+    """
+    Term statistics of one document, with rows counted from 0:
+    ({term: (rows, term frequencies)}, terms per row) as numpy arrays.
+    """
+    postings, lengths = {}, np.empty(len(chunks), dtype=np.float32)
+    for row, chunk in enumerate(chunks):
+        row_terms = terms(chunk)
+        lengths[row] = len(row_terms)
+        counts = {}
+        for term in row_terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            posting = postings.setdefault(term, ([], []))
+            posting[0].append(row)
+            posting[1].append(count)
+    return ({term: (np.array(rows, dtype=np.int64), np.array(tf, dtype=np.float32))
+             for term, (rows, tf) in postings.items()}, lengths)
+
+
+class PostingCache:
+    """
+    Process-wide LRU of per-document postings keyed by content hash, so a
+    stored contract is tokenized once per process rather than once per
+    session and again after every removal-triggered rebuild.
+    """
+
+    def __init__(self, max_docs=POSTING_CACHE_DOCS):
+        self.max_docs = max_docs
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_hash, chunks):
+        with self._lock:
+            entry = self._entries.get(doc_hash)
+            if entry is not None and len(entry[1]) == len(chunks):
+                self._entries.move_to_end(doc_hash)
+                return entry
+        entry = document_postings(chunks)
+        with self._lock:
+            self._entries[doc_hash] = entry
+            while len(self._entries) > self.max_docs:
+                self._entries.popitem(last=False)
+        return entry
+
+
+posting_cache = PostingCache()
+
+
+class BM25Index:
+    """
+    Inverted index over chunk texts with Okapi BM25 scoring.
+
+    Postings hold (row, term frequency) in row order, so appending rows
+    only extends them, and a search restricted to some row ranges (one
+    PDF's chunks) bisects straight to those rows instead of walking the
+    whole list. Documents are tokenized once per process (PostingCache), so
+    rebuilding the index is a merge of cached postings. Follows the vector backends' update protocol: rows from
+    `start` on are new; the Retriever rebuilds it when rows are removed.
+    """
+
+    name = "bm25"
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}            # term -> (array of rows, array of term frequencies)
+        self.lengths = array("f")     # terms per row
+        self.total_length = 0.0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def update(self, chunks, start=0, doc_ids=None, cache=posting_cache):
+        """
+        `chunks` is the whole row-aligned text list; rows from `start` on are new.
+        With row-aligned `doc_ids` each document's postings come from `cache`
+        and are only shifted into place, not re-tokenized.
+        """
+        row = max(start, len(self))
+        while row < len(chunks):
+            end = len(chunks)
+            if doc_ids is None:
+                postings, lengths = document_postings(chunks[row:end])
+            else:
+                doc_id = doc_ids[row]
+                end = row + 1
+                while end < len(chunks) and doc_ids[end] == doc_id:
+                    end += 1
+                postings, lengths = cache.get(doc_id, chunks[row:end])
+            self._append(row, postings, lengths)
+            row = end
+
+    def _append(self, base, postings, lengths):
+        """Add one document's postings (rows counted from 0) at row `base`; rows only ever grow."""
+        self.lengths.frombytes(lengths.tobytes())
+        self.total_length += float(lengths.sum())
+        for term, (rows, frequencies) in postings.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("q"), array("f"))
+            posting[0].frombytes((rows + base).tobytes())
+            posting[1].frombytes(frequencies.tobytes())
+
+    def search(self, query, k, ranges=None):
+        """
+        Top-k (rows, BM25 scores), best first, for the query text.
+        `ranges` limits the search to [(start, end), ...] row ranges.
+        """
+        rows_total = len(self)
+        if not rows_total:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if ranges is None:
+            ranges = [(0, rows_total)]
+        lengths = np.frombuffer(self.lengths, dtype=np.float32)
+        average = self.total_length / rows_total or 1.0
+
+        hit_rows, gains = [], []
+        for term in set(terms(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, frequencies = posting
+            idf = math.log(1 + (rows_total - len(rows) + 0.5) / (len(rows) + 0.5))
+            for start, end in ranges:
+                lo, hi = bisect_left(rows, start), bisect_left(rows, end)
+                if lo == hi:
+                    continue
+                term_rows = np.frombuffer(rows, dtype=np.int64)[lo:hi]
+                tf = np.frombuffer(frequencies, dtype=np.float32)[lo:hi]
+                norm = self.k1 * (1 - self.b + self.b * lengths[term_rows] / average)
+                hit_rows.append(term_rows)
+                gains.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        if not hit_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(hit_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(gains)).astype(np.float32)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return rows[top], scores[top]
@@ -1,12 +1,46 @@
 # vector_embed_chat/main.py
+import os
+import sys
+import time
 import streamlit as st
-from PyPDF2 import PdfReader
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from sentence_transformers import SentenceTransformer
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from pathlib import Path
-from collections import defaultdict
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))  # shared/ lives at the repo root
+from context import build_contexts
+from index import EmbeddingIndex, document_hash
+from ingest import IngestPipeline
+from search import Retriever
+from store import EmbeddingStore
+from shared.generation import context_limit, stream_batch, template_prefix
+from shared.models import get_embedder, get_model_config, get_tokenizer, registry
+from shared.server import server_report
+from shared import tracing
+
+# --- Persistent embedding store (shared by every session of this process) ---
+STORE_DIR = os.environ.get("EMBED_STORE_DIR", str(Path(__file__).parent / "embed_store"))
+# Search every archived contract, not just this session's uploads (single-user deployments only)
+SEARCH_ARCHIVE = os.environ.get("EMBED_SEARCH_ARCHIVE", "0") == "1"
+
+# --- Prompt budget (prompt + answer, in tokens) ---
+CHAT_CONTEXT_TOKENS = int(os.environ.get("CHAT_CONTEXT_TOKENS", 4096))
+ANSWER_TOKENS = 300
+
+ANSWER_PROMPT = """
+You are a legal expert. Answer the following question strictly based on the contract content below. Do not use any outside knowledge.
+
+Contract Content:
+{context}
+
+Question: {question}
+Answer:
+"""
+# The instructions are prefilled once per model; retrieved contexts change every turn and are not cached
+ANSWER_PREAMBLE = template_prefix(ANSWER_PROMPT)
+
+
+@st.cache_resource
+def open_store(path):
+    return EmbeddingStore(path)
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="Contract Multi-PDF Chat", layout="centered")
@@ -20,85 +54,109 @@ st.title("Contract Multi-PDF Chat Q&A")
 st.write("Upload PDF contracts and chat with them. Answers are generated strictly from uploaded contract content, separated by source PDF.")
 
 # --- Initialize session state ---
-if "pdf_chunks" not in st.session_state:
-    st.session_state.pdf_chunks = []
-if "chunk_sources" not in st.session_state:
-    st.session_state.chunk_sources = []
-if "embeddings" not in st.session_state:
-    st.session_state.embeddings = None
+if "index" not in st.session_state:
+    # Only this session's uploads are searchable; stored vectors are reused, not re-encoded
+    st.session_state.index = EmbeddingIndex(open_store(STORE_DIR), archive=SEARCH_ARCHIVE)
+    st.session_state.retriever = Retriever(st.session_state.index)
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "ingest" not in st.session_state:
+    # New uploads are extracted, chunked and embedded in background threads
+    st.session_state.ingest = IngestPipeline()
+
+index = st.session_state.index
+pipeline = st.session_state.ingest
+
 
 # --- Upload multiple PDFs ---
 uploaded_files = st.file_uploader("Upload Contract PDFs", type=["pdf"], accept_multiple_files=True)
 
-if uploaded_files:
-    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-    for uploaded_file in uploaded_files:
-        if uploaded_file.name not in st.session_state.chunk_sources:
-            pdf_reader = PdfReader(uploaded_file)
-            contract_text = ""
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text:
-                    contract_text += text + "\n"
-
-            if contract_text.strip():
-                def split_text(text, chunk_size=500, overlap=50):
-                    words = text.split()
-                    chunks = []
-                    for i in range(0, len(words), chunk_size - overlap):
-                        chunk = " ".join(words[i:i+chunk_size])
-                        chunks.append(chunk)
-                    return chunks
-
-                chunks = split_text(contract_text)
-                st.session_state.pdf_chunks.extend(chunks)
-                st.session_state.chunk_sources.extend([uploaded_file.name] * len(chunks))
-
-    # Generate embeddings once
-    if st.session_state.embeddings is None and st.session_state.pdf_chunks:
-        st.info("Generating embeddings for uploaded contracts...")
-        st.session_state.embeddings = embedding_model.encode(st.session_state.pdf_chunks, convert_to_numpy=True)
-        st.success("Embeddings ready! You can start asking questions.")
-
-# --- Load Mistral-7B model ---
-if "generator" not in st.session_state and st.session_state.pdf_chunks:
-    model_path = r"C:\Users\shibi\.cache\huggingface\hub\models--mistralai--Mistral-7B-Instruct-v0.2\snapshots\63a8b081895390a26e140280378bc85ec8bce07a"
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModelForCausalLM.from_pretrained(model_path, device_map="auto", torch_dtype="auto")
-    st.session_state.generator = pipeline("text-generation", model=model, tokenizer=tokenizer, max_new_tokens=300)
+uploads = []
+for uploaded_file in uploaded_files or []:
+    # Key documents by content, so renamed duplicates are never re-embedded
+    doc_hash = document_hash(uploaded_file.getvalue())
+    uploads.append((doc_hash, uploaded_file.name))
+    if doc_hash in index:
+        index.add_alias(doc_hash, uploaded_file.name)
+        continue
+    if doc_hash in index.store:
+        # Embedded in an earlier session: reuse the stored vectors
+        chunks, provenance, vectors = index.store.load(doc_hash)
+        index.add_document(doc_hash, uploaded_file.name, chunks, vectors, provenance)
+        continue
+
+    pipeline.submit(doc_hash, uploaded_file.name, uploaded_file.getvalue())
+
+# Drop vectors (and cancel ingestion) of files that were removed from the uploader
+pipeline.retain(doc_hash for doc_hash, _ in uploads)
+pipeline.drain(index)
+index.retain(uploads)
+
+# --- Archive housekeeping: space is reclaimed offline with `python store.py compact` ---
+stored = [doc_hash for doc_hash in index.names if doc_hash in index.store]
+if stored and st.sidebar.button("Forget uploaded PDFs", help="Delete this session's contracts from the embedding archive"):
+    for doc_hash in stored:
+        index.store.delete(doc_hash)
+    st.sidebar.success(f"✅ Removed {len(stored)} PDF(s) from the archive")
+
+
+# Poll only while files are being ingested
+polling = pipeline.busy
+
+
+@st.fragment(run_every=1.0 if polling else None)
+def ingestion_progress():
+    """Per-file progress; finished documents become searchable here without waiting for a rerun."""
+    pipeline.drain(index)
+    if polling and not pipeline.busy:
+        st.rerun()  # all done: stop polling and list the new PDFs in the scope selector
+    files = pipeline.progress()
+    if not any(progress.stage != "searchable" for progress in files):
+        return
+    for progress in files:
+        st.progress(progress.fraction, text=progress.describe())
+
+
+ingestion_progress()
 
 # --- Chat input ---
 user_question = st.text_input("Ask a question about uploaded contracts:")
-
-if user_question and st.session_state.pdf_chunks:
-    query_vec = embedding_model.encode([user_question])
-    sims = cosine_similarity(query_vec, st.session_state.embeddings)[0]
-
-    # Group top chunks by source PDF
-    source_to_chunks = defaultdict(list)
-    top_indices = sims.argsort()[-9:][::-1]  # top 9 chunks overall
-    for i in top_indices:
-        source_to_chunks[st.session_state.chunk_sources[i]].append(st.session_state.pdf_chunks[i])
-
-    # Generate answers per PDF
-    pdf_answers = {}
-    for source, chunks in source_to_chunks.items():
-        context = "\n".join(chunks)
-        prompt = f"""
-You are a legal expert. Answer the following question strictly based on the contract content below. Do not use any outside knowledge.
-
-Contract Content:
-{context}
-
-Question: {user_question}
-Answer:
-"""
-        result = st.session_state.generator(prompt)[0]['generated_text']
-        answer = result.split("Answer:")[-1].strip()
-        pdf_answers[source] = answer
+# Scoped questions only touch the chosen PDFs' vectors and postings
+scope = st.multiselect("Only search these PDFs (optional):", options=list(index.names),
+                       format_func=lambda doc_hash: index.names[doc_hash][0])
+
+if user_question and len(index):
+    # One trace per question: query embedding, search, context packing and prefill/decode
+    with tracing.span("chat", documents=len(index.names), rows=len(index)):
+        with tracing.span("embed", queries=1):
+            query_vec = get_embedder().encode([user_question], normalize_embeddings=True)[0]
+
+        # Top 9 chunks overall (RETRIEVAL_MODE: embedding, BM25 or both fused), merged per PDF and packed into the context window
+        rows, scores = st.session_state.retriever.search(query_vec, k=9, query_text=user_question, sources=scope or None)
+        tokenizer = get_tokenizer()
+        overhead = len(tokenizer(ANSWER_PROMPT.format(context="", question=user_question))["input_ids"])
+        budget = context_limit(tokenizer, get_model_config(), CHAT_CONTEXT_TOKENS) - ANSWER_TOKENS - overhead - 8
+        source_to_context = build_contexts(index, rows, scores, tokenizer, budget)
+
+        # Build one prompt per PDF
+        prompts = [ANSWER_PROMPT.format(context=context, question=user_question) for context in source_to_context.values()]
+
+        # Generate all per-PDF answers as one padded batch, streamed as they decode
+        sources = list(source_to_context)
+        results = [""] * len(prompts)
+        live = st.empty()
+        last_render = 0.0
+        for row, delta in stream_batch(prompts, max_new_tokens=ANSWER_TOKENS, stop=["\nQuestion:"], prefix=ANSWER_PREAMBLE):
+            results[row] += delta
+            if time.monotonic() - last_render > 0.2:  # keep UI updates cheap
+                last_render = time.monotonic()
+                with live.container():
+                    st.markdown(f"**Q:** {user_question}")
+                    for source, result in zip(sources, results):
+                        st.markdown(f"**Source PDF:** {source}")
+                        st.markdown(f"**A:** {result}")
+        live.empty()
+        pdf_answers = {source: result.split("Answer:")[-1].strip() for source, result in zip(sources, results)}
 
     # Store in chat history
     st.session_state.chat_history.append({"question": user_question, "answers": pdf_answers})
@@ -113,3 +171,16 @@ for chat in st.session_state.chat_history:
         else:
             st.markdown("**A:** No relevant content found in this PDF.")
         st.markdown("---")
+
+# --- Model status (and the shared inference server's queue, when INFERENCE_SERVER is set) ---
+model_status = registry.report() + server_report()
+if model_status:
+    with st.sidebar.expander("Loaded models"):
+        for line in model_status:
+            st.caption(line)
+
+# --- Debug panel (TRACING=1) ---
+if tracing.enabled():
+    with st.sidebar.expander("Debug: step timings"):
+        for trace in tracing.recent_traces(3):
+            st.code("\n".join(tracing.describe_trace(trace)), language=None)
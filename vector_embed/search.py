@@ -0,0 +1,273 @@
+# vector_embed/search.py
+import os
+import numpy as np
+from collections import defaultdict
+
+from lexical import BM25Index
+from shared.tracing import span
+
+try:
+    import hnswlib  # optional: only needed for backend="hnsw"
+except ImportError:
+    hnswlib = None
+
+# --- Defaults (overridable through the environment) ---
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "auto")    # auto | exact | ivf | hnsw
+EXACT_MAX_ROWS = int(os.environ.get("SEARCH_EXACT_MAX_ROWS", 200_000))
+IVF_NPROBE = int(os.environ.get("SEARCH_IVF_NPROBE", 16))
+HNSW_EF = int(os.environ.get("SEARCH_HNSW_EF", 64))
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "vector")  # vector | lexical | hybrid
+RRF_K = 60              # reciprocal-rank fusion damping: 1 / (RRF_K + rank)
+FUSION_CANDIDATES = 4   # each ranking contributes k * FUSION_CANDIDATES rows to the fusion
+BLOCK_ROWS = 65_536
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    """Indices of the k largest scores, best first, without a full sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _inverse_norms(vectors, start=0):
+    """
+    1/||v|| for the rows from `start` on, or None when every one of them is
+    already unit length (MiniLM output is normalized, so this is the
+    common case). Every new row is checked, a block at a time.
+    """
+    if start >= len(vectors):
+        return None
+    norms = np.concatenate([np.linalg.norm(np.asarray(vectors[i:i + BLOCK_ROWS], dtype=np.float32), axis=1)
+                            for i in range(start, len(vectors), BLOCK_ROWS)])
+    if np.allclose(norms, 1.0, atol=1e-3):
+        return None
+    return 1.0 / np.maximum(norms, 1e-12)
+
+
+class ExactSearch:
+    """Brute-force inner product over normalized vectors with an O(N) top-k."""
+
+    name = "exact"
+
+    def __init__(self):
+        self.vectors = None
+        self.inv_norms = None
+
+    def update(self, vectors, start=0):
+        """`vectors` is the whole matrix; rows from `start` on are new."""
+        self.vectors = vectors
+        new = _inverse_norms(vectors, start)
+        if new is not None or self.inv_norms is not None:
+            old = self.inv_norms[:start] if self.inv_norms is not None else np.ones(start, dtype=np.float32)
+            self.inv_norms = np.concatenate([old, new if new is not None else np.ones(len(vectors) - start, dtype=np.float32)])
+
+    def search(self, query, k):
+        # Blocked so float16 / memory-mapped matrices are never upcast in one piece
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for i in range(0, len(self.vectors), BLOCK_ROWS):
+            scores[i:i + BLOCK_ROWS] = np.asarray(self.vectors[i:i + BLOCK_ROWS], dtype=np.float32) @ query
+        if self.inv_norms is not None:
+            scores = scores * self.inv_norms
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+
+class IVFSearch:
+    """
+    Inverted-file index: spherical k-means partitions the vectors into
+    `nlist` cells and a query only scores the `nprobe` closest cells.
+    Raise `nprobe` for recall, lower it for latency.
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist=None, nprobe=IVF_NPROBE, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.vectors = None
+        self.centroids = None
+        self.lists = []
+        self.trained_rows = 0
+
+    def update(self, vectors, start=0):
+        self.vectors = vectors
+        # Retrain when the corpus has grown well past what the cells were fitted on
+        if self.centroids is None or len(vectors) > 4 * self.trained_rows:
+            self._train()
+            start = 0
+            self.lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+        added = [[] for _ in range(len(self.centroids))]
+        for block_start in range(start, len(vectors), BLOCK_ROWS):
+            block = normalize(vectors[block_start:block_start + BLOCK_ROWS])
+            cells = np.argmax(block @ self.centroids.T, axis=1)
+            order = np.argsort(cells, kind="stable")
+            bounds = np.searchsorted(cells[order], np.arange(len(self.centroids) + 1))
+            for cell in np.flatnonzero(bounds[1:] > bounds[:-1]):
+                added[cell].append(block_start + order[bounds[cell]:bounds[cell + 1]])
+        self.lists = [np.concatenate([rows, *new]) if new else rows for rows, new in zip(self.lists, added)]
+
+    def search(self, query, k):
+        query = normalize(query)
+        cells = _top_k(self.centroids @ query, self.nprobe)
+        candidates = np.sort(np.concatenate([self.lists[cell] for cell in cells]))
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = normalize(self.vectors[candidates]) @ query
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def _train(self):
+        rows = len(self.vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(rows)))
+        nlist = min(nlist, rows)
+        sample_rows = min(rows, 64 * nlist)
+        sample = normalize(self.vectors[np.sort(self.rng.choice(rows, sample_rows, replace=False))])
+        centroids = sample[self.rng.choice(sample_rows, nlist, replace=False)]
+        for _ in range(self.iterations):
+            cells = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, cells, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]  # keep empty cells where they were
+            centroids = normalize(sums)
+        self.centroids = centroids
+        self.trained_rows = rows
+
+
+class HNSWSearch:
+    """Graph-based ANN through the optional `hnswlib` package; `ef` trades recall for latency."""
+
+    name = "hnsw"
+
+    def __init__(self, ef=HNSW_EF, M=16, ef_construction=200):
+        if hnswlib is None:
+            raise ImportError("backend='hnsw' requires the optional hnswlib package")
+        self.ef = ef
+        self.M = M
+        self.ef_construction = ef_construction
+        self.graph = None
+
+    def update(self, vectors, start=0):
+        if self.graph is None:
+            self.graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            self.graph.init_index(max_elements=max(len(vectors), 1024), M=self.M, ef_construction=self.ef_construction)
+        if len(vectors) > self.graph.get_max_elements():
+            self.graph.resize_index(max(len(vectors), 2 * self.graph.get_max_elements()))
+        for block_start in range(start, len(vectors), BLOCK_ROWS):
+            block = normalize(vectors[block_start:block_start + BLOCK_ROWS])
+            self.graph.add_items(block, np.arange(block_start, block_start + len(block)))
+
+    def search(self, query, k):
+        k = min(k, self.graph.get_current_count())
+        self.graph.set_ef(max(self.ef, k))
+        labels, distances = self.graph.knn_query(normalize(query), k=k)
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+
+BACKENDS = {"exact": ExactSearch, "ivf": IVFSearch, "hnsw": HNSWSearch}
+
+
+def search_ranges(vectors, ranges, query, k):
+    """Exact top-k over only the given [(start, end), ...] row ranges (e.g. one PDF's chunks)."""
+    rows = np.concatenate([np.arange(start, end) for start, end in ranges]) if ranges else np.empty(0, dtype=np.int64)
+    if not len(rows):
+        return rows, np.empty(0, dtype=np.float32)
+    scores = np.concatenate([normalize(vectors[start:end]) @ query for start, end in ranges])
+    top = _top_k(scores, k)
+    return rows[top], scores[top]
+
+
+def fuse(rankings, k, rrf_k=RRF_K):
+    """Reciprocal-rank fusion of several best-first row arrays: top-k (rows, fused scores)."""
+    fused = defaultdict(float)
+    for rows in rankings:
+        for rank, row in enumerate(rows.tolist()):
+            fused[row] += 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
+    return (np.array([row for row, _ in best], dtype=np.int64),
+            np.array([score for _, score in best], dtype=np.float32))
+
+
+class Retriever:
+    """
+    Keeps a search backend, and the BM25 index of the chunk texts, in sync
+    with an EmbeddingIndex. Appended rows are added incrementally;
+    removals trigger a rebuild.
+
+    `mode` picks the ranking: "vector" (embedding similarity), "lexical"
+    (BM25, for exact terms such as clause numbers, party names and
+    amounts) or "hybrid" (both, fused by reciprocal rank).
+    """
+
+    def __init__(self, index, backend=SEARCH_BACKEND, mode=RETRIEVAL_MODE, **params):
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"❌ Retrieval mode must be vector, lexical or hybrid, not {mode!r}")
+        self.index = index
+        self.backend_name = backend
+        self.mode = mode
+        self.params = params
+        self.backend = None
+        self.lexical = None
+        self.rows = 0
+        self.generation = None
+
+    def refresh(self):
+        index = self.index
+        wanted = self._backend_for(len(index))
+        if self.backend is None or self.backend.name != wanted or self.generation != index.generation:
+            self.backend = BACKENDS[wanted](**self.params)
+            self.lexical = BM25Index() if self.mode != "vector" else None
+            self.rows = 0
+            self.generation = index.generation
+        if len(index) > self.rows:
+            self.backend.update(index.embeddings, self.rows)
+            if self.lexical is not None:
+                self.lexical.update(index.chunks, self.rows, index.doc_ids)
+            self.rows = len(index)
+
+    def search(self, query_vec, k=9, query_text=None, sources=None):
+        """
+        Top-k (row indices, scores), best first. The lexical side needs
+        `query_text`; without it every mode falls back to vector search.
+        `sources` (document hashes) restricts the search to those PDFs:
+        only their rows are scored, vectors exactly and postings by range.
+        """
+        with span("search", k=k) as traced:
+            self.refresh()
+            if not len(self.index):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            mode = self.mode if query_text else "vector"
+            ranges = None
+            if sources is not None:
+                row_ranges = self.index.row_ranges()
+                ranges = sorted(row_ranges[doc_id] for doc_id in sources if doc_id in row_ranges)
+            traced.set(backend=self.backend.name if ranges is None else "filtered", mode=mode, rows=len(self.index))
+
+            candidates = k * FUSION_CANDIDATES if mode == "hybrid" else k
+            rankings = []
+            if mode != "lexical":
+                query = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+                if ranges is None:
+                    rankings.append(self.backend.search(query, candidates))
+                else:
+                    rankings.append(search_ranges(self.index.embeddings, ranges, normalize(query), candidates))
+            if mode != "vector":
+                rankings.append(self.lexical.search(query_text, candidates, ranges))
+            if len(rankings) == 1:
+                return rankings[0]
+            return fuse([rows for rows, _ in rankings], k)
+
+    def _backend_for(self, rows):
+        if self.backend_name == "auto":
+            return "exact" if rows <= EXACT_MAX_ROWS else "ivf"
+        return self.backend_name
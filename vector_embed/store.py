@@ -0,0 +1,309 @@
+# vector_embed/store.py
+import argparse
+import json
+import os
+import threading
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl  # POSIX only: serializes writers across processes
+except ImportError:
+    fcntl = None
+
+# --- Fixed-width per-row metadata (text location + provenance) ---
+ROW_DTYPE = np.dtype([
+    ("text_start", "<i8"),   # byte offset of the chunk text in texts.bin
+    ("text_len", "<i4"),     # byte length of the chunk text
+    ("page", "<i4"),         # 1-based page the chunk starts on
+    ("offset", "<i8"),       # character offset of the chunk in the extracted text
+])
+
+
+class StoredTexts:
+    """Lazy, read-only sequence of chunk texts backed by the store's memory maps."""
+
+    def __init__(self, texts, rows):
+        self._texts = texts
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        row = self._rows[i]
+        start = int(row["text_start"])
+        return bytes(self._texts[start:start + int(row["text_len"])]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class EmbeddingStore:
+    """
+    Append-only on-disk embedding store, keyed by document content hash.
+
+    Layout of `root`:
+        meta.json    vector dimension and dtype (float32 or float16)
+        vectors.bin  flat row-major vector matrix, memory-mapped for reads
+        texts.bin    UTF-8 chunk texts, concatenated
+        rows.bin     one ROW_DTYPE record per vector row
+        docs.jsonl   one line per document; written last, so it doubles as
+                     the commit marker. Deletions append a tombstone line.
+
+    Every file is only ever appended to; `compact()` rewrites the store
+    without deleted rows. Writers, including the trim of a crashed write,
+    hold an exclusive lock on `store.lock`, so several processes can share
+    one store. `repair=False` opens it without trimming (read-only tools).
+    """
+
+    def __init__(self, root, dtype="float32", repair=True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        meta_path = self.root / "meta.json"
+        if meta_path.exists():
+            self.meta = json.loads(meta_path.read_text())
+        else:
+            self.meta = {"dim": None, "dtype": np.dtype(dtype).name}
+            meta_path.write_text(json.dumps(self.meta))
+        self.dtype = np.dtype(self.meta["dtype"])
+
+        self.docs = {}
+        self.rows = 0
+        self._text_bytes = 0
+        if repair:
+            with self._exclusive():
+                self._load_manifest()
+                self._repair()
+        else:
+            self._load_manifest()
+        self._map()
+
+    # --- Read side ---
+    def __contains__(self, doc_hash):
+        return doc_hash in self.docs
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def dead_rows(self):
+        """Rows still on disk that belong to deleted documents."""
+        return self.rows - sum(doc["count"] for doc in self.docs.values())
+
+    def load(self, doc_hash):
+        """Return (texts, provenance, vectors) for one stored document."""
+        doc = self.docs[doc_hash]
+        rows = slice(doc["start"], doc["start"] + doc["count"])
+        provenance = [(int(r["page"]), int(r["offset"])) for r in self.row_meta[rows]]
+        return self.texts[rows], provenance, self.vectors[rows]
+
+    # --- Write side ---
+    def put(self, doc_hash, name, chunks, vectors, provenance=None):
+        """
+        Append one document. `provenance` is an optional list of
+        (page, offset) pairs, one per chunk. Known hashes are ignored.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if provenance is None:
+            provenance = [(0, 0)] * len(chunks)
+        if not (len(chunks) == len(vectors) == len(provenance)):
+            raise ValueError(f"Chunk, vector and provenance counts differ for {name}")
+
+        with self._exclusive():
+            self._refresh()  # another process may have appended since we last looked
+            if doc_hash in self.docs:
+                return
+            if len(vectors):
+                self._check_dim(vectors.shape[1])
+
+            encoded = [chunk.encode("utf-8") for chunk in chunks]
+            meta = np.zeros(len(chunks), dtype=ROW_DTYPE)
+            position = self._text_bytes
+            for i, (data, (page, offset)) in enumerate(zip(encoded, provenance)):
+                meta[i] = (position, len(data), page, offset)
+                position += len(data)
+
+            # Data first, manifest line last: a crash never exposes half a document
+            with open(self.root / "vectors.bin", "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.root / "texts.bin", "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self.root / "rows.bin", "ab") as f:
+                f.write(meta.tobytes())
+            entry = {"doc": doc_hash, "name": name, "start": self.rows, "count": len(chunks)}
+            self._append_manifest(entry)
+
+            self.docs[doc_hash] = entry
+            self.rows += len(chunks)
+            self._text_bytes = position
+            self._map()
+
+    def delete(self, doc_hash):
+        """Tombstone a document; its rows are reclaimed by `compact()`."""
+        with self._exclusive():
+            self._refresh()
+            if doc_hash in self.docs:
+                self._append_manifest({"doc": doc_hash, "deleted": True})
+                del self.docs[doc_hash]
+
+    def compact(self):
+        """
+        Rewrite the store keeping only live documents, in their current order.
+        Run it while no index holds the old memory maps open.
+        """
+        with self._exclusive():
+            self._refresh()
+            docs = sorted(self.docs.values(), key=lambda d: d["start"])
+            tmp = self.root / "compact.tmp"
+            tmp.mkdir(exist_ok=True)
+            position, start = 0, 0
+            with open(tmp / "vectors.bin", "wb") as fv, open(tmp / "texts.bin", "wb") as ft, \
+                    open(tmp / "rows.bin", "wb") as fr, open(tmp / "docs.jsonl", "w", encoding="utf-8") as fd:
+                for doc in docs:
+                    rows = slice(doc["start"], doc["start"] + doc["count"])
+                    meta = np.array(self.row_meta[rows])
+                    data = b"".join(bytes(self._texts[int(r["text_start"]):int(r["text_start"]) + int(r["text_len"])]) for r in meta)
+                    meta["text_start"] = position + np.cumsum(meta["text_len"], dtype=np.int64) - meta["text_len"]
+                    fv.write(np.ascontiguousarray(self.vectors[rows]).tobytes())
+                    ft.write(data)
+                    fr.write(meta.tobytes())
+                    fd.write(json.dumps({**doc, "start": start}) + "\n")
+                    position += len(data)
+                    start += doc["count"]
+
+            self._unmap()
+            for name in ("vectors.bin", "texts.bin", "rows.bin", "docs.jsonl"):
+                os.replace(tmp / name, self.root / name)
+            tmp.rmdir()
+            self._load_manifest()
+            self._map()
+
+    # --- Internal ---
+    @contextmanager
+    def _exclusive(self):
+        """Hold the store for writing: this process's threads and, on POSIX, other processes."""
+        with self._lock, open(self.root / "store.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+            yield
+
+    def _refresh(self):
+        """Pick up documents committed by other processes (call under `_exclusive`)."""
+        rows = self.rows
+        self.meta = json.loads((self.root / "meta.json").read_text())  # the dimension may have been set
+        self._load_manifest()
+        self._repair()
+        if self.rows != rows:
+            self._map()
+
+    def _check_dim(self, dim):
+        if self.meta["dim"] is None:
+            self.meta["dim"] = int(dim)
+            (self.root / "meta.json").write_text(json.dumps(self.meta))
+        elif self.meta["dim"] != dim:
+            raise ValueError(f"Store holds {self.meta['dim']}-d vectors, got {dim}-d")
+
+    def _append_manifest(self, entry):
+        with open(self.root / "docs.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load_manifest(self):
+        """Read the committed documents and where their data ends. Never writes."""
+        manifest = self.root / "docs.jsonl"
+        self.docs = {}
+        if manifest.exists():
+            with open(manifest, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # a line still being written by another process
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("deleted"):
+                        self.docs.pop(entry["doc"], None)
+                        continue
+                    self.docs[entry["doc"]] = entry
+        self.rows = max((doc["start"] + doc["count"] for doc in self.docs.values()), default=0)
+        rows_path = self.root / "rows.bin"
+        self._text_bytes = 0
+        if self.rows and rows_path.exists():
+            last = np.fromfile(rows_path, dtype=ROW_DTYPE, count=1, offset=(self.rows - 1) * ROW_DTYPE.itemsize)[0]
+            self._text_bytes = int(last["text_start"]) + int(last["text_len"])
+
+    def _repair(self):
+        """
+        Trim data appended after the last committed manifest line (a crash
+        mid-write). Only safe under `_exclusive`: otherwise that tail may be
+        a write in progress.
+        """
+        width = self.dtype.itemsize * (self.meta["dim"] or 0)
+        for name, size in (("vectors.bin", self.rows * width),
+                           ("texts.bin", self._text_bytes),
+                           ("rows.bin", self.rows * ROW_DTYPE.itemsize)):
+            path = self.root / name
+            if not path.exists():
+                path.touch()
+            if path.stat().st_size > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _map(self):
+        """(Re)open read-only memory maps covering every committed row."""
+        dim = self.meta["dim"] or 0
+        if self.rows and dim:
+            self.vectors = np.memmap(self.root / "vectors.bin", dtype=self.dtype, mode="r", shape=(self.rows, dim))
+            self.row_meta = np.memmap(self.root / "rows.bin", dtype=ROW_DTYPE, mode="r", shape=(self.rows,))
+        else:
+            self.vectors = np.empty((0, dim), dtype=self.dtype)
+            self.row_meta = np.empty(0, dtype=ROW_DTYPE)
+        if self._text_bytes:
+            self._texts = np.memmap(self.root / "texts.bin", dtype=np.uint8, mode="r", shape=(self._text_bytes,))
+        else:
+            self._texts = np.empty(0, dtype=np.uint8)
+        self.texts = StoredTexts(self._texts, self.row_meta)
+
+    def _unmap(self):
+        self.vectors = self.row_meta = self._texts = self.texts = None
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain an embedding store.")
+    parser.add_argument("root", help="store directory (EMBED_STORE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list stored documents")
+    delete = commands.add_parser("delete", help="tombstone documents by content hash")
+    delete.add_argument("hashes", nargs="+")
+    commands.add_parser("compact", help="rewrite the store without deleted rows (stop the app first)")
+    args = parser.parse_args(argv)
+
+    # Listing and tombstoning never trim data: the app may be writing right now
+    store = EmbeddingStore(args.root, repair=args.command == "compact")
+    if args.command == "list":
+        for doc in sorted(store.docs.values(), key=lambda d: d["start"]):
+            print(f"{doc['doc']}  {doc['count']:>6} rows  {doc['name']}")
+        print(f"{len(store.docs)} documents, {store.rows} rows ({store.dead_rows} deleted)")
+    elif args.command == "delete":
+        for doc_hash in args.hashes:
+            if doc_hash in store:
+                store.delete(doc_hash)
+                print(f"✅ Deleted {doc_hash}")
+            else:
+                print(f"⚠️ Not in the store: {doc_hash}")
+    else:
+        dead = store.dead_rows
+        store.compact()
+        print(f"✅ Compacted {args.root}: reclaimed {dead} rows, {store.rows} remain")
+
+
+if __name__ == "__main__":
+    main()